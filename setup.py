@@ -30,7 +30,6 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3 :: Only',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Operating System :: OS Independent',
@@ -40,12 +39,17 @@ setup(
     keywords='library apple siwa signin',
     packages=find_packages(),
     long_description_content_type="text/markdown",
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
         'PyJWT>=2.2.0',
         'rsa',
         'cryptography'
     ],
+    entry_points={
+        'console_scripts': [
+            'siwa=siwa.library.stream_verifier:main'
+        ]
+    },
     project_urls={
         'Github Repository': 'https://github.com/hwjeremy/siwa-python',
         'About': 'https://github.com/hwjeremy/siwa-python'
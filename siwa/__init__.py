@@ -1,6 +1,94 @@
-from siwa.library.public_key import ApplePublicKey
-from siwa.library.token.token import IdentityToken
-from siwa.library.key_protocol import PublicKey
-from siwa.library.key_cache import KeyCache
-from siwa.library.token.payload import Payload
-from siwa.library.token.real_person import RealPerson
+"""
+Signin With Apple
+Package Module
+author: hugh@blinkybeach.com
+
+Public names are imported from their modules on first access, such that
+`import siwa` does not load the cryptography, HTTP or asyncio stacks until
+they are needed.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+_EXPORTS = {
+    'ApplePublicKey': 'siwa.library.public_key',
+    'IdentityToken': 'siwa.library.token.token',
+    'PublicKey': 'siwa.library.key_protocol',
+    'KeyCache': 'siwa.library.key_cache',
+    'Payload': 'siwa.library.token.payload',
+    'RealPerson': 'siwa.library.token.real_person',
+    'KeyRefresher': 'siwa.library.key_refresher',
+    'AsyncKeyRefresher': 'siwa.library.key_refresher',
+    'FileKeyCache': 'siwa.library.file_key_cache',
+    'ResultCache': 'siwa.library.result_cache',
+    'Transport': 'siwa.library.transport',
+    'PooledTransport': 'siwa.library.transport',
+    'KeyDocument': 'siwa.library.key_document',
+    'Precheck': 'siwa.library.token.precheck',
+    'Rejection': 'siwa.library.token.rejection',
+    'Instrumentation': 'siwa.library.instrumentation',
+    'PrometheusInstrumentation': 'siwa.library.prometheus_instrumentation',
+    'OpenTelemetryInstrumentation':
+        'siwa.library.opentelemetry_instrumentation',
+    'VerificationResult': 'siwa.library.token.verification_result',
+    'WSGIMiddleware': 'siwa.library.middleware',
+    'ASGIMiddleware': 'siwa.library.middleware',
+    'Verifier': 'siwa.library.verifier',
+    'ReplayStore': 'siwa.library.replay_store',
+    'ReplayBackend': 'siwa.library.replay_store',
+    'MemoryReplayBackend': 'siwa.library.replay_store',
+    'SQLiteReplayBackend': 'siwa.library.sqlite_replay_backend',
+    'TokenExchange': 'siwa.library.token_exchange',
+    'TokenExchangeError': 'siwa.library.token_exchange',
+    'TokenResponse': 'siwa.library.token_exchange',
+    'ClientSecret': 'siwa.library.client_secret'
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from siwa.library.public_key import ApplePublicKey
+    from siwa.library.token.token import IdentityToken
+    from siwa.library.key_protocol import PublicKey
+    from siwa.library.key_cache import KeyCache
+    from siwa.library.token.payload import Payload
+    from siwa.library.token.real_person import RealPerson
+    from siwa.library.key_refresher import KeyRefresher, AsyncKeyRefresher
+    from siwa.library.file_key_cache import FileKeyCache
+    from siwa.library.result_cache import ResultCache
+    from siwa.library.transport import Transport, PooledTransport
+    from siwa.library.key_document import KeyDocument
+    from siwa.library.token.precheck import Precheck
+    from siwa.library.token.rejection import Rejection
+    from siwa.library.instrumentation import Instrumentation
+    from siwa.library.prometheus_instrumentation import (
+        PrometheusInstrumentation
+    )
+    from siwa.library.opentelemetry_instrumentation import (
+        OpenTelemetryInstrumentation
+    )
+    from siwa.library.token.verification_result import VerificationResult
+    from siwa.library.middleware import WSGIMiddleware, ASGIMiddleware
+    from siwa.library.verifier import Verifier
+    from siwa.library.replay_store import ReplayStore, ReplayBackend
+    from siwa.library.replay_store import MemoryReplayBackend
+    from siwa.library.sqlite_replay_backend import SQLiteReplayBackend
+    from siwa.library.token_exchange import TokenExchange, TokenExchangeError
+    from siwa.library.token_exchange import TokenResponse
+    from siwa.library.client_secret import ClientSecret
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError('module {m} has no attribute {n}'.format(
+            m=repr(__name__),
+            n=repr(name)
+        ))
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,9 @@
+"""
+Signin With Apple
+Main Module
+author: hugh@blinkybeach.com
+"""
+import sys
+from siwa.library.stream_verifier import main
+
+sys.exit(main())
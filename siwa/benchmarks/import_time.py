@@ -0,0 +1,130 @@
+"""
+Signin With Apple
+Import Time Benchmark
+author: hugh@blinkybeach.com
+
+Measures the cost of importing the library in a fresh interpreter, using
+`python -X importtime`, for statements typical of short-lived processes,
+and guards against regressions: exits non-zero if any statement loads one
+of the heavy dependencies that should only load on first use, or if the
+best time for any statement exceeds `--budget` milliseconds.
+
+$ python -m siwa.benchmarks.import_time [--repeat 5] [--budget 50]
+"""
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from siwa.library.command_line import CommandLine
+
+REPEAT = 5
+
+STATEMENTS = (
+    'import siwa',
+    'from siwa import Payload, RealPerson',
+    'from siwa import IdentityToken, Verifier'
+)
+
+HEAVY_MODULES = (
+    'asyncio',
+    'concurrent.futures',
+    'cryptography',
+    'http.client',
+    'jwt',
+    'rsa',
+    'ssl',
+    'urllib.request'
+)
+
+
+def sample(statement: str) -> Tuple[float, List[str]]:
+    """
+    Execute `statement` in a fresh interpreter, returning the time spent
+    importing in microseconds, and the heavy modules it loaded
+    """
+
+    program = '\n'.join((
+        statement,
+        'import sys',
+        'print(",".join(m for m in {h} if m in sys.modules))'.format(
+            h=repr(HEAVY_MODULES)
+        )
+    ))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', program],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True
+    )
+
+    # Imports made by the interpreter at startup precede the first import
+    # of the library; every top level import from then on is counted
+    microseconds = 0
+    counting = False
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except (IndexError, ValueError):
+            continue
+        name = fields[2].rstrip()[1:]
+        if name.startswith(' '):
+            continue
+        if name == 'siwa' or name.startswith('siwa.'):
+            counting = True
+        if counting:
+            microseconds += cumulative
+
+    loaded = completed.stdout.strip()
+    return float(microseconds), loaded.split(',') if loaded else []
+
+
+def loaded_modules(statement: str) -> List[str]:
+    """Return the heavy modules loaded by executing `statement`"""
+    return sample(statement)[1]
+
+
+def run(
+    repeat: int = REPEAT,
+    budget: Optional[float] = None
+) -> Dict[str, Any]:
+
+    results = []
+    for statement in STATEMENTS:
+        samples = [sample(statement) for _ in range(repeat)]
+        best = min(s[0] for s in samples)
+        loaded = sorted(set(m for s in samples for m in s[1]))
+        failures = ['loaded ' + m for m in loaded]
+        if budget is not None and best / 1000 > budget:
+            failures.append('exceeded {b}ms budget'.format(b=budget))
+        results.append({
+            'statement': statement,
+            'best_ms': best / 1000,
+            'median_ms': sorted(s[0] for s in samples)[repeat // 2] / 1000,
+            'heavy_modules': loaded,
+            'failures': failures
+        })
+
+    return {
+        'python': sys.version.split()[0],
+        'repeat': repeat,
+        'budget_ms': budget,
+        'results': results,
+        'passed': not any(r['failures'] for r in results)
+    }
+
+
+if __name__ == '__main__':
+
+    command_line = CommandLine.load()
+    report = run(
+        repeat=command_line.get('--repeat', int, 'int') or REPEAT,
+        budget=command_line.get('--budget', float, 'float')
+    )
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+    sys.exit(0 if report['passed'] else 1)
@@ -0,0 +1,89 @@
+"""
+Signin With Apple
+Key Cache Concurrency Benchmark
+author: hugh@blinkybeach.com
+
+Measures KeyCache read throughput, and the latency of batches of reads, from
+several threads, first alone and then while another thread refreshes the
+key set as fast as it can.
+
+$ python -m siwa.benchmarks.key_cache_concurrency
+"""
+import statistics
+import time
+from threading import Thread, Event
+from typing import List, Tuple
+from siwa import ApplePublicKey, KeyCache
+from siwa.tests.fixtures import SigningKey
+
+READERS = 4
+DURATION = 2.0
+BATCH = 1000
+
+
+def measure(
+    cache: KeyCache,
+    keys: List[ApplePublicKey],
+    refreshing: bool
+) -> Tuple[float, float, int]:
+
+    stopping = Event()
+    batches: List[float] = []
+    refreshes: List[int] = []
+
+    def read() -> None:
+        timings = []
+        while not stopping.is_set():
+            start = time.perf_counter()
+            for _ in range(BATCH):
+                cache.retrieve('STABLE')
+            timings.append(time.perf_counter() - start)
+        batches.extend(timings)
+        return
+
+    def refresh() -> None:
+        count = 0
+        while not stopping.is_set():
+            cache.refresh([keys[0], keys[1 + count % 2]])
+            count += 1
+        refreshes.append(count)
+        return
+
+    threads = [Thread(target=read) for _ in range(READERS)]
+    if refreshing:
+        threads.append(Thread(target=refresh))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stopping.set()
+    for thread in threads:
+        thread.join()
+
+    reads_per_second = len(batches) * BATCH / DURATION
+    median_read = statistics.median(batches) / BATCH
+    return reads_per_second, median_read, sum(refreshes)
+
+
+def run() -> None:
+
+    keys = [
+        ApplePublicKey.decode(SigningKey(i).jwk())
+        for i in ('STABLE', 'FIRST', 'SECOND')
+    ]
+    cache = KeyCache()
+    cache.refresh(keys[:2])
+
+    for refreshing in (False, True):
+        reads, median, refreshes = measure(cache, keys, refreshing)
+        print('{m}: {r:.0f} reads/s, {l:.0f}ns median, {f} refreshes'.format(
+            m='refreshing' if refreshing else 'quiet',
+            r=reads,
+            l=median * 1000000000,
+            f=refreshes
+        ))
+
+    return
+
+
+if __name__ == '__main__':
+    run()
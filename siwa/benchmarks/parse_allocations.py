@@ -0,0 +1,116 @@
+"""
+Signin With Apple
+Parse Allocations Benchmark
+author: hugh@blinkybeach.com
+
+Measures, for each kind of input a token may be parsed from (text, bytes,
+a bytearray and a read-only memoryview over a larger buffer, as handed up
+by a server), the memory a parsed IdentityToken holds, the memory blocks
+allocated per parse, the transient peak of a single parse, and the time
+taken; and the same for parsing and then checking the signature, which
+is made over a view of the signed body rather than a copy of it.
+
+$ python -m siwa.benchmarks.parse_allocations [--count 20000]
+"""
+import gc
+import json
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict
+from siwa import ApplePublicKey, IdentityToken
+from siwa.library.command_line import CommandLine
+from siwa.tests.fixtures import SigningKey
+
+COUNT = 20000
+SAMPLES = 200
+
+
+def _inputs(token: str) -> Dict[str, Callable[[], Any]]:
+    """Return factories for each kind of input, keyed by name"""
+    encoded = token.encode('ascii')
+    # A request body with the token in the middle of it
+    body = b'token=' + encoded + b'&state=xyz'
+    view = memoryview(body)[6:6 + len(encoded)]
+    return {
+        'str': lambda: token,
+        'bytes': lambda: encoded,
+        'bytearray': lambda: bytearray(encoded),
+        'memoryview': lambda: view
+    }
+
+
+def _measure(
+    function: Callable[[Any], Any],
+    make_input: Callable[[], Any],
+    count: int
+) -> Dict[str, float]:
+
+    inputs = [make_input() for _ in range(count)]
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [function(data) for data in inputs]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    del held
+
+    peak = None
+    for data in inputs[:SAMPLES]:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        function(data)
+        sampled = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+        peak = sampled if peak is None else min(peak, sampled)
+
+    elapsed = min(timeit.repeat(
+        lambda: [function(data) for data in inputs],
+        number=1,
+        repeat=3
+    ))
+
+    return {
+        'held_bytes': round((after - before) / count, 1),
+        'blocks': round(blocks / count, 2),
+        'peak_bytes': peak or 0,
+        'us': round(elapsed / count * 1000000, 2)
+    }
+
+
+def run(count: int = COUNT) -> Dict[str, Any]:
+
+    signing_key = SigningKey()
+    public_key = ApplePublicKey.decode(signing_key.jwk())
+    token = signing_key.token()
+    inputs = _inputs(token)
+
+    def parse_and_check(data: Any) -> IdentityToken:
+        parsed = IdentityToken.parse(data)
+        assert parsed.check_signature(public_key)
+        return parsed
+
+    results: Dict[str, Any] = {'count': count, 'token_length': len(token)}
+    results['parse'] = {
+        name: _measure(IdentityToken.parse, make_input, count)
+        for name, make_input in inputs.items()
+    }
+    results['parse_and_check'] = {
+        name: _measure(parse_and_check, make_input, count // 10 or 1)
+        for name, make_input in inputs.items()
+    }
+
+    return results
+
+
+if __name__ == '__main__':
+
+    command_line = CommandLine.load()
+    count = command_line.get('--count', int, 'int') or COUNT
+
+    json.dump(run(count), sys.stdout, indent=2)
+    sys.stdout.write('\n')
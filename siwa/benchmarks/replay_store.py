@@ -0,0 +1,116 @@
+"""
+Signin With Apple
+Replay Store Benchmark
+author: hugh@blinkybeach.com
+
+Measures a replay backend holding one million entries: the cost of
+recording new keys, of detecting replayed keys, of expiring every key at
+once, and of recording into a full store, which evicts; and, separately,
+for the in-memory backend, the memory held per entry. Time is simulated,
+with tokens arriving at a steady rate and living for an hour.
+
+$ python -m siwa.benchmarks.replay_store [--entries 1000000] \
+[--backend memory|sqlite]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+from siwa import MemoryReplayBackend, ReplayBackend, SQLiteReplayBackend
+from siwa.library.command_line import CommandLine
+
+ENTRIES = 1000000
+RATE = 1000.0
+LIFETIME = 3600.0
+
+
+def fill(
+    backend: ReplayBackend,
+    keys: List[bytes],
+    start: float = 0.0
+) -> float:
+    """Add `keys` arriving at RATE from `start`, returning seconds taken"""
+    add = backend.add
+    began = time.perf_counter()
+    for index, key in enumerate(keys):
+        now = start + index / RATE
+        add(key, now + LIFETIME, now)
+    return time.perf_counter() - began
+
+
+def run(
+    entries: int = ENTRIES,
+    make_backend: Callable[[int], ReplayBackend] = MemoryReplayBackend,
+    in_memory: bool = True
+) -> Dict[str, Any]:
+
+    random = os.urandom(16 * entries * 2)
+    keys = [random[i:i + 16] for i in range(0, 16 * entries, 16)]
+    more = [random[i:i + 16] for i in range(16 * entries, 32 * entries, 16)]
+    end = entries / RATE
+
+    def per_entry(seconds: float, count: int) -> float:
+        return round(seconds / count * 1000000000, 1)
+
+    backend = make_backend(entries)
+    results: Dict[str, Any] = {'entries': entries}
+
+    results['insert_ns'] = per_entry(fill(backend, keys), entries)
+    results['held'] = len(backend)
+
+    add = backend.add
+    began = time.perf_counter()
+    for key in keys:
+        add(key, end + LIFETIME, end)
+    results['replay_ns'] = per_entry(time.perf_counter() - began, entries)
+
+    began = time.perf_counter()
+    add(more[0], 3 * end + 2 * LIFETIME, 2 * end + LIFETIME)
+    results['expire_all_ms'] = round(
+        (time.perf_counter() - began) * 1000, 1
+    )
+    results['held_after_expiry'] = len(backend)
+
+    backend.clear()
+    fill(backend, keys)
+    results['insert_full_ns'] = per_entry(fill(backend, more, end), entries)
+    results['held_when_full'] = len(backend)
+    backend.clear()
+
+    if not in_memory:
+        return results
+
+    del backend
+    tracemalloc.start()
+    backend = make_backend(entries)
+    fill(backend, keys)
+    results['bytes_per_entry'] = round(
+        tracemalloc.get_traced_memory()[0] / entries, 1
+    )
+    tracemalloc.stop()
+
+    return results
+
+
+if __name__ == '__main__':
+
+    command_line = CommandLine.load()
+    entries = command_line.get('--entries', int, 'int') or ENTRIES
+    kind = command_line.get('--backend') or 'memory'
+
+    if kind == 'memory':
+        report = run(entries, lambda n: MemoryReplayBackend(max_entries=n))
+    elif kind == 'sqlite':
+        with tempfile.TemporaryDirectory() as directory:
+            report = run(entries, lambda n: SQLiteReplayBackend(
+                os.path.join(directory, 'replay.sqlite3')
+            ), in_memory=False)
+    else:
+        raise ValueError('--backend must be memory or sqlite')
+
+    report['backend'] = kind
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
@@ -0,0 +1,110 @@
+"""
+Signin With Apple
+Representation Benchmark
+author: hugh@blinkybeach.com
+
+Compares memory held per object, and attribute access time, between the
+slotted Header, Payload and IdentityToken and equivalent classes storing
+their fields in a per-instance __dict__ behind lambda properties.
+
+$ python -m siwa.benchmarks.representation
+"""
+import gc
+import timeit
+import tracemalloc
+from typing import Any, Callable, Type
+from siwa import IdentityToken
+from siwa.library.token.header import Header
+from siwa.library.token.payload import Payload
+from siwa.tests.fixtures import SigningKey
+
+COUNT = 20000
+ITERATIONS = 1000000
+
+
+def _unslotted(cls: Type) -> Type:
+    """Return a __dict__-based equivalent of `cls`, as it was before slots"""
+    return type('Unslotted' + cls.__name__, (), {
+        '__init__': cls.__init__,
+        'email': property(lambda s: s._email)
+    })
+
+
+def _bytes_per_object(factory: Callable[[], Any], count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def run(count: int = COUNT, iterations: int = ITERATIONS) -> None:
+
+    token = IdentityToken.parse(SigningKey().token())
+    header = token.header
+    payload = token.payload
+
+    header_fields = dict(
+        identifier=header.identifier,
+        algorithm=header.algorithm
+    )
+    payload_fields = dict(
+        issuer=payload.issuer,
+        subject=payload.unique_apple_user_id,
+        audience=payload.audience,
+        issued_at=payload.issued_utc_seconds_since_epoch,
+        expiration_time=payload.expires_utc_seconds_since_epoch,
+        nonce=None,
+        nonce_supported=True,
+        email=payload.email,
+        email_verified=True,
+        is_private_email=payload.email_is_private,
+        real_person=payload.real_person
+    )
+    token_fields = dict(
+        header=header,
+        raw_token=token._raw_token,
+        payload_start=token._payload_start,
+        signature_start=token._signature_start
+    )
+
+    for cls, fields in (
+        (Header, header_fields),
+        (Payload, payload_fields),
+        (IdentityToken, token_fields)
+    ):
+        unslotted = _unslotted(cls)
+        slotted_size = _bytes_per_object(lambda: cls(**fields), count)
+        unslotted_size = _bytes_per_object(
+            lambda: unslotted(**fields),
+            count
+        )
+        print('{n}: {s:.0f} bytes per object ({u:.0f} unslotted)'.format(
+            n=cls.__name__,
+            s=slotted_size,
+            u=unslotted_size
+        ))
+
+    unslotted_payload = _unslotted(Payload)(**payload_fields)
+    for name, target in (
+        ('slotted', payload),
+        ('unslotted', unslotted_payload)
+    ):
+        elapsed = timeit.timeit(
+            'target.email',
+            globals={'target': target},
+            number=iterations
+        )
+        print('Payload.email ({n}): {t:.1f}ns per access'.format(
+            n=name,
+            t=elapsed / iterations * 1000000000
+        ))
+
+    return
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,182 @@
+"""
+Signin With Apple
+Benchmark Suite
+author: hugh@blinkybeach.com
+
+Measures the hot paths of the library fully offline, against a locally
+generated RSA key served by a stand-in for Apple's key endpoint, and
+writes the results as JSON so that they may be compared between releases.
+
+$ python -m siwa.benchmarks.suite [--output results.json] [--scale 1.0]
+"""
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from os import path
+from typing import Any, Callable, Dict, List
+from siwa import IdentityToken, KeyCache, ApplePublicKey, PooledTransport
+from siwa import ResultCache, ClientSecret
+from siwa.library.command_line import CommandLine
+from siwa.tests.fixtures import SigningKey, KeyServer, ClientKey, AUDIENCE
+
+REPEAT = 5
+BATCH_SIZE = 1000
+
+
+def measure(
+    name: str,
+    function: Callable[[], Any],
+    number: int,
+    operations: int = 1,
+    repeat: int = REPEAT
+) -> Dict[str, Any]:
+    """
+    Time `number` calls to `function`, `repeat` times, each call performing
+    `operations` operations, and return a machine-readable result
+    """
+    timings = timeit.repeat(function, number=number, repeat=repeat)
+    per_operation = [t / (number * operations) for t in timings]
+    best = min(per_operation)
+    return {
+        'name': name,
+        'number': number,
+        'operations': operations,
+        'repeat': repeat,
+        'best_us': round(best * 1000000, 3),
+        'median_us': round(statistics.median(per_operation) * 1000000, 3),
+        'operations_per_second': round(1 / best, 1)
+    }
+
+
+def run(scale: float = 1.0) -> Dict[str, Any]:
+
+    def count(number: int) -> int:
+        return max(1, int(number * scale))
+
+    signing_key = SigningKey()
+    token = signing_key.token()
+    batch = [signing_key.token() for _ in range(count(BATCH_SIZE))]
+
+    results: List[Dict[str, Any]] = []
+
+    with KeyServer([signing_key]) as server:
+
+        transport = PooledTransport(server.origin)
+        warm_cache = KeyCache(transport=transport)
+        ApplePublicKey.retrieve_all(warm_cache)
+        result_cache = ResultCache()
+
+        def verify_hit() -> None:
+            IdentityToken.parse(token).is_validly_signed(
+                audience=AUDIENCE,
+                key_cache=warm_cache
+            )
+
+        def verify_miss() -> None:
+            IdentityToken.parse(token).is_validly_signed(
+                audience=AUDIENCE,
+                key_cache=KeyCache(transport=transport)
+            )
+
+        def verify_result_hit() -> None:
+            IdentityToken.parse(token).is_validly_signed(
+                audience=AUDIENCE,
+                key_cache=warm_cache,
+                result_cache=result_cache
+            )
+
+        def verify_batch() -> None:
+            IdentityToken.verify_many(
+                batch,
+                audience=AUDIENCE,
+                key_cache=warm_cache
+            )
+
+        results.append(measure(
+            'parse',
+            lambda: IdentityToken.parse(token),
+            count(20000)
+        ))
+        results.append(measure(
+            'key_cache_retrieve',
+            lambda: warm_cache.retrieve(signing_key.identifier),
+            count(200000)
+        ))
+        results.append(measure(
+            'verify_key_cache_hit',
+            verify_hit,
+            count(2000)
+        ))
+        results.append(measure(
+            'verify_key_cache_miss',
+            verify_miss,
+            count(200)
+        ))
+        results.append(measure(
+            'verify_result_cache_hit',
+            verify_result_hit,
+            count(20000)
+        ))
+        results.append(measure(
+            'verify_many',
+            verify_batch,
+            1,
+            operations=len(batch)
+        ))
+
+        transport.close()
+
+    client_key = ClientKey()
+    client_secret = ClientSecret(
+        team_id=ClientKey.TEAM_ID,
+        client_id=AUDIENCE,
+        key_id=client_key.identifier,
+        private_key=client_key.pem()
+    )
+    results.append(measure(
+        'client_secret_mint',
+        client_secret.mint,
+        count(2000)
+    ))
+    results.append(measure(
+        'client_secret_cached',
+        client_secret,
+        count(200000)
+    ))
+
+    return {
+        'created': int(time.time()),
+        'version': _version(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def _version() -> str:
+    try:
+        with open(path.join(
+            path.dirname(path.dirname(path.dirname(__file__))),
+            'version'
+        ), encoding='utf-8') as version_file:
+            return version_file.read().strip()
+    except OSError:
+        return 'unknown'
+
+
+if __name__ == '__main__':
+
+    command_line = CommandLine.load()
+    report = run(scale=command_line.get('--scale', float, 'float') or 1.0)
+    output = command_line.get('--output')
+
+    if output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
@@ -0,0 +1,66 @@
+"""
+Signin With Apple
+Verifier Key Benchmark
+author: hugh@blinkybeach.com
+
+Compares per-verification cost of rebuilding a PKCS#1 PEM from the JWK on
+every call against reusing the prepared verifier key held by ApplePublicKey,
+and against single-pass verification of an already parsed IdentityToken.
+
+$ python -m siwa.benchmarks.verifier_key
+"""
+import timeit
+import jwt
+from siwa import ApplePublicKey, IdentityToken, KeyCache
+from siwa.tests.fixtures import SigningKey, AUDIENCE
+
+ITERATIONS = 2000
+
+
+def run(iterations: int = ITERATIONS) -> None:
+
+    signing_key = SigningKey()
+    public_key = ApplePublicKey.decode(signing_key.jwk())
+    token = signing_key.token()
+    key_cache = KeyCache()
+    key_cache.store(public_key)
+    identity_token = IdentityToken.parse(token)
+
+    def rebuild_pem() -> None:
+        jwt.decode(
+            token,
+            key=public_key.rsa_public_key.save_pkcs1(),
+            algorithms=['RS256'],
+            audience=AUDIENCE
+        )
+
+    def prepared_key() -> None:
+        jwt.decode(
+            token,
+            key=public_key.verifier_key,
+            algorithms=['RS256'],
+            audience=AUDIENCE
+        )
+
+    def single_pass() -> None:
+        identity_token.is_validly_signed(
+            audience=AUDIENCE,
+            key_cache=key_cache
+        )
+
+    for name, function in (
+        ('rebuild_pem', rebuild_pem),
+        ('prepared_key', prepared_key),
+        ('single_pass', single_pass)
+    ):
+        elapsed = timeit.timeit(function, number=iterations)
+        print('{n}: {t:.1f}us per verify'.format(
+            n=name,
+            t=elapsed / iterations * 1000000
+        ))
+
+    return
+
+
+if __name__ == '__main__':
+    run()
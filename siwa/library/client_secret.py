@@ -0,0 +1,187 @@
+"""
+Signin With Apple
+Client Secret Module
+author: hugh@blinkybeach.com
+"""
+import json
+import time
+from threading import Lock
+from cryptography.hazmat.primitives.asymmetric.ec import ECDSA, SECP256R1
+from cryptography.hazmat.primitives.asymmetric.ec import (
+    EllipticCurvePrivateKey
+)
+from cryptography.hazmat.primitives.asymmetric.utils import (
+    decode_dss_signature
+)
+from cryptography.hazmat.primitives.hashes import SHA256
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from typing import TypeVar, Type, Union, Optional, Tuple
+from siwa.library.data import Data
+from siwa.library.flight import Flight
+
+T = TypeVar('T', bound='ClientSecret')
+
+
+class ClientSecret:
+    """
+    The client secret presented with requests to Apple's token and revoke
+    endpoints: an ES256-signed JWT naming `team_id` as its issuer and
+    `client_id` (an App ID or Services ID) as its subject, signed with the
+    private key identified by `key_id`, as downloaded from Apple in a .p8
+    file. The key is parsed once. A secret is valid for `lifetime` seconds,
+    at most six months, and is reused until `refresh_margin` seconds before
+    it expires, whereupon one thread mints its replacement while concurrent
+    callers wait for it. Call the ClientSecret to obtain a current secret;
+    it may be passed directly as the `client_secret` of a TokenExchange.
+    """
+
+    AUDIENCE = 'https://appleid.apple.com'
+    ALGORITHM = 'ES256'
+    MAX_LIFETIME = 15777000
+    DEFAULT_LIFETIME = 86400
+    DEFAULT_REFRESH_MARGIN = 300.0
+
+    def __init__(
+        self,
+        team_id: str,
+        client_id: str,
+        key_id: str,
+        private_key: Union[str, bytes],
+        lifetime: int = DEFAULT_LIFETIME,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN
+    ) -> None:
+
+        if lifetime < 1:
+            raise ValueError('lifetime must be positive')
+        if lifetime > self.MAX_LIFETIME:
+            raise ValueError('lifetime may be at most {m} seconds'.format(
+                m=self.MAX_LIFETIME
+            ))
+        if not 0 <= refresh_margin < lifetime:
+            raise ValueError('refresh_margin must be less than lifetime')
+
+        self._team_id = team_id
+        self._client_id = client_id
+        self._key_id = key_id
+        self._lifetime = int(lifetime)
+        self._refresh_margin = refresh_margin
+        self._signing_key = self._load_private_key(private_key)
+        self._header = Data.encode_b64(json.dumps({
+            'alg': self.ALGORITHM,
+            'kid': key_id
+        }, separators=(',', ':')).encode('utf-8'))
+        self._current: Optional[Tuple[str, float, float]] = None
+        self._lock = Lock()
+        self._flight: Optional[Flight] = None
+
+        return
+
+    team_id = property(lambda s: s._team_id)
+    client_id = property(lambda s: s._client_id)
+    key_id = property(lambda s: s._key_id)
+    lifetime = property(lambda s: s._lifetime)
+    refresh_margin = property(lambda s: s._refresh_margin)
+    expires_at = property(lambda s: None if s._current is None else (
+        s._current[1]
+    ))
+
+    @classmethod
+    def from_file(
+        cls: Type[T],
+        path: str,
+        team_id: str,
+        client_id: str,
+        key_id: str,
+        lifetime: int = DEFAULT_LIFETIME,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN
+    ) -> T:
+        """Load the private key from a .p8 file downloaded from Apple"""
+        with open(path, 'rb') as key_file:
+            private_key = key_file.read()
+        return cls(
+            team_id=team_id,
+            client_id=client_id,
+            key_id=key_id,
+            private_key=private_key,
+            lifetime=lifetime,
+            refresh_margin=refresh_margin
+        )
+
+    def __call__(self) -> str:
+        """Return a current client secret, minting one if need be"""
+
+        current = self._current
+        if current is not None and time.time() < current[2]:
+            return current[0]
+
+        with self._lock:
+            current = self._current
+            if current is not None and time.time() < current[2]:
+                return current[0]
+            flight = self._flight
+            is_leader = flight is None
+            if flight is None:
+                flight = Flight()
+                self._flight = flight
+
+        if not is_leader:
+            return flight.wait()
+
+        try:
+            secret = self.mint()
+        except Exception as error:
+            flight.fail(error)
+            raise
+        else:
+            flight.complete(secret)
+        finally:
+            flight.abandon()
+            with self._lock:
+                self._flight = None
+
+        return secret
+
+    def mint(self, now: Optional[float] = None) -> str:
+        """
+        Sign a new client secret, issued at `now`, and hold it for reuse.
+        Ordinarily there is no need to call this directly.
+        """
+        issued_at = int(time.time() if now is None else now)
+        expires_at = issued_at + self._lifetime
+        payload = Data.encode_b64(json.dumps({
+            'iss': self._team_id,
+            'iat': issued_at,
+            'exp': expires_at,
+            'aud': self.AUDIENCE,
+            'sub': self._client_id
+        }, separators=(',', ':')).encode('utf-8'))
+        signed_body = self._header + b'.' + payload
+        secret = (signed_body + b'.' + self._sign(signed_body)).decode('ascii')
+        self._current = (
+            secret,
+            float(expires_at),
+            expires_at - self._refresh_margin
+        )
+        return secret
+
+    def _sign(self, signed_body: bytes) -> bytes:
+        """Return the JWS signature: r and s, each 32 bytes, encoded"""
+        r, s = decode_dss_signature(
+            self._signing_key.sign(signed_body, ECDSA(SHA256()))
+        )
+        return Data.encode_b64(r.to_bytes(32, 'big') + s.to_bytes(32, 'big'))
+
+    @staticmethod
+    def _load_private_key(
+        private_key: Union[str, bytes]
+    ) -> EllipticCurvePrivateKey:
+        """Parse a PEM-encoded P-256 private key, as found in a .p8 file"""
+        if isinstance(private_key, str):
+            private_key = private_key.encode('ascii')
+        key = load_pem_private_key(private_key, password=None)
+        if not isinstance(key, EllipticCurvePrivateKey) or not isinstance(
+            key.curve,
+            SECP256R1
+        ):
+            raise ValueError('private_key must be a P-256 (ES256) key')
+        return key
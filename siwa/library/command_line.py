@@ -23,8 +23,9 @@ class CommandLine:
             value: Optional[str] = None
             argument = arguments[index]
             if argument[0] == '-':
-                next = arguments[index + 1]
-                if (index + 1) < len(arguments) and next[0] != '-':
+                if (index + 1) < len(arguments) and (
+                    arguments[index + 1][0] != '-'
+                ):
                     value = arguments[index + 1]
                     index += 1
                 else:
@@ -4,24 +4,65 @@ Data Module
 author: hugh@blinkybeach.com
 """
 import base64
+import binascii
+import re
 from typing import Union
 
+RawToken = Union[str, bytes, bytearray, memoryview]
+Buffer = Union[bytes, memoryview]
 
-class Data:
+_URLSAFE_ALPHABET = bytes.maketrans(b'-_', b'+/')
+_BASE64URL = re.compile(rb'[A-Za-z0-9_-]*')
 
-    @staticmethod
-    def decode_b64(data: bytes) -> bytes:
-        padded = Data.pad(data)
-        return base64.urlsafe_b64decode(padded)
+
+class Data:
 
     @staticmethod
-    def pad(data: Union[bytes, str]) -> bytes:
+    def decode_b64(data: Union[Buffer, str]) -> bytes:
+        """
+        Decode unpadded base64url from any buffer (e.g. a memoryview of one
+        segment of a token). Only the canonical encoding is accepted: no
+        padding, no characters outside the alphabet, and no bits set in the
+        final character beyond those encoding the data, so that no two
+        encodings decode to the same bytes. Raises ValueError otherwise.
+        """
         if isinstance(data, str):
             data = data.encode('ascii')
+        remainder = len(data) % 4
+        if remainder == 1 or _BASE64URL.fullmatch(data) is None:
+            raise ValueError('Not canonical base64url')
+        # The decoder tolerates surplus padding, so a full pad is appended
+        # in place to a single copy of the input, rather than computing the
+        # exact length or concatenating
+        padded = bytearray(data)
+        padded += b'=='
+        decoded = binascii.a2b_base64(padded.translate(_URLSAFE_ALPHABET))
+        if remainder > 0 and Data.encode_b64(
+            decoded[1 - remainder:]
+        ) != data[-remainder:]:
+            raise ValueError('Not canonical base64url')
+        return decoded
 
-        padding = len(data) % 4
-
-        if padding > 0:
-            data += b'=' * (4 - padding)
+    @staticmethod
+    def encode_b64(data: bytes) -> bytes:
+        return base64.urlsafe_b64encode(data).rstrip(b'=')
 
-        return data
+    @staticmethod
+    def buffer(data: RawToken) -> Buffer:
+        """
+        Return `data` as an immutable buffer of bytes. Bytes and read-only
+        memoryviews are returned without copying, and text is encoded.
+        Mutable buffers, such as a bytearray, are copied once, as a token
+        must not change after it has been parsed.
+        """
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, str):
+            return data.encode('utf-8')
+        if isinstance(data, memoryview) and data.readonly and (
+            data.c_contiguous
+        ):
+            if data.ndim == 1 and data.format == 'B':
+                return data
+            return data.cast('B')
+        return bytes(data)
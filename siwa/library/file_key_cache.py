@@ -0,0 +1,195 @@
+"""
+Signin With Apple
+File Key Cache Module
+author: hugh@blinkybeach.com
+"""
+import json
+import os
+import tempfile
+from typing import Optional, List, Tuple, Type, Dict, Any
+from siwa.library.key_cache import KeyCache
+from siwa.library.key_document import KeyDocument
+from siwa.library.key_protocol import PublicKey
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.transport import Transport
+
+
+class FileKeyCache(KeyCache):
+    """
+    A KeyCache backed by a file, such that processes on the same host (e.g.
+    pre-forked server workers) share Apple's public keys. The file holds the
+    JWKS document, its fetch time and HTTP validators, and is replaced
+    atomically on every write. The validators are dropped while the file
+    holds keys other than those Apple published, such as retired keys. A
+    miss first checks, with a single stat call, whether another process has
+    written newer keys.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        negative_ttl: float = KeyCache.DEFAULT_NEGATIVE_TTL,
+        min_refetch_interval: float = KeyCache.DEFAULT_MIN_REFETCH_INTERVAL,
+        max_keys: int = KeyCache.DEFAULT_MAX_KEYS,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        super().__init__(
+            negative_ttl=negative_ttl,
+            min_refetch_interval=min_refetch_interval,
+            max_keys=max_keys,
+            transport=transport
+        )
+        self._path = path
+        self._file_signature: Optional[Tuple[int, int, int]] = None
+        self.reload()
+
+        return
+
+    path = property(lambda s: s._path)
+
+    def retrieve(self, identifier: str) -> Optional[PublicKey]:
+        key = super().retrieve(identifier)
+        if key is not None:
+            return key
+        if self.reload():
+            return super().retrieve(identifier)
+        return None
+
+    def store_many(self, keys: List[PublicKey]) -> None:
+        with self._write_lock:
+            super().store_many(keys)
+            self._write()
+        return
+
+    def store_document(
+        self,
+        document: KeyDocument,
+        keys: List[PublicKey]
+    ) -> None:
+        with self._write_lock:
+            self._document = document
+            super().store_many(keys)
+            self._write()
+        return
+
+    def refresh(
+        self,
+        keys: List[PublicKey],
+        retire_after: float = 0.0,
+        document: Optional[KeyDocument] = None
+    ) -> None:
+        with self._write_lock:
+            super().refresh(
+                keys,
+                retire_after=retire_after,
+                document=document
+            )
+            self._write()
+        return
+
+    def revalidate(self, document: KeyDocument) -> None:
+        with self._write_lock:
+            super().revalidate(document)
+            self._write()
+        return
+
+    def reload(self) -> bool:
+        """
+        Load keys from the file if it has changed since it was last read or
+        written by this cache. Return True if keys were loaded.
+        """
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return False
+
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self._file_signature:
+            return False
+
+        with self._write_lock:
+
+            if signature == self._file_signature:
+                return False
+
+            try:
+                with open(self._path, 'r', encoding='utf-8') as rfile:
+                    document = KeyDocument.decode(json.load(rfile))
+            except (ValueError, KeyError, OSError):
+                return False
+
+            self._file_signature = signature
+            super().refresh(
+                keys=ApplePublicKey.decode_many(document.keys),
+                document=document
+            )
+
+        return True
+
+    def warm(
+        self,
+        max_age: Optional[float] = None,
+        source: Type[ApplePublicKey] = ApplePublicKey
+    ) -> None:
+        """
+        Ensure the file holds current keys, fetching them if the file is
+        missing, past the lifetime Apple allowed for it, or older than
+        `max_age` seconds. Call before forking workers, so that each worker
+        starts with warm keys.
+        """
+        self.reload()
+        document = self.document
+        if document is not None:
+            if max_age is not None and document.age < max_age:
+                return
+            if max_age is None and not self.is_stale:
+                return
+        source.retrieve_all(self)
+        return
+
+    def _write(self) -> None:
+
+        previous = self.document
+        keys = [k.encode() for k in self._stored_keys.values()]
+        # The validators vouch for the document Apple served, so are kept
+        # only while the stored keys are exactly those it published, lest a
+        # 304 keep retired keys alive indefinitely
+        published = previous is not None and self._publishes(previous, keys)
+        document = KeyDocument(
+            keys=keys,
+            fetched_at=previous.fetched_at if previous else None,
+            etag=previous.etag if published else None,
+            last_modified=previous.last_modified if published else None,
+            max_age=previous.max_age if previous else None
+        )
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=directory,
+            prefix='.siwa-keys-'
+        )
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as wfile:
+                json.dump(document.encode(), wfile)
+                wfile.flush()
+                os.fsync(wfile.fileno())
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, self._path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+        stat = os.stat(self._path)
+        self._file_signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self._document = document
+        return
+
+    @staticmethod
+    def _publishes(document: KeyDocument, keys: List[Dict[str, str]]) -> bool:
+        """Return True if `document` publishes exactly `keys`"""
+        def describe(key: Dict[str, str]) -> Tuple[Any, ...]:
+            return key.get('kid'), key.get('n'), key.get('e')
+        return len(document.keys) == len(keys) and {
+            describe(k) for k in document.keys
+        } == {describe(k) for k in keys}
@@ -0,0 +1,45 @@
+"""
+Signin With Apple
+Flight Module
+author: hugh@blinkybeach.com
+"""
+from threading import Event
+from typing import Optional, Any
+
+
+class Flight:
+    """
+    A unit of work in progress in one thread, upon which other threads
+    wanting the same outcome may wait rather than repeating the work
+    """
+
+    def __init__(self) -> None:
+        self._done = Event()
+        self._result: Any = None
+        self._error: Optional[Exception] = None
+        return
+
+    def complete(self, result: Any = None) -> None:
+        self._result = result
+        self._done.set()
+        return
+
+    def fail(self, error: Exception) -> None:
+        self._error = error
+        self._done.set()
+        return
+
+    def abandon(self) -> None:
+        """
+        Release any waiters if the work ended without an outcome, e.g. when
+        interrupted by KeyboardInterrupt; otherwise, do nothing
+        """
+        if not self._done.is_set():
+            self.fail(RuntimeError('The awaited work was interrupted'))
+        return
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
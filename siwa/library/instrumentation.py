@@ -0,0 +1,47 @@
+"""
+Signin With Apple
+Instrumentation Module
+author: hugh@blinkybeach.com
+"""
+from typing import Optional, TypeVar, Type
+from siwa.library.token.rejection import Rejection
+
+T = TypeVar('T', bound='Instrumentation')
+
+
+class Instrumentation:
+    """
+    Receives measurements from the hot paths of verification. Subclass and
+    override the methods of interest, then `install` an instance. While no
+    instance is installed, which is the default, nothing is measured and
+    each hook costs a single attribute check.
+
+    Durations are in seconds. Key lookup outcomes are `hit`, `stale` (a hit
+    on keys older than Apple allowed them to be cached), `miss` (the key
+    was fetched), `negative` (the key was recently found not to exist) and
+    `unknown` (the key was not found, or could not be fetched). Key fetch
+    outcomes are `ok`, `not_modified` and `error`.
+    """
+
+    active: Optional['Instrumentation'] = None
+
+    @classmethod
+    def install(cls: Type[T], instrumentation: Optional[T]) -> None:
+        """Report measurements to `instrumentation`, or to nothing if None"""
+        Instrumentation.active = instrumentation
+        return
+
+    def token_parsed(self, seconds: float) -> None:
+        return
+
+    def key_looked_up(self, seconds: float, outcome: str) -> None:
+        return
+
+    def key_fetched(self, seconds: float, outcome: str) -> None:
+        return
+
+    def signature_checked(self, seconds: float, valid: bool) -> None:
+        return
+
+    def token_rejected(self, rejection: Rejection) -> None:
+        return
@@ -3,26 +3,337 @@ Apple ID Python
 Key Cache Module
 author: hugh@blinkybeach.com
 """
+import time
+from collections import OrderedDict
 from siwa.library.key_protocol import PublicKey
-from typing import Optional, Dict, List
+from siwa.library.key_document import KeyDocument
+from siwa.library.flight import Flight
+from siwa.library.transport import Transport
+from threading import Lock, RLock
+from types import MappingProxyType
+from typing import Optional, Dict, List, Callable, Awaitable
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import asyncio
 
 
 class KeyCache:
+    """
+    A store of Apple's public keys. Identifiers that Apple does not publish
+    are remembered for `negative_ttl` seconds after a fetch shows them to be
+    unknown, Apple's keys are fetched at most once every
+    `min_refetch_interval` seconds, and at most `max_keys` keys are held, such
+    that tokens naming made-up key identifiers cannot drive requests to Apple
+    or unbounded growth. Keys are fetched through `transport` where one is
+    supplied.
+
+    A KeyCache may be shared between threads. Readers look keys up in an
+    immutable snapshot of the key set, without taking a lock, and writers
+    build a new key set under a lock and publish it with a single
+    assignment, such that a reader sees either the old set or the new one,
+    never a mixture.
+    """
+
+    DEFAULT_NEGATIVE_TTL = 60.0
+    DEFAULT_MIN_REFETCH_INTERVAL = 10.0
+    DEFAULT_MAX_KEYS = 64
+    MAX_NEGATIVE_ENTRIES = 4096
+
+    _shared: Optional['KeyCache'] = None
+    _shared_lock = Lock()
+
+    def __init__(
+        self,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        min_refetch_interval: float = DEFAULT_MIN_REFETCH_INTERVAL,
+        max_keys: int = DEFAULT_MAX_KEYS,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        if max_keys < 1:
+            raise ValueError('max_keys must be at least 1')
+
+        self._transport = transport
+        self._negative_ttl = negative_ttl
+        self._min_refetch_interval = min_refetch_interval
+        self._max_keys = max_keys
 
-    def __init__(self) -> None:
         self._stored_keys: Dict[str, PublicKey] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._document: Optional[KeyDocument] = None
+        self._unknown: 'OrderedDict[str, float]' = OrderedDict()
+        self._last_fetch: Optional[float] = None
+        self._write_lock = RLock()
+        self._flight_lock = Lock()
+        self._flight: Optional[Flight] = None
+        self._async_flight: Optional['asyncio.Future'] = None
         return
 
+    @staticmethod
+    def shared() -> 'KeyCache':
+        """
+        Return a KeyCache shared by every component in this process that is
+        not given one of its own, such that Apple's keys are fetched once
+        and kept warm for all of them
+        """
+        shared = KeyCache._shared
+        if shared is not None:
+            return shared
+        with KeyCache._shared_lock:
+            if KeyCache._shared is None:
+                KeyCache._shared = KeyCache()
+            return KeyCache._shared
+
+    document = property(lambda s: s._document)
+    snapshot = property(lambda s: MappingProxyType(s._stored_keys))
+    max_keys = property(lambda s: s._max_keys)
+    transport = property(lambda s: s._transport)
+    is_stale = property(lambda s: s._document is None or not (
+        s._document.is_fresh
+    ))
+
     def store(self, key: PublicKey) -> None:
-        self._stored_keys[key.identifier] = key
+        self.store_many([key])
         return
 
     def store_many(self, keys: List[PublicKey]) -> None:
-        for k in keys:
-            self.store(k)
+        with self._write_lock:
+            now = time.monotonic()
+            stored = dict(self._stored_keys)
+            last_seen = dict(self._last_seen)
+            for key in keys:
+                stored[key.identifier] = key
+                last_seen[key.identifier] = now
+                self._unknown.pop(key.identifier, None)
+            self._publish(stored, last_seen)
+        return
+
+    def store_document(
+        self,
+        document: KeyDocument,
+        keys: List[PublicKey]
+    ) -> None:
+        """Store `keys`, as decoded from a freshly fetched `document`"""
+        with self._write_lock:
+            self._document = document
+            self.store_many(keys)
+        return
+
+    def revalidate(self, document: KeyDocument) -> None:
+        """
+        Record `document`, as Apple's confirmation that the stored keys are
+        unchanged since they were last fetched
+        """
+        with self._write_lock:
+            self._document = document
+        return
+
+    def refresh(
+        self,
+        keys: List[PublicKey],
+        retire_after: float = 0.0,
+        document: Optional[KeyDocument] = None
+    ) -> None:
+        """
+        Atomically replace the stored key set with `keys`, as most recently
+        published by Apple. Stored keys that are unchanged are kept, along
+        with their prepared verifier keys, and new keys are prepared before
+        they are published. Keys no longer published are retained until
+        `retire_after` seconds have passed since they were last seen.
+        """
+        with self._write_lock:
+
+            now = time.monotonic()
+            current = self._stored_keys
+            last_seen = dict(self._last_seen)
+            refreshed: Dict[str, PublicKey] = {}
+
+            for key in keys:
+                existing = current.get(key.identifier)
+                if existing is not None and existing == key:
+                    key = existing
+                else:
+                    key.verifier_key  # Prepare ahead of first verification
+                refreshed[key.identifier] = key
+                last_seen[key.identifier] = now
+                self._unknown.pop(key.identifier, None)
+
+            for identifier, key in current.items():
+                if identifier in refreshed:
+                    continue
+                if now - last_seen.setdefault(identifier, now) < retire_after:
+                    refreshed[identifier] = key
+                    continue
+                del last_seen[identifier]
+
+            self._publish(refreshed, last_seen)
+            if document is not None:
+                self._document = document
+
         return
 
     def retrieve(self, identifier: str) -> Optional[PublicKey]:
-        if identifier in self._stored_keys.keys():
-            return self._stored_keys[identifier]
+        return self._stored_keys.get(identifier)
+
+    def is_known_unknown(self, identifier: str) -> bool:
+        """
+        Return True if `identifier` was recently found not to be published
+        by Apple, and so should be rejected without a fetch
+        """
+        expires_at = self._unknown.get(identifier)
+        if expires_at is None:
+            return False
+        return expires_at > time.monotonic()
+
+    def retrieve_or_fetch(
+        self,
+        identifier: str,
+        fetch: Callable[['KeyCache'], List[PublicKey]]
+    ) -> Optional[PublicKey]:
+        """
+        Return the key with the supplied identifier, calling `fetch` with
+        this cache to populate it on a miss. Concurrent misses, for any
+        identifier, share a single in-flight call to `fetch`.
+        """
+        cached = self.retrieve(identifier)
+        if cached is not None:
+            return cached
+        if self.is_known_unknown(identifier):
+            return None
+
+        with self._flight_lock:
+            cached = self.retrieve(identifier)
+            if cached is not None:
+                return cached
+            flight = self._flight
+            is_leader = flight is None
+            if flight is None:
+                if not self._may_fetch():
+                    return None
+                flight = Flight()
+                self._flight = flight
+                self._last_fetch = time.monotonic()
+
+        if not is_leader:
+            flight.wait()
+            return self._retrieve_fetched(identifier)
+
+        try:
+            fetch(self)
+        except Exception as error:
+            flight.fail(error)
+            raise
+        else:
+            flight.complete()
+        finally:
+            flight.abandon()
+            with self._flight_lock:
+                self._flight = None
+
+        return self._retrieve_fetched(identifier)
+
+    async def retrieve_or_fetch_async(
+        self,
+        identifier: str,
+        fetch: Callable[['KeyCache'], Awaitable[List[PublicKey]]]
+    ) -> Optional[PublicKey]:
+        """
+        Asynchronous counterpart to `retrieve_or_fetch`. A hit returns
+        without yielding to the event loop. Concurrent misses within the
+        same event loop share a single awaited call to `fetch`.
+        """
+        cached = self.retrieve(identifier)
+        if cached is not None:
+            return cached
+        if self.is_known_unknown(identifier):
+            return None
+
+        import asyncio
+        loop = asyncio.get_running_loop()
+        flight = self._async_flight
+        while flight is not None and flight.get_loop() is loop:
+            try:
+                await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The fetching task was cancelled; retry on our own behalf
+                cached = self.retrieve(identifier)
+                if cached is not None:
+                    return cached
+                flight = self._async_flight
+                continue
+            return self._retrieve_fetched(identifier)
+
+        if not self._may_fetch():
+            return None
+
+        flight = loop.create_future()
+        self._async_flight = flight
+        self._last_fetch = time.monotonic()
+
+        try:
+            await fetch(self)
+        except Exception as error:
+            flight.set_exception(error)
+            # Mark the exception retrieved, so that a flight with no other
+            # waiters does not log a warning when garbage collected
+            flight.exception()
+            raise
+        except BaseException:
+            flight.cancel()
+            raise
+        else:
+            flight.set_result(None)
+        finally:
+            if self._async_flight is flight:
+                self._async_flight = None
+
+        return self._retrieve_fetched(identifier)
+
+    def _may_fetch(self) -> bool:
+        if self._last_fetch is None:
+            return True
+        elapsed = time.monotonic() - self._last_fetch
+        return elapsed >= self._min_refetch_interval
+
+    def _retrieve_fetched(self, identifier: str) -> Optional[PublicKey]:
+        key = self.retrieve(identifier)
+        if key is None:
+            return self._remember_unknown(identifier)
+        return key
+
+    def _remember_unknown(self, identifier: str) -> None:
+        if self._negative_ttl <= 0:
+            return None
+        with self._write_lock:
+            unknown = self._unknown
+            unknown[identifier] = time.monotonic() + self._negative_ttl
+            unknown.move_to_end(identifier)
+            while len(unknown) > self.MAX_NEGATIVE_ENTRIES:
+                unknown.popitem(last=False)
         return None
+
+    def _publish(
+        self,
+        keys: Dict[str, PublicKey],
+        last_seen: Dict[str, float]
+    ) -> None:
+        """
+        Replace the stored key set with `keys`, less those least recently
+        seen beyond max_keys. The caller holds the write lock, and neither
+        dictionary may be mutated once published.
+        """
+        if len(keys) > self._max_keys:
+            retained = set(sorted(
+                keys,
+                key=lambda i: last_seen.get(i, 0.0),
+                reverse=True
+            )[:self._max_keys])
+            for identifier in keys:
+                if identifier not in retained:
+                    last_seen.pop(identifier, None)
+            keys = {i: k for i, k in keys.items() if i in retained}
+        self._last_seen = last_seen
+        self._stored_keys = keys
+        return
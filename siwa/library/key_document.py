@@ -0,0 +1,89 @@
+"""
+Signin With Apple
+Key Document Module
+author: hugh@blinkybeach.com
+"""
+import time
+from typing import TypeVar, Type, Dict, List, Optional, Any
+
+T = TypeVar('T', bound='KeyDocument')
+
+
+class KeyDocument:
+    """
+    A JWKS document as published by Apple, along with the time at which it
+    was fetched, how long Apple said it may be cached for, and the HTTP
+    validators it was served with
+    """
+
+    def __init__(
+        self,
+        keys: List[Dict[str, str]],
+        fetched_at: Optional[float] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        max_age: Optional[float] = None,
+        not_modified: bool = False
+    ) -> None:
+
+        self._keys = keys
+        self._fetched_at = fetched_at if fetched_at is not None else (
+            time.time()
+        )
+        self._etag = etag
+        self._last_modified = last_modified
+        self._max_age = max_age
+        self._not_modified = not_modified
+
+        return
+
+    keys = property(lambda s: s._keys)
+    fetched_at = property(lambda s: s._fetched_at)
+    etag = property(lambda s: s._etag)
+    last_modified = property(lambda s: s._last_modified)
+    max_age = property(lambda s: s._max_age)
+    not_modified = property(lambda s: s._not_modified)
+    age = property(lambda s: time.time() - s._fetched_at)
+    expires_at = property(lambda s: None if s._max_age is None else (
+        s._fetched_at + s._max_age
+    ))
+    is_fresh = property(lambda s: s._max_age is not None and (
+        s.age < s._max_age
+    ))
+
+    def revalidated(
+        self: T,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        max_age: Optional[float] = None
+    ) -> T:
+        """
+        Return a copy of this document, fetched now, as confirmed unchanged
+        by a 304 Not Modified response
+        """
+        return type(self)(
+            keys=self._keys,
+            etag=etag or self._etag,
+            last_modified=last_modified or self._last_modified,
+            max_age=max_age,
+            not_modified=True
+        )
+
+    def encode(self) -> Dict[str, Any]:
+        return {
+            'keys': self._keys,
+            'fetched_at': self._fetched_at,
+            'etag': self._etag,
+            'last_modified': self._last_modified,
+            'max_age': self._max_age
+        }
+
+    @classmethod
+    def decode(cls: Type[T], data: Dict[str, Any]) -> T:
+        return cls(
+            keys=data['keys'],
+            fetched_at=data['fetched_at'],
+            etag=data.get('etag'),
+            last_modified=data.get('last_modified'),
+            max_age=data.get('max_age')
+        )
@@ -3,10 +3,29 @@ Apple ID Python
 Key Protocol Module
 author: hugh@blinkybeach.com
 """
-from rsa import PublicKey as RSA_PublicKey
+from typing import Dict, Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 
 
 class PublicKey:
-    """Abstract protocol defining behaviour of implemented public keys"""
+    """
+    Abstract protocol defining behaviour of implemented public keys. Keys
+    are verified with `verifier_key`, which by default is built from the
+    PythonRSA `rsa_public_key` on each use; implementations should build it
+    once and reuse it.
+    """
     identifier: str = NotImplemented
-    rsa_public_key: RSA_PublicKey = NotImplemented
+    rsa_public_key: Any = NotImplemented
+    verifier_key = property(lambda s: s._load_verifier_key())
+
+    def encode(self) -> Dict[str, str]:
+        """Return this key as a JWK"""
+        raise NotImplementedError
+
+    def _load_verifier_key(self) -> 'RSAPublicKey':
+        from cryptography.hazmat.primitives.asymmetric.rsa import (
+            RSAPublicNumbers
+        )
+        key = self.rsa_public_key
+        return RSAPublicNumbers(e=key.e, n=key.n).public_key()
@@ -0,0 +1,209 @@
+"""
+Signin With Apple
+Key Refresher Module
+author: hugh@blinkybeach.com
+"""
+import asyncio
+from threading import Thread, Event
+from typing import Optional, Any, Type
+from siwa.library.key_cache import KeyCache
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.transport import Transport
+
+
+class KeyRefresher:
+    """
+    Periodically re-fetches Apple's public keys in a background thread,
+    refreshing a KeyCache so that newly published keys are warm before the
+    first token signed with them arrives. Unless an `interval` is given,
+    keys are re-fetched when the lifetime Apple allowed for them (via
+    Cache-Control) runs out, within the bounds of MIN_INTERVAL and
+    DEFAULT_INTERVAL.
+    """
+
+    MIN_INTERVAL = 60.0
+    DEFAULT_INTERVAL = 3600.0
+    DEFAULT_RETRY_INTERVAL = 60.0
+    DEFAULT_RETIRE_AFTER = 3600.0
+
+    def __init__(
+        self,
+        cache: KeyCache,
+        interval: Optional[float] = None,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+        retire_after: float = DEFAULT_RETIRE_AFTER,
+        source: Type[ApplePublicKey] = ApplePublicKey,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        if (interval is not None and interval <= 0) or retry_interval <= 0:
+            raise ValueError('Refresh intervals must be positive')
+
+        self._cache = cache
+        self._interval = interval
+        self._retry_interval = retry_interval
+        self._retire_after = retire_after
+        self._source = source
+        self._transport = transport
+        self._stopping = Event()
+        self._thread: Optional[Thread] = None
+        self._last_error: Optional[Exception] = None
+
+        return
+
+    cache = property(lambda s: s._cache)
+    is_running = property(lambda s: s._thread is not None)
+    last_error = property(lambda s: s._last_error)
+
+    def refresh_now(self) -> None:
+        """Fetch Apple's public keys and refresh the cache immediately"""
+        self._source.refresh_cache(
+            cache=self._cache,
+            retire_after=self._retire_after,
+            transport=self._transport
+        )
+        return
+
+    def start(self) -> 'KeyRefresher':
+        """Begin refreshing in a daemon thread, starting immediately"""
+        if self._thread is not None:
+            raise RuntimeError('KeyRefresher already started')
+        self._stopping.clear()
+        self._thread = Thread(
+            target=self._run,
+            name='siwa-key-refresher',
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop refreshing, waiting for any refresh in progress"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self._thread = None
+        return
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.refresh_now()
+            except Exception as error:
+                # Keep serving the keys we have, and try again sooner
+                self._last_error = error
+                wait = self._retry_interval
+            else:
+                self._last_error = None
+                wait = _next_interval(self._interval, self._cache)
+            self._stopping.wait(wait)
+        return
+
+    def __enter__(self) -> 'KeyRefresher':
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+        return
+
+
+class AsyncKeyRefresher:
+    """
+    Periodically re-fetches Apple's public keys in an asyncio task,
+    refreshing a KeyCache without blocking the event loop
+    """
+
+    MIN_INTERVAL = KeyRefresher.MIN_INTERVAL
+    DEFAULT_INTERVAL = KeyRefresher.DEFAULT_INTERVAL
+    DEFAULT_RETRY_INTERVAL = KeyRefresher.DEFAULT_RETRY_INTERVAL
+    DEFAULT_RETIRE_AFTER = KeyRefresher.DEFAULT_RETIRE_AFTER
+
+    def __init__(
+        self,
+        cache: KeyCache,
+        interval: Optional[float] = None,
+        retry_interval: float = DEFAULT_RETRY_INTERVAL,
+        retire_after: float = DEFAULT_RETIRE_AFTER,
+        source: Type[ApplePublicKey] = ApplePublicKey,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        if (interval is not None and interval <= 0) or retry_interval <= 0:
+            raise ValueError('Refresh intervals must be positive')
+
+        self._cache = cache
+        self._interval = interval
+        self._retry_interval = retry_interval
+        self._retire_after = retire_after
+        self._source = source
+        self._transport = transport
+        self._task: Optional[asyncio.Task] = None
+        self._last_error: Optional[Exception] = None
+
+        return
+
+    cache = property(lambda s: s._cache)
+    is_running = property(lambda s: s._task is not None)
+    last_error = property(lambda s: s._last_error)
+
+    async def refresh_now(self) -> None:
+        """Fetch Apple's public keys and refresh the cache immediately"""
+        await self._source.refresh_cache_async(
+            cache=self._cache,
+            retire_after=self._retire_after,
+            transport=self._transport
+        )
+        return
+
+    def start(self) -> 'AsyncKeyRefresher':
+        """Begin refreshing in a task on the running event loop"""
+        if self._task is not None:
+            raise RuntimeError('AsyncKeyRefresher already started')
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self) -> None:
+        """Cancel the refresh task and wait for it to finish"""
+        task = self._task
+        if task is None:
+            return
+        self._task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_now()
+            except Exception as error:
+                self._last_error = error
+                wait = self._retry_interval
+            else:
+                self._last_error = None
+                wait = _next_interval(self._interval, self._cache)
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self) -> 'AsyncKeyRefresher':
+        return self.start()
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+        return
+
+
+def _next_interval(interval: Optional[float], cache: KeyCache) -> float:
+    if interval is not None:
+        return interval
+    document = cache.document
+    if document is None or document.max_age is None:
+        return KeyRefresher.DEFAULT_INTERVAL
+    return min(
+        max(document.max_age, KeyRefresher.MIN_INTERVAL),
+        KeyRefresher.DEFAULT_INTERVAL
+    )
@@ -0,0 +1,361 @@
+"""
+Signin With Apple
+Middleware Module
+author: hugh@blinkybeach.com
+"""
+import json
+import os
+from threading import Lock
+from typing import Optional, Any, Callable, Awaitable, Dict, List, Tuple
+from typing import Iterable, MutableMapping, Union
+from siwa.library.key_cache import KeyCache
+from siwa.library.key_refresher import KeyRefresher, AsyncKeyRefresher
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.transport import Transport
+from siwa.library.verifier import Verifier
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class Authenticator:
+    """
+    Configuration and behaviour shared by WSGIMiddleware and
+    ASGIMiddleware. Tokens are read from the `header` request header, less
+    any `Bearer` prefix, and accepted if issued for `audience`, or for any
+    of several audiences. Unless a `key_cache` or a `transport` is
+    supplied, every middleware in the process shares one KeyCache. The
+    cache is warmed when the middleware starts and kept fresh by a
+    background refresher, so that keys Apple rotates in are held before the
+    first token signed with them arrives.
+    """
+
+    MISSING_TOKEN = 'missing_token'
+    RESULT_KEY = 'siwa.result'
+    PAYLOAD_KEY = 'siwa.payload'
+
+    _DENIAL_HEADERS = (
+        ('Content-Type', 'application/json'),
+        ('WWW-Authenticate', 'Bearer error="invalid_token"')
+    )
+
+    def __init__(
+        self,
+        audience: Union[str, Iterable[str]],
+        key_cache: Optional[KeyCache] = None,
+        header: str = 'Authorization',
+        required: bool = True,
+        ignore_expiry: bool = False,
+        refresh: bool = True,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        if key_cache is None:
+            if transport is None:
+                key_cache = self.shared_key_cache()
+            else:
+                key_cache = KeyCache(transport=transport)
+
+        self._verifier = Verifier(
+            audiences=audience,
+            key_cache=key_cache,
+            ignore_expiry=ignore_expiry
+        )
+        self._key_cache = key_cache
+        self._header = header
+        self._required = required
+        self._refresh = refresh
+        self._transport = transport
+
+        return
+
+    key_cache = property(lambda s: s._key_cache)
+    verifier = property(lambda s: s._verifier)
+
+    @classmethod
+    def shared_key_cache(cls) -> KeyCache:
+        """Return the KeyCache shared by middleware in this process"""
+        return KeyCache.shared()
+
+    def _token_from(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        value = value.strip()
+        if value[:7].lower() == 'bearer ':
+            value = value[7:].strip()
+        return value or None
+
+    @staticmethod
+    def _denial(reason: Optional[str]) -> bytes:
+        return json.dumps({
+            'error': 'invalid_token',
+            'reason': reason
+        }).encode('utf-8')
+
+
+class WSGIMiddleware(Authenticator):
+    """
+    WSGI middleware that verifies the identity token presented with each
+    request, making the VerificationResult available as
+    `environ['siwa.result']` and, where the token is valid, the Payload as
+    `environ['siwa.payload']`. Requests without a valid token are answered
+    401 Unauthorized, unless `required` is False. Keys are fetched when the
+    middleware is constructed, such that workers forked afterwards start
+    warm, and each process refreshes them in a background thread.
+    """
+
+    def __init__(
+        self,
+        application: Callable[..., Iterable[bytes]],
+        audience: Union[str, Iterable[str]],
+        key_cache: Optional[KeyCache] = None,
+        header: str = 'Authorization',
+        required: bool = True,
+        ignore_expiry: bool = False,
+        refresh: bool = True,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        super().__init__(
+            audience=audience,
+            key_cache=key_cache,
+            header=header,
+            required=required,
+            ignore_expiry=ignore_expiry,
+            refresh=refresh,
+            transport=transport
+        )
+        self._application = application
+        self._environ_key = 'HTTP_' + header.upper().replace('-', '_')
+        self._refresher: Optional[KeyRefresher] = None
+        self._refresher_pid: Optional[int] = None
+        self._refresher_lock = Lock()
+
+        self.warm()
+
+        return
+
+    def warm(self) -> None:
+        """
+        Fetch Apple's keys now. A failure is tolerated, as keys are also
+        fetched on demand, and by the refresher.
+        """
+        try:
+            ApplePublicKey.retrieve_all(self._key_cache, self._transport)
+        except Exception:
+            pass
+        return
+
+    def close(self) -> None:
+        """Stop refreshing keys in this process"""
+        with self._refresher_lock:
+            if self._refresher is not None:
+                self._refresher.stop()
+                self._refresher = None
+        return
+
+    def __call__(
+        self,
+        environ: Dict[str, Any],
+        start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+
+        if self._refresh and self._refresher_pid != os.getpid():
+            self._start_refresher()
+
+        raw_token = self._token_from(environ.get(self._environ_key))
+        if raw_token is None:
+            if self._required:
+                return self._deny(start_response, self.MISSING_TOKEN)
+            return self._application(environ, start_response)
+
+        result = self._verifier.verify_raw(raw_token)
+        environ[self.RESULT_KEY] = result
+
+        if result.valid:
+            environ[self.PAYLOAD_KEY] = result.payload
+        elif self._required:
+            return self._deny(start_response, result.reason)
+
+        return self._application(environ, start_response)
+
+    def _start_refresher(self) -> None:
+        """
+        Start a refresher in this process. Threads do not survive a fork, so
+        a worker forked from a process that was refreshing starts its own.
+        """
+        with self._refresher_lock:
+            pid = os.getpid()
+            if self._refresher_pid == pid:
+                return
+            self._refresher = KeyRefresher(
+                self._key_cache,
+                transport=self._transport
+            ).start()
+            self._refresher_pid = pid
+        return
+
+    def _deny(
+        self,
+        start_response: Callable[..., Any],
+        reason: Optional[str]
+    ) -> List[bytes]:
+        body = self._denial(reason)
+        start_response('401 Unauthorized', list(self._DENIAL_HEADERS) + [
+            ('Content-Length', str(len(body)))
+        ])
+        return [body]
+
+
+class ASGIMiddleware(Authenticator):
+    """
+    ASGI middleware that verifies the identity token presented with each
+    HTTP request or WebSocket connection, adding the VerificationResult to
+    the scope as `scope['siwa.result']` and, where the token is valid, the
+    Payload as `scope['siwa.payload']`. Requests without a valid token are
+    answered 401 Unauthorized (or, for a WebSocket, closed), unless
+    `required` is False. Keys are fetched and then refreshed in a task on
+    the event loop, from lifespan startup or else from the first request,
+    and retrieved without blocking the loop.
+    """
+
+    def __init__(
+        self,
+        application: Callable[[Scope, Receive, Send], Awaitable[None]],
+        audience: Union[str, Iterable[str]],
+        key_cache: Optional[KeyCache] = None,
+        header: str = 'Authorization',
+        required: bool = True,
+        ignore_expiry: bool = False,
+        refresh: bool = True,
+        transport: Optional[Transport] = None
+    ) -> None:
+
+        super().__init__(
+            audience=audience,
+            key_cache=key_cache,
+            header=header,
+            required=required,
+            ignore_expiry=ignore_expiry,
+            refresh=refresh,
+            transport=transport
+        )
+        self._application = application
+        self._header_key = header.lower().encode('latin-1')
+        self._refresher: Optional[AsyncKeyRefresher] = None
+        self._started = False
+
+        return
+
+    async def startup(self) -> None:
+        """Fetch Apple's keys, and begin refreshing them"""
+        if self._started:
+            return
+        self._started = True
+        try:
+            await ApplePublicKey.retrieve_all_async(
+                self._key_cache,
+                self._transport
+            )
+        except Exception:
+            pass
+        if self._refresh:
+            self._refresher = AsyncKeyRefresher(
+                self._key_cache,
+                transport=self._transport
+            ).start()
+        return
+
+    async def shutdown(self) -> None:
+        """Stop refreshing Apple's keys"""
+        if self._refresher is not None:
+            await self._refresher.stop()
+            self._refresher = None
+        self._started = False
+        return
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send
+    ) -> None:
+
+        kind = scope['type']
+        if kind == 'lifespan':
+            await self._application(scope, self._lifespan(receive), send)
+            return
+        if kind not in ('http', 'websocket'):
+            await self._application(scope, receive, send)
+            return
+
+        if not self._started:
+            await self.startup()
+
+        raw_token = self._token_from(self._header_value(scope))
+        if raw_token is None:
+            if self._required:
+                await self._deny(scope, send, self.MISSING_TOKEN)
+                return
+            await self._application(scope, receive, send)
+            return
+
+        result = await self._verifier.verify_raw_async(raw_token)
+        if not result.valid and self._required:
+            await self._deny(scope, send, result.reason)
+            return
+
+        scope = dict(scope)
+        scope[self.RESULT_KEY] = result
+        if result.valid:
+            scope[self.PAYLOAD_KEY] = result.payload
+
+        await self._application(scope, receive, send)
+        return
+
+    def _lifespan(self, receive: Receive) -> Receive:
+        """Wrap `receive`, starting and stopping with the application"""
+
+        async def receive_lifespan() -> Message:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+            return message
+
+        return receive_lifespan
+
+    def _header_value(self, scope: Scope) -> Optional[str]:
+        for name, value in scope.get('headers', ()):
+            if name == self._header_key:
+                return value.decode('latin-1')
+        return None
+
+    async def _deny(
+        self,
+        scope: Scope,
+        send: Send,
+        reason: Optional[str]
+    ) -> None:
+
+        if scope['type'] == 'websocket':
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+
+        body = self._denial(reason)
+        headers: List[Tuple[bytes, bytes]] = [
+            (k.lower().encode('latin-1'), v.encode('latin-1'))
+            for k, v in self._DENIAL_HEADERS
+        ]
+        headers.append((b'content-length', str(len(body)).encode('ascii')))
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': headers
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
@@ -0,0 +1,69 @@
+"""
+Signin With Apple
+OpenTelemetry Instrumentation Module
+author: hugh@blinkybeach.com
+"""
+import time
+from typing import Any, Dict, Optional
+from siwa.library.instrumentation import Instrumentation
+from siwa.library.token.rejection import Rejection
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    """
+    Instrumentation that records each measured stage as an OpenTelemetry
+    span, as a child of whichever span is current, and each rejection as an
+    event on the current span. Requires the `opentelemetry-api` package.
+    """
+
+    def __init__(self, tracer: Optional[Any] = None) -> None:
+
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError('OpenTelemetryInstrumentation requires the `o\
+pentelemetry-api` package')
+
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer('siwa')
+
+        return
+
+    def token_parsed(self, seconds: float) -> None:
+        self._span('siwa.parse', seconds, {})
+        return
+
+    def key_looked_up(self, seconds: float, outcome: str) -> None:
+        self._span('siwa.key_lookup', seconds, {'siwa.outcome': outcome})
+        return
+
+    def key_fetched(self, seconds: float, outcome: str) -> None:
+        self._span('siwa.key_fetch', seconds, {'siwa.outcome': outcome})
+        return
+
+    def signature_checked(self, seconds: float, valid: bool) -> None:
+        self._span('siwa.signature_check', seconds, {'siwa.valid': valid})
+        return
+
+    def token_rejected(self, rejection: Rejection) -> None:
+        self._trace.get_current_span().add_event(
+            'siwa.rejection',
+            {'siwa.reason': rejection.value}
+        )
+        return
+
+    def _span(
+        self,
+        name: str,
+        seconds: float,
+        attributes: Dict[str, Any]
+    ) -> None:
+        """Record a span that ended now, having lasted `seconds`"""
+        end = time.time_ns()
+        span = self._tracer.start_span(
+            name,
+            start_time=end - int(seconds * 1000000000),
+            attributes=attributes
+        )
+        span.end(end_time=end)
+        return
@@ -0,0 +1,151 @@
+"""
+Signin With Apple
+Prometheus Instrumentation Module
+author: hugh@blinkybeach.com
+"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Tuple, Sequence
+from siwa.library.instrumentation import Instrumentation
+from siwa.library.token.rejection import Rejection
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """
+    Instrumentation that accumulates counters and latency histograms in
+    memory, and renders them in the Prometheus text exposition format, e.g.
+    from a `/metrics` endpoint. No Prometheus client library is required.
+    """
+
+    DEFAULT_BUCKETS = (
+        0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+        0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+    )
+
+    _HELP = {
+        'token_parse_seconds': 'Time taken to parse an identity token',
+        'key_lookups_total': 'Public key lookups, by outcome',
+        'key_lookup_seconds': 'Time taken to look up a public key',
+        'key_fetches_total': 'Requests for Apple\'s public keys, by outcome',
+        'key_fetch_seconds': 'Time taken to fetch Apple\'s public keys',
+        'signature_checks_total': 'Signature checks, by validity',
+        'signature_check_seconds': 'Time taken to check a signature',
+        'rejections_total': 'Identity tokens rejected, by reason'
+    }
+
+    def __init__(
+        self,
+        namespace: str = 'siwa',
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+
+        self._namespace = namespace
+        self._buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+        return
+
+    def token_parsed(self, seconds: float) -> None:
+        self._observe('token_parse_seconds', (), seconds)
+        return
+
+    def key_looked_up(self, seconds: float, outcome: str) -> None:
+        labels = (('outcome', outcome),)
+        self._increment('key_lookups_total', labels)
+        self._observe('key_lookup_seconds', labels, seconds)
+        return
+
+    def key_fetched(self, seconds: float, outcome: str) -> None:
+        labels = (('outcome', outcome),)
+        self._increment('key_fetches_total', labels)
+        self._observe('key_fetch_seconds', labels, seconds)
+        return
+
+    def signature_checked(self, seconds: float, valid: bool) -> None:
+        labels = (('valid', 'true' if valid else 'false'),)
+        self._increment('signature_checks_total', labels)
+        self._observe('signature_check_seconds', (), seconds)
+        return
+
+    def token_rejected(self, rejection: Rejection) -> None:
+        self._increment('rejections_total', (('reason', rejection.value),))
+        return
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format"""
+
+        lines: List[str] = []
+
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.extend(self._preamble(name, 'counter'))
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(self._sample(name, labels, value))
+            for name in sorted(self._histograms):
+                lines.extend(self._preamble(name, 'histogram'))
+                for labels, state in sorted(self._histograms[name].items()):
+                    lines.extend(self._histogram(name, labels, state))
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def _increment(self, name: str, labels: Labels) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + 1
+        return
+
+    def _observe(self, name: str, labels: Labels, seconds: float) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.get(labels)
+            if state is None:
+                # One count per bucket, then the +Inf count and the sum
+                state = [0.0] * (len(self._buckets) + 2)
+                series[labels] = state
+            state[bisect_left(self._buckets, seconds)] += 1
+            state[-1] += seconds
+        return
+
+    def _preamble(self, name: str, kind: str) -> List[str]:
+        full_name = self._namespace + '_' + name
+        return [
+            '# HELP {n} {h}'.format(n=full_name, h=self._HELP[name]),
+            '# TYPE {n} {k}'.format(n=full_name, k=kind)
+        ]
+
+    def _histogram(
+        self,
+        name: str,
+        labels: Labels,
+        state: List[float]
+    ) -> List[str]:
+        lines = []
+        cumulative = 0.0
+        for bound, count in zip(self._buckets, state):
+            cumulative += count
+            lines.append(self._sample(
+                name + '_bucket',
+                labels + (('le', repr(bound)),),
+                cumulative
+            ))
+        cumulative += state[-2]
+        lines.append(self._sample(
+            name + '_bucket',
+            labels + (('le', '+Inf'),),
+            cumulative
+        ))
+        lines.append(self._sample(name + '_count', labels, cumulative))
+        lines.append(self._sample(name + '_sum', labels, state[-1]))
+        return lines
+
+    def _sample(self, name: str, labels: Labels, value: float) -> str:
+        full_name = self._namespace + '_' + name
+        if labels:
+            full_name += '{' + ','.join(
+                '{k}="{v}"'.format(k=k, v=v) for k, v in labels
+            ) + '}'
+        return '{n} {v}'.format(n=full_name, v=repr(float(value)))
@@ -3,21 +3,28 @@ Apple ID Python
 Public Key Module
 author: hugh@blinkybeach.com
 """
+import time
 from typing import TypeVar, Type
-from urllib.request import Request, urlopen
-from typing import List, Dict, Optional
-from rsa import PublicKey as RSA_PublicKey
+from typing import List, Dict, Optional, Any, TYPE_CHECKING
 from siwa.library.data import Data
-import json
+from threading import Lock
 from siwa.library.key_protocol import PublicKey
 from siwa.library.key_cache import KeyCache
+from siwa.library.key_document import KeyDocument
+from siwa.library.instrumentation import Instrumentation
+from siwa.library.transport import Transport, PooledTransport
+from siwa.library.transport import HTTPResponse
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 
 T = TypeVar('T', bound='ApplePublicKey')
 
 
 class ApplePublicKey(PublicKey):
 
-    _RETRIEVAL_URL = 'https://appleid.apple.com/auth/keys'
+    _RETRIEVAL_PATH = '/auth/keys'
+    _default_transport: Optional[Transport] = None
+    _default_transport_lock = Lock()
 
     def __init__(
         self,
@@ -35,14 +42,74 @@ class ApplePublicKey(PublicKey):
         self._algorithm = algorithm
         self._modulus = modulus
         self._exponent = exponent
+        self._verifier_key: Optional['RSAPublicKey'] = None
 
         return
 
     identifier = property(lambda s: s._identifier)
-    rsa_public_key = property(lambda s: RSA_PublicKey(
-        n=int.from_bytes(Data.decode_b64(s._modulus), 'big'),
-        e=int.from_bytes(Data.decode_b64(s._exponent), 'big')
-    ))
+    rsa_public_key = property(lambda s: s._load_rsa_public_key())
+    verifier_key = property(lambda s: s._load_verifier_key())
+
+    def _load_rsa_public_key(self) -> Any:
+        """Return this key as a PythonRSA PublicKey, imported on first use"""
+        from rsa import PublicKey as RSA_PublicKey
+        return RSA_PublicKey(
+            n=self._decode_modulus(),
+            e=self._decode_exponent()
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ApplePublicKey):
+            return NotImplemented
+        return (
+            self._identifier == other._identifier
+            and self._algorithm == other._algorithm
+            and self._family == other._family
+            and self._use == other._use
+            and self._modulus == other._modulus
+            and self._exponent == other._exponent
+        )
+
+    def __hash__(self) -> int:
+        return hash((self._identifier, self._modulus, self._exponent))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Prepared verifier keys cannot be pickled, and are rebuilt lazily
+        # wherever the key is unpickled (e.g. a process pool worker)
+        state = self.__dict__.copy()
+        state['_verifier_key'] = None
+        return state
+
+    def _decode_modulus(self) -> int:
+        return int.from_bytes(Data.decode_b64(self._modulus), 'big')
+
+    def _decode_exponent(self) -> int:
+        return int.from_bytes(Data.decode_b64(self._exponent), 'big')
+
+    def _load_verifier_key(self) -> 'RSAPublicKey':
+        """
+        Return a key object ready for signature verification, built from the
+        n and e values on first use and reused thereafter
+        """
+        if self._verifier_key is None:
+            from cryptography.hazmat.primitives.asymmetric.rsa import (
+                RSAPublicNumbers
+            )
+            self._verifier_key = RSAPublicNumbers(
+                e=self._decode_exponent(),
+                n=self._decode_modulus()
+            ).public_key()
+        return self._verifier_key
+
+    def encode(self) -> Dict[str, str]:
+        return {
+            'alg': self._algorithm,
+            'kid': self._identifier,
+            'kty': self._family,
+            'use': self._use,
+            'n': self._modulus,
+            'e': self._exponent
+        }
 
     @classmethod
     def decode(cls: Type[T], data: Dict[str, str]) -> T:
@@ -62,38 +129,330 @@ class ApplePublicKey(PublicKey):
     ) -> List[PublicKey]:
         return [cls.decode(d) for d in data]
 
+    @classmethod
+    def use_transport(cls, transport: Transport) -> None:
+        """
+        Set the transport used to retrieve keys where none is supplied,
+        either directly or by the KeyCache in use
+        """
+        ApplePublicKey._default_transport = transport
+        return
+
+    @classmethod
+    def retrieve_document(
+        cls: Type[T],
+        transport: Optional[Transport] = None,
+        previous: Optional[KeyDocument] = None
+    ) -> KeyDocument:
+        """
+        Retrieve the JWKS document published by Apple. If a `previous`
+        document is supplied, the request is conditional upon it, and a
+        304 Not Modified response yields a revalidated copy of it.
+        """
+        hooks = Instrumentation.active
+        if hooks is not None:
+            start = time.perf_counter()
+        try:
+            response = cls.transport_for(transport).request(
+                method='GET',
+                path=cls._RETRIEVAL_PATH,
+                headers=cls._conditional_headers(previous)
+            )
+            document = cls._document_from(response, previous)
+        except Exception:
+            if hooks is not None:
+                hooks.key_fetched(time.perf_counter() - start, 'error')
+            raise
+        if hooks is not None:
+            hooks.key_fetched(
+                time.perf_counter() - start,
+                'not_modified' if document.not_modified else 'ok'
+            )
+        return document
+
+    @classmethod
+    async def retrieve_document_async(
+        cls: Type[T],
+        transport: Optional[Transport] = None,
+        previous: Optional[KeyDocument] = None
+    ) -> KeyDocument:
+        hooks = Instrumentation.active
+        if hooks is not None:
+            start = time.perf_counter()
+        try:
+            response = await cls.transport_for(transport).request_async(
+                method='GET',
+                path=cls._RETRIEVAL_PATH,
+                headers=cls._conditional_headers(previous)
+            )
+            document = cls._document_from(response, previous)
+        except Exception:
+            if hooks is not None:
+                hooks.key_fetched(time.perf_counter() - start, 'error')
+            raise
+        if hooks is not None:
+            hooks.key_fetched(
+                time.perf_counter() - start,
+                'not_modified' if document.not_modified else 'ok'
+            )
+        return document
+
     @classmethod
     def retrieve_all(
         cls: Type[T],
-        cache: Optional[KeyCache] = None
+        cache: Optional[KeyCache] = None,
+        transport: Optional[Transport] = None
     ) -> List[PublicKey]:
 
-        request = Request(
-            url=cls._RETRIEVAL_URL,
-            method='GET'
+        if cache is None:
+            document = cls.retrieve_document(transport)
+            return cls.decode_many(document.keys)
+
+        document = cls.retrieve_document(
+            transport=cls.transport_for(transport, cache),
+            previous=cache.document
         )
+        return cls._store_document(cache, document)
 
-        response = urlopen(request).read()
-        data = json.loads(response)
-        keys = cls.decode_many(data['keys'])
-        if cache is not None:
-            cache.store_many(keys)
-        return keys
+    @classmethod
+    async def retrieve_all_async(
+        cls: Type[T],
+        cache: Optional[KeyCache] = None,
+        transport: Optional[Transport] = None
+    ) -> List[PublicKey]:
+
+        if cache is None:
+            document = await cls.retrieve_document_async(transport)
+            return cls.decode_many(document.keys)
+
+        document = await cls.retrieve_document_async(
+            transport=cls.transport_for(transport, cache),
+            previous=cache.document
+        )
+        return cls._store_document(cache, document)
+
+    @classmethod
+    def refresh_cache(
+        cls: Type[T],
+        cache: KeyCache,
+        retire_after: float = 0.0,
+        transport: Optional[Transport] = None
+    ) -> KeyDocument:
+        """
+        Conditionally re-fetch Apple's keys and refresh `cache` with them,
+        returning the document retrieved
+        """
+        document = cls.retrieve_document(
+            transport=cls.transport_for(transport, cache),
+            previous=cache.document
+        )
+        cls._refresh_cache(cache, document, retire_after)
+        return document
+
+    @classmethod
+    async def refresh_cache_async(
+        cls: Type[T],
+        cache: KeyCache,
+        retire_after: float = 0.0,
+        transport: Optional[Transport] = None
+    ) -> KeyDocument:
+        document = await cls.retrieve_document_async(
+            transport=cls.transport_for(transport, cache),
+            previous=cache.document
+        )
+        cls._refresh_cache(cache, document, retire_after)
+        return document
 
     @classmethod
     def retrieve_by_id(
         cls: Type[T],
         identifier: str,
-        cache: Optional[KeyCache] = None
+        cache: Optional[KeyCache] = None,
+        transport: Optional[Transport] = None
     ) -> Optional[PublicKey]:
 
         if cache is not None:
-            cached = cache.retrieve(identifier)
-            if cached is not None:
-                return cached
+            hooks = Instrumentation.active
+            if hooks is None:
+                return cache.retrieve_or_fetch(
+                    identifier=identifier,
+                    fetch=lambda c: cls.retrieve_all(c, transport)
+                )
+            start = time.perf_counter()
+            outcome = cls._lookup_outcome(identifier, cache)
+            key = cache.retrieve_or_fetch(
+                identifier=identifier,
+                fetch=lambda c: cls.retrieve_all(c, transport)
+            )
+            if key is None and outcome == 'miss':
+                outcome = 'unknown'
+            hooks.key_looked_up(time.perf_counter() - start, outcome)
+            return key
 
-        all_keys = cls.retrieve_all()
+        all_keys = cls.retrieve_all(transport=transport)
         for key in all_keys:
             if key.identifier == identifier:
                 return key
         return None
+
+    @classmethod
+    async def retrieve_by_id_async(
+        cls: Type[T],
+        identifier: str,
+        cache: Optional[KeyCache] = None,
+        transport: Optional[Transport] = None
+    ) -> Optional[PublicKey]:
+
+        if cache is not None:
+            hooks = Instrumentation.active
+            if hooks is None:
+                return await cache.retrieve_or_fetch_async(
+                    identifier=identifier,
+                    fetch=lambda c: cls.retrieve_all_async(c, transport)
+                )
+            start = time.perf_counter()
+            outcome = cls._lookup_outcome(identifier, cache)
+            key = await cache.retrieve_or_fetch_async(
+                identifier=identifier,
+                fetch=lambda c: cls.retrieve_all_async(c, transport)
+            )
+            if key is None and outcome == 'miss':
+                outcome = 'unknown'
+            hooks.key_looked_up(time.perf_counter() - start, outcome)
+            return key
+
+        all_keys = await cls.retrieve_all_async(transport=transport)
+        for key in all_keys:
+            if key.identifier == identifier:
+                return key
+        return None
+
+    @classmethod
+    def transport_for(
+        cls,
+        transport: Optional[Transport] = None,
+        cache: Optional[KeyCache] = None
+    ) -> Transport:
+        """
+        Return the transport through which to reach Apple: `transport`, if
+        supplied, else that of `cache`, else the default set by
+        `use_transport`, else a PooledTransport shared by this process
+        """
+        if transport is not None:
+            return transport
+        if cache is not None and cache.transport is not None:
+            return cache.transport
+        with ApplePublicKey._default_transport_lock:
+            if ApplePublicKey._default_transport is None:
+                ApplePublicKey._default_transport = PooledTransport()
+            return ApplePublicKey._default_transport
+
+    @staticmethod
+    def _lookup_outcome(identifier: str, cache: KeyCache) -> str:
+        """Classify a lookup before it is made, for Instrumentation"""
+        if cache.retrieve(identifier) is None:
+            if cache.is_known_unknown(identifier):
+                return 'negative'
+            return 'miss'
+        document = cache.document
+        if document is not None and document.max_age is not None and (
+            not document.is_fresh
+        ):
+            return 'stale'
+        return 'hit'
+
+    @staticmethod
+    def _conditional_headers(
+        previous: Optional[KeyDocument]
+    ) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if previous is None:
+            return headers
+        if previous.etag is not None:
+            headers['If-None-Match'] = previous.etag
+        if previous.last_modified is not None:
+            headers['If-Modified-Since'] = previous.last_modified
+        return headers
+
+    @classmethod
+    def _document_from(
+        cls,
+        response: HTTPResponse,
+        previous: Optional[KeyDocument]
+    ) -> KeyDocument:
+
+        max_age = cls._parse_max_age(response.header('Cache-Control'))
+
+        if response.status == 304 and previous is not None:
+            return previous.revalidated(
+                etag=response.header('ETag'),
+                last_modified=response.header('Last-Modified'),
+                max_age=max_age
+            )
+
+        if response.status != 200:
+            raise RuntimeError('HTTP {s} retrieving Apple public keys'.format(
+                s=response.status
+            ))
+
+        return KeyDocument(
+            keys=response.json()['keys'],
+            etag=response.header('ETag'),
+            last_modified=response.header('Last-Modified'),
+            max_age=max_age
+        )
+
+    @classmethod
+    def _store_document(
+        cls,
+        cache: KeyCache,
+        document: KeyDocument
+    ) -> List[PublicKey]:
+
+        if document.not_modified:
+            # Apple confirmed our keys are current; nothing to decode
+            cache.revalidate(document)
+            stored = [cache.retrieve(k['kid']) for k in document.keys]
+            return [k for k in stored if k is not None]
+
+        keys = cls.decode_many(document.keys)
+        cache.store_document(document, keys)
+        return keys
+
+    @classmethod
+    def _refresh_cache(
+        cls,
+        cache: KeyCache,
+        document: KeyDocument,
+        retire_after: float
+    ) -> None:
+        keys: List[PublicKey]
+        if document.not_modified:
+            # Re-publish the keys already held, so that retired keys still
+            # age out, without decoding anything
+            stored = [cache.retrieve(k['kid']) for k in document.keys]
+            keys = [k for k in stored if k is not None]
+        else:
+            keys = cls.decode_many(document.keys)
+        cache.refresh(
+            keys=keys,
+            retire_after=retire_after,
+            document=document
+        )
+        return
+
+    @staticmethod
+    def _parse_max_age(cache_control: Optional[str]) -> Optional[float]:
+        if cache_control is None:
+            return None
+        for directive in cache_control.split(','):
+            name, _, value = directive.strip().partition('=')
+            name = name.lower()
+            if name in ('no-cache', 'no-store'):
+                return 0.0
+            if name == 'max-age':
+                try:
+                    return float(value.strip('"'))
+                except ValueError:
+                    return None
+        return None
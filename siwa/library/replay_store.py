@@ -0,0 +1,188 @@
+"""
+Signin With Apple
+Replay Store Module
+author: hugh@blinkybeach.com
+"""
+import hashlib
+import math
+import time
+from heapq import heappush, heappop
+from threading import Lock
+from typing import Dict, List, Optional, Set, TYPE_CHECKING
+if TYPE_CHECKING:
+    from siwa.library.token.token import IdentityToken
+
+
+class ReplayBackend:
+    """
+    Abstract protocol defining storage for a ReplayStore: an atomic
+    set-if-absent of opaque keys, each held until an expiry time. A shared
+    backend (e.g. one holding keys in Redis, with `SET key 1 NX EXAT t`)
+    detects replays across every process that uses it.
+    """
+
+    def add(self, key: bytes, expires_at: float, now: float) -> bool:
+        """
+        Hold `key` until `expires_at` (seconds since the epoch), returning
+        True if it was not already held at `now`
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryReplayBackend(ReplayBackend):
+    """
+    A ReplayBackend holding keys in memory, in sets bucketed by expiry time
+    to a `resolution` in seconds. Lookup and insertion are O(1), and keys
+    expire a bucket at a time, earliest first, without a timer per key or a
+    scan of the store. A key may be held for up to `resolution` seconds
+    beyond its expiry, never less. At most `max_entries` keys are held:
+    should the store fill, the keys closest to expiry are evicted first, and
+    counted in `evictions`. Safe for use from several threads.
+    """
+
+    DEFAULT_MAX_ENTRIES = 1000000
+    DEFAULT_RESOLUTION = 1.0
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        resolution: float = DEFAULT_RESOLUTION
+    ) -> None:
+
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        if resolution <= 0:
+            raise ValueError('resolution must be positive')
+
+        self._max_entries = max_entries
+        self._resolution = float(resolution)
+        self._expiries: Dict[bytes, int] = {}
+        self._buckets: Dict[int, Set[bytes]] = {}
+        self._ticks: List[int] = []
+        self._evictions = 0
+        self._lock = Lock()
+
+        return
+
+    max_entries = property(lambda s: s._max_entries)
+    resolution = property(lambda s: s._resolution)
+    evictions = property(lambda s: s._evictions)
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def add(self, key: bytes, expires_at: float, now: float) -> bool:
+
+        # A key in the bucket for tick t is held while now < t * resolution
+        tick = math.ceil(expires_at / self._resolution)
+        current = math.floor(now / self._resolution)
+
+        with self._lock:
+            if self._ticks and self._ticks[0] <= current:
+                self._expire(current)
+            if key in self._expiries:
+                return False
+            if tick <= current:
+                return True
+            if len(self._expiries) >= self._max_entries:
+                self._evict()
+            self._expiries[key] = tick
+            bucket = self._buckets.get(tick)
+            if bucket is None:
+                bucket = set()
+                self._buckets[tick] = bucket
+                heappush(self._ticks, tick)
+            bucket.add(key)
+
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expiries.clear()
+            self._buckets.clear()
+            self._ticks.clear()
+        return
+
+    def _expire(self, current: int) -> None:
+        """Drop every bucket due at or before tick `current`"""
+        while self._ticks and self._ticks[0] <= current:
+            for key in self._buckets.pop(heappop(self._ticks)):
+                del self._expiries[key]
+        return
+
+    def _evict(self) -> None:
+        """Drop one key from the bucket closest to expiry"""
+        tick = self._ticks[0]
+        bucket = self._buckets[tick]
+        del self._expiries[bucket.pop()]
+        if not bucket:
+            del self._buckets[tick]
+            heappop(self._ticks)
+        self._evictions += 1
+        return
+
+
+class ReplayStore:
+    """
+    Detects the replay of identity tokens within their lifetime. Each token
+    admitted is recorded, by a digest of its subject, its nonce (or, where
+    it has none, its issue time), its signed body and its decoded signature,
+    until it expires. Only tokens whose signatures have been verified should
+    be admitted, lest forged tokens fill the store. Records are held in memory unless another
+    `backend` is supplied.
+    """
+
+    def __init__(self, backend: Optional[ReplayBackend] = None) -> None:
+
+        self._backend = backend if backend is not None else (
+            MemoryReplayBackend()
+        )
+
+        return
+
+    backend = property(lambda s: s._backend)
+
+    def __len__(self) -> int:
+        return len(self._backend)
+
+    @staticmethod
+    def digest(token: 'IdentityToken') -> bytes:
+        payload = token.payload
+        marker = payload.nonce
+        if marker is None:
+            marker = str(payload.issued_utc_seconds_since_epoch)
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(payload.unique_apple_user_id.encode('utf-8'))
+        hasher.update(b'\x00' + marker.encode('utf-8') + b'\x00')
+        # The signed body and decoded signature, rather than the raw token,
+        # whose encoding might otherwise be varied to evade detection
+        hasher.update(token._raw_signed_body)
+        hasher.update(b'.' + token._load_signature())
+        return hasher.digest()
+
+    def admit(
+        self,
+        token: 'IdentityToken',
+        now: Optional[float] = None,
+        leeway: float = 0.0
+    ) -> bool:
+        """
+        Record the use of `token`, returning False if it has been used
+        before. The record is held until the token's expiry, plus `leeway`
+        seconds of permitted clock skew.
+        """
+        return self._backend.add(
+            self.digest(token),
+            token.payload.expires_utc_seconds_since_epoch + leeway,
+            time.time() if now is None else now
+        )
+
+    def clear(self) -> None:
+        self._backend.clear()
+        return
@@ -0,0 +1,196 @@
+"""
+Signin With Apple
+Result Cache Module
+author: hugh@blinkybeach.com
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from typing import TYPE_CHECKING
+from siwa.library.data import Buffer
+from siwa.library.flight import Flight
+if TYPE_CHECKING:
+    import asyncio
+
+
+class ResultCache:
+    """
+    A bounded, least-recently-used store of token verification decisions,
+    keyed by a digest of the raw token, audience and verification options.
+    A decision is never held beyond the token's expiry, and a negative
+    decision is held for at most `negative_ttl` seconds. Concurrent
+    verifications of the same token, from different threads or from tasks
+    in the same event loop, share a single verification.
+    """
+
+    DEFAULT_MAX_ENTRIES = 10000
+    DEFAULT_NEGATIVE_TTL = 30.0
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL
+    ) -> None:
+
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+
+        self._max_entries = max_entries
+        self._negative_ttl = negative_ttl
+        self._entries: 'OrderedDict[bytes, Tuple[bool, float]]' = (
+            OrderedDict()
+        )
+        self._flights: Dict[bytes, Flight] = {}
+        self._async_flights: Dict[bytes, 'asyncio.Future'] = {}
+        self._lock = Lock()
+
+        return
+
+    max_entries = property(lambda s: s._max_entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def digest(
+        raw_token: Buffer,
+        audience: str,
+        ignore_expiry: bool
+    ) -> bytes:
+        hasher = hashlib.sha256(raw_token)
+        hasher.update(b'\x00' + audience.encode('utf-8'))
+        hasher.update(b'\x01' if ignore_expiry else b'\x00')
+        return hasher.digest()
+
+    def retrieve(self, digest: bytes) -> Optional[bool]:
+        """Return a live decision for `digest`, if one is held"""
+        with self._lock:
+            return self._retrieve(digest, time.time())
+
+    def store(self, digest: bytes, decision: bool, expires_at: float) -> None:
+        """Hold `decision` until `expires_at` (seconds since the epoch)"""
+        now = time.time()
+        if not decision:
+            expires_at = min(expires_at, now + self._negative_ttl)
+        if expires_at <= now:
+            return
+        with self._lock:
+            self._entries[digest] = (decision, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return
+
+    def retrieve_or_verify(
+        self,
+        digest: bytes,
+        expires_at: float,
+        verify: Callable[[], bool]
+    ) -> bool:
+        """
+        Return the held decision for `digest`, or call `verify` to make and
+        store one. Concurrent callers with the same digest share one call.
+        """
+        with self._lock:
+            decision = self._retrieve(digest, time.time())
+            if decision is not None:
+                return decision
+            flight = self._flights.get(digest)
+            is_leader = flight is None
+            if flight is None:
+                flight = Flight()
+                self._flights[digest] = flight
+
+        if not is_leader:
+            return flight.wait()
+
+        try:
+            decision = verify()
+        except Exception as error:
+            flight.fail(error)
+            raise
+        else:
+            self.store(digest, decision, expires_at)
+            flight.complete(decision)
+        finally:
+            flight.abandon()
+            with self._lock:
+                del self._flights[digest]
+
+        return decision
+
+    async def retrieve_or_verify_async(
+        self,
+        digest: bytes,
+        expires_at: float,
+        verify: Callable[[], Awaitable[bool]]
+    ) -> bool:
+        """
+        Asynchronous counterpart to `retrieve_or_verify`. A held decision is
+        returned without yielding to the event loop, and concurrent callers
+        with the same digest, within the same event loop, share one awaited
+        call to `verify`.
+        """
+        decision = self.retrieve(digest)
+        if decision is not None:
+            return decision
+
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                decision = self._retrieve(digest, time.time())
+                if decision is not None:
+                    return decision
+                flight = self._async_flights.get(digest)
+                if flight is None or flight.get_loop() is not loop:
+                    # A verification in another event loop is not shared
+                    leader = loop.create_future()
+                    if flight is None:
+                        self._async_flights[digest] = leader
+                    break
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The verifying task was cancelled; retry on our own behalf
+
+        try:
+            decision = await verify()
+        except Exception as error:
+            leader.set_exception(error)
+            # Mark the exception retrieved, so that a flight with no other
+            # waiters does not log a warning when garbage collected
+            leader.exception()
+            raise
+        except BaseException:
+            leader.cancel()
+            raise
+        else:
+            self.store(digest, decision, expires_at)
+            leader.set_result(decision)
+        finally:
+            with self._lock:
+                if self._async_flights.get(digest) is leader:
+                    del self._async_flights[digest]
+
+        return decision
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        return
+
+    def _retrieve(self, digest: bytes, now: float) -> Optional[bool]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        decision, expires_at = entry
+        if expires_at <= now:
+            del self._entries[digest]
+            return None
+        self._entries.move_to_end(digest)
+        return decision
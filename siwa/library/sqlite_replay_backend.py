@@ -0,0 +1,122 @@
+"""
+Signin With Apple
+SQLite Replay Backend Module
+author: hugh@blinkybeach.com
+"""
+import os
+import sqlite3
+from threading import Lock
+from typing import Optional
+from siwa.library.replay_store import ReplayBackend
+
+
+class SQLiteReplayBackend(ReplayBackend):
+    """
+    A ReplayBackend held in an SQLite database file, such that processes on
+    the same host (e.g. pre-forked server workers) detect replays across one
+    another. It stands in locally for a store shared between hosts, such as
+    Redis. Keys are indexed by expiry, and expired keys are deleted through
+    that index, at most once every `purge_interval` seconds.
+    """
+
+    DEFAULT_PURGE_INTERVAL = 1.0
+    DEFAULT_TIMEOUT = 5.0
+
+    _SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS siwa_replay ('
+        'key BLOB PRIMARY KEY, expires_at REAL NOT NULL) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS siwa_replay_expiry '
+        'ON siwa_replay (expires_at)'
+    )
+
+    def __init__(
+        self,
+        path: str,
+        purge_interval: float = DEFAULT_PURGE_INTERVAL,
+        timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+
+        self._path = path
+        self._purge_interval = purge_interval
+        self._timeout = timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._next_purge = 0.0
+        self._lock = Lock()
+
+        with self._lock:
+            connection = self._connect()
+            for statement in self._SCHEMA:
+                connection.execute(statement)
+
+        return
+
+    path = property(lambda s: s._path)
+
+    def add(self, key: bytes, expires_at: float, now: float) -> bool:
+
+        if expires_at <= now:
+            return True
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if now >= self._next_purge:
+                    connection.execute(
+                        'DELETE FROM siwa_replay WHERE expires_at <= ?',
+                        (now,)
+                    )
+                    self._next_purge = now + self._purge_interval
+                else:
+                    connection.execute(
+                        'DELETE FROM siwa_replay WHERE key = ? '
+                        'AND expires_at <= ?',
+                        (key, now)
+                    )
+                added = connection.execute(
+                    'INSERT OR IGNORE INTO siwa_replay VALUES (?, ?)',
+                    (key, expires_at)
+                ).rowcount == 1
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+        return added
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM siwa_replay'
+            ).fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute('DELETE FROM siwa_replay')
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return this process's connection. Connections do not survive a
+        fork, so a worker forked from a process that held one opens its own.
+        """
+        pid = os.getpid()
+        if self._connection is None or self._connection_pid != pid:
+            self._connection = sqlite3.connect(
+                self._path,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection_pid = pid
+        return self._connection
@@ -0,0 +1,280 @@
+"""
+Signin With Apple
+Stream Verifier Module
+author: hugh@blinkybeach.com
+"""
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import BinaryIO, TextIO, Iterator, List, Optional, Tuple
+from typing import Dict, Any, Deque
+from siwa.library.command_line import CommandLine
+from siwa.library.file_key_cache import FileKeyCache
+from siwa.library.key_cache import KeyCache
+from siwa.library.key_document import KeyDocument
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.token.rejection import Rejection
+from siwa.library.transport import PooledTransport
+from siwa.library.verifier import Verifier
+
+Line = Tuple[int, bytes]
+
+
+class StreamVerifier:
+    """
+    Verifies a stream of raw identity tokens, one per line or one per
+    NDJSON object, writing one JSON result per token in input order. Lines
+    are read, verified and written in chunks, with at most a few chunks per
+    worker in flight, such that memory use does not grow with the stream.
+    Workers are seeded with the keys held by `key_cache`, which should be
+    warm, or share them through its file where it is a FileKeyCache.
+    """
+
+    DEFAULT_CHUNK_SIZE = 256
+    CHUNKS_IN_FLIGHT_PER_WORKER = 4
+
+    def __init__(
+        self,
+        audience: str,
+        key_cache: KeyCache,
+        ignore_expiry: bool = False,
+        ndjson: bool = False,
+        field: str = 'id_token',
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> None:
+
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+
+        self._audience = audience
+        self._key_cache = key_cache
+        self._ignore_expiry = ignore_expiry
+        self._ndjson = ndjson
+        self._field = field
+        self._workers = workers or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+
+        return
+
+    def run(self, source: BinaryIO, sink: TextIO) -> int:
+        """Verify every token in `source`, returning the number verified"""
+
+        chunks = self._chunks(source)
+        options = (self._audience, self._ignore_expiry, self._ndjson,
+                   self._field)
+
+        if self._workers < 2:
+            _initialise(self._seed(), *options)
+            valid = 0
+            for chunk in chunks:
+                valid += self._write(sink, _verify_chunk(chunk))
+            return valid
+
+        pending: Deque[Future] = deque()
+        limit = self._workers * self.CHUNKS_IN_FLIGHT_PER_WORKER
+        valid = 0
+
+        with ProcessPoolExecutor(
+            max_workers=self._workers,
+            initializer=_initialise,
+            initargs=(self._seed(), *options)
+        ) as executor:
+            for chunk in chunks:
+                pending.append(executor.submit(_verify_chunk, chunk))
+                if len(pending) >= limit:
+                    valid += self._write(sink, pending.popleft().result())
+            while pending:
+                valid += self._write(sink, pending.popleft().result())
+
+        return valid
+
+    def _seed(self) -> Tuple[Optional[str], Any]:
+        """
+        Describe the key cache, and the origin it fetches keys from, such
+        that each worker may rebuild it
+        """
+        transport = self._key_cache.transport
+        origin = transport.origin if transport is not None else None
+        if isinstance(self._key_cache, FileKeyCache):
+            return origin, self._key_cache.path
+        document = self._key_cache.document
+        if document is None:
+            return origin, None
+        return origin, document.encode()
+
+    def _chunks(self, source: BinaryIO) -> Iterator[List[Line]]:
+        lines = enumerate(source, start=1)
+        while True:
+            chunk = list(islice(lines, self._chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @staticmethod
+    def _write(sink: TextIO, results: List[Tuple[bool, str]]) -> int:
+        sink.write(''.join(r for _, r in results))
+        return sum(1 for v, _ in results if v)
+
+
+# Set in each worker by _initialise
+_verifier: Verifier
+_ndjson = False
+_field = 'id_token'
+
+
+def _initialise(
+    seed: Tuple[Optional[str], Any],
+    audience: str,
+    ignore_expiry: bool,
+    ndjson: bool,
+    field: str
+) -> None:
+    """
+    Prepare a worker, rebuilding the parent's key cache from `seed`, and
+    building the Verifier it verifies every line with
+    """
+    global _verifier, _ndjson, _field
+
+    origin, keys = seed
+    transport = PooledTransport(origin) if origin is not None else None
+
+    key_cache: KeyCache
+    if isinstance(keys, str):
+        key_cache = FileKeyCache(keys, transport=transport)
+    else:
+        key_cache = KeyCache(transport=transport)
+        if keys is not None:
+            document = KeyDocument.decode(keys)
+            key_cache.store_document(
+                document,
+                ApplePublicKey.decode_many(document.keys)
+            )
+
+    _verifier = Verifier(
+        audiences=audience,
+        key_cache=key_cache,
+        ignore_expiry=ignore_expiry
+    )
+    _ndjson = ndjson
+    _field = field
+    return
+
+
+def _verify_chunk(chunk: List[Line]) -> List[Tuple[bool, str]]:
+    """Verify a chunk of lines, returning a JSON result line for each"""
+    results = []
+    for number, line in chunk:
+        line = line.strip()
+        if not line:
+            continue
+        result = _verify_line(number, line)
+        results.append((
+            result['valid'],
+            json.dumps(result, separators=(',', ':')) + '\n'
+        ))
+    return results
+
+
+def _verify_line(number: int, line: bytes) -> Dict[str, Any]:
+
+    result: Dict[str, Any] = {'line': number, 'valid': False}
+
+    raw_token: Any = line
+    if _ndjson:
+        try:
+            record = json.loads(line)
+            raw_token = record[_field]
+        except (ValueError, KeyError, TypeError):
+            result['reason'] = Rejection.MALFORMED.value
+            return result
+        if 'id' in record:
+            result['id'] = record['id']
+        if not isinstance(raw_token, str):
+            result['reason'] = Rejection.MALFORMED.value
+            return result
+
+    verification = _verifier.verify_raw(raw_token)
+    if verification.key_identifier is not None:
+        result['kid'] = verification.key_identifier
+    if not verification.valid:
+        result['reason'] = verification.reason
+        return result
+
+    result['valid'] = True
+    result['sub'] = verification.payload.unique_apple_user_id
+    return result
+
+
+USAGE = """usage: siwa --audience AUDIENCE [--input PATH] [--ndjson]
+            [--field NAME] [--workers N] [--chunk-size N]
+            [--key-file PATH] [--key-origin URL] [--ignore-expiry]
+
+Verify Sign in with Apple identity tokens read from PATH, or from standard
+input, one per line, or one per NDJSON object under --field (by default
+"id_token"). Writes one JSON result per token to standard output.
+
+--workers       processes to verify with (default: one per core)
+--chunk-size    tokens handed to a worker at a time (default: 256)
+--key-file      share Apple's keys through this file (see FileKeyCache)
+--key-origin    fetch keys from this origin instead of Apple's
+--ignore-expiry accept tokens that have expired
+"""
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+
+    command_line = CommandLine(
+        sys.argv[1:] if arguments is None else arguments
+    )
+
+    if command_line.contains_flag('--help'):
+        sys.stdout.write(USAGE)
+        return 0
+
+    try:
+        audience = command_line.require('--audience')
+        workers = command_line.get('--workers', int, 'integer')
+        chunk_size = command_line.get('--chunk-size', int, 'integer')
+        origin = command_line.get('--key-origin')
+        transport = PooledTransport(origin) if origin is not None else None
+    except (RuntimeError, ValueError) as error:
+        sys.stderr.write('{e}\n\n{u}'.format(e=error, u=USAGE))
+        return 2
+
+    key_file = command_line.get('--key-file')
+
+    try:
+        if key_file is not None:
+            key_cache: KeyCache = FileKeyCache(key_file, transport=transport)
+            key_cache.warm()
+        else:
+            key_cache = KeyCache(transport=transport)
+            ApplePublicKey.retrieve_all(key_cache)
+    except Exception as error:
+        sys.stderr.write('siwa: unable to retrieve public keys: {e}\n'.format(
+            e=error
+        ))
+        return 1
+
+    verifier = StreamVerifier(
+        audience=audience,
+        key_cache=key_cache,
+        ignore_expiry=command_line.contains_flag('--ignore-expiry'),
+        ndjson=command_line.contains_flag('--ndjson'),
+        field=command_line.get('--field') or 'id_token',
+        workers=workers,
+        chunk_size=chunk_size or StreamVerifier.DEFAULT_CHUNK_SIZE
+    )
+
+    path = command_line.get('--input')
+    if path is None or path == '-':
+        verifier.run(sys.stdin.buffer, sys.stdout)
+    else:
+        with open(path, 'rb') as source:
+            verifier.run(source, sys.stdout)
+
+    return 0
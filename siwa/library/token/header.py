@@ -3,16 +3,16 @@ Signin With Apple
 Header Module
 author: hugh@blinkybeach.com
 """
-from typing import TypeVar, Type, Dict, Optional
-from siwa.library.public_key import ApplePublicKey
-from siwa.library.key_protocol import PublicKey
-from siwa.library.key_cache import KeyCache
+from operator import attrgetter
+from typing import TypeVar, Type, Dict
 
 T = TypeVar('T', bound='Header')
 
 
 class Header:
 
+    __slots__ = ('_identifier', '_algorithm')
+
     def __init__(
         self,
         identifier: str,
@@ -24,17 +24,8 @@ class Header:
 
         return
 
-    def retrieve_public_key(
-        self,
-        key_cache: Optional[KeyCache] = None
-    ) -> PublicKey:
-        key = ApplePublicKey.retrieve_by_id(
-            identifier=self._identifier,
-            cache=key_cache
-        )
-        if key is None:
-            raise RuntimeError('Apple PublicKey not found ' + self._identifier)
-        return key
+    identifier = property(attrgetter('_identifier'))
+    algorithm = property(attrgetter('_algorithm'))
 
     @classmethod
     def decode(cls: Type[T], data: Dict) -> T:
@@ -3,6 +3,7 @@ Signin With Apple
 Header Module
 author: hugh@blinkybeach.com
 """
+from operator import attrgetter
 from typing import TypeVar, Type, Dict, Optional
 from siwa.library.token.real_person import RealPerson
 
@@ -11,6 +12,20 @@ T = TypeVar('T', bound='Payload')
 
 class Payload:
 
+    __slots__ = (
+        '_issuer',
+        '_subject',
+        '_audience',
+        '_issued_at',
+        '_expiration_time',
+        '_nonce',
+        '_nonce_supported',
+        '_email',
+        '_email_verified',
+        '_is_private_email',
+        '_real_person'
+    )
+
     def __init__(
         self,
         issuer: str,
@@ -41,13 +56,16 @@ class Payload:
 
         return
 
-    unique_apple_user_id = property(lambda s: s._subject)
-    expires_utc_seconds_since_epoch = property(lambda s: s._expiration_time)
-    issued_utc_seconds_since_epoch = property(lambda s: s._issued_at)
-    email = property(lambda s: s._email)
-    email_is_private = property(lambda s: s._is_private_email)
-    real_person = property(lambda s: s._real_person)
-    audience = property(lambda s: s._audience)
+    unique_apple_user_id = property(attrgetter('_subject'))
+    expires_utc_seconds_since_epoch = property(attrgetter('_expiration_time'))
+    issued_utc_seconds_since_epoch = property(attrgetter('_issued_at'))
+    email = property(attrgetter('_email'))
+    email_is_private = property(attrgetter('_is_private_email'))
+    real_person = property(attrgetter('_real_person'))
+    audience = property(attrgetter('_audience'))
+    issuer = property(attrgetter('_issuer'))
+    nonce = property(attrgetter('_nonce'))
+    nonce_supported = property(attrgetter('_nonce_supported'))
 
     @classmethod
     def decode(cls: Type[T], data: Dict) -> T:
@@ -0,0 +1,218 @@
+"""
+Signin With Apple
+Precheck Module
+author: hugh@blinkybeach.com
+"""
+import json
+import re
+import time
+from typing import Optional, Any, Dict, Container, Tuple
+from siwa.library.data import Data, Buffer, RawToken
+from siwa.library.token.header import Header
+from siwa.library.token.payload import Payload
+from siwa.library.token.rejection import Rejection
+
+
+class Precheck:
+    """
+    Cheap structural and claim checks, performed before any key lookup or
+    signature verification, such that malformed or obviously wrong tokens
+    are rejected without cost to our CPU or to Apple's key endpoint
+    """
+
+    MAX_TOKEN_LENGTH = 4096
+    ALGORITHM = 'RS256'
+    ISSUER = 'https://appleid.apple.com'
+
+    _SEGMENTS = re.compile(rb'[^.]*\.([^.]*)\.[^.]*')
+
+    @classmethod
+    def check_token(
+        cls,
+        data: RawToken,
+        audience: str,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None,
+        max_length: int = MAX_TOKEN_LENGTH
+    ) -> Optional[Rejection]:
+        """
+        Check a raw identity token, returning the first failed check, if
+        any. Only the header and claims are decoded.
+        """
+        data = Data.buffer(data)
+        if len(data) > max_length:
+            return Rejection.TOO_LONG
+        segments = cls.locate_segments(data)
+        if segments is None:
+            return Rejection.MALFORMED
+
+        payload_start, signature_start = segments
+        view = memoryview(data)
+
+        try:
+            header = Header.decode(json.loads(Data.decode_b64(
+                view[:payload_start - 1]
+            )))
+            claims = json.loads(Data.decode_b64(
+                view[payload_start:signature_start - 1]
+            ))
+        except (ValueError, KeyError, TypeError):
+            return Rejection.MALFORMED
+        if not isinstance(claims, dict):
+            return Rejection.MALFORMED
+
+        return cls.check_header(header) or cls.check_claims(
+            claims=claims,
+            audience=audience,
+            ignore_expiry=ignore_expiry,
+            now=now
+        )
+
+    @classmethod
+    def check_structure(
+        cls,
+        data: RawToken,
+        max_length: int = MAX_TOKEN_LENGTH
+    ) -> Optional[Rejection]:
+        if isinstance(data, str):
+            if len(data) > max_length:
+                return Rejection.TOO_LONG
+            if data.count('.') != 2:
+                return Rejection.MALFORMED
+            return None
+        data = Data.buffer(data)
+        if len(data) > max_length:
+            return Rejection.TOO_LONG
+        if cls.locate_segments(data) is None:
+            return Rejection.MALFORMED
+        return None
+
+    @classmethod
+    def locate_segments(cls, data: Buffer) -> Optional[Tuple[int, int]]:
+        """
+        Return the offsets at which the payload and signature of the token
+        held in `data` begin, or None if it does not have three segments.
+        The buffer is searched in place.
+        """
+        if isinstance(data, bytes):
+            first = data.find(b'.')
+            second = data.find(b'.', first + 1)
+            if first < 0 or second < 0 or data.find(b'.', second + 1) >= 0:
+                return None
+            return first + 1, second + 1
+        match = cls._SEGMENTS.fullmatch(data)
+        if match is None:
+            return None
+        return match.start(1), match.end(1) + 1
+
+    @classmethod
+    def check_header(cls, header: Header) -> Optional[Rejection]:
+        if header.algorithm != cls.ALGORITHM:
+            return Rejection.UNSUPPORTED_ALGORITHM
+        return None
+
+    @classmethod
+    def check_claims(
+        cls,
+        claims: Dict[str, Any],
+        audience: str,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> Optional[Rejection]:
+        return cls._check(
+            issuer_claim=claims.get('iss'),
+            audience_claim=claims.get('aud'),
+            issued_at=claims.get('iat'),
+            expires_at=claims.get('exp'),
+            audiences=(audience,),
+            issuer=cls.ISSUER,
+            ignore_expiry=ignore_expiry,
+            leeway=0.0,
+            now=now
+        )[0]
+
+    @classmethod
+    def check_payload(
+        cls,
+        payload: Payload,
+        audience: str,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> Optional[Rejection]:
+        return cls.match_payload(
+            payload=payload,
+            audiences=(audience,),
+            ignore_expiry=ignore_expiry,
+            now=now
+        )[0]
+
+    @classmethod
+    def match_payload(
+        cls,
+        payload: Payload,
+        audiences: Container[str],
+        issuer: str = ISSUER,
+        ignore_expiry: bool = False,
+        leeway: float = 0.0,
+        now: Optional[float] = None
+    ) -> Tuple[Optional[Rejection], Optional[str]]:
+        """
+        Check the claims of `payload` against any of `audiences`, allowing
+        `leeway` seconds of clock skew, and return the first failed check,
+        if any, along with the audience that matched
+        """
+        return cls._check(
+            issuer_claim=payload.issuer,
+            audience_claim=payload.audience,
+            issued_at=payload.issued_utc_seconds_since_epoch,
+            expires_at=payload.expires_utc_seconds_since_epoch,
+            audiences=audiences,
+            issuer=issuer,
+            ignore_expiry=ignore_expiry,
+            leeway=leeway,
+            now=now
+        )
+
+    @classmethod
+    def _check(
+        cls,
+        issuer_claim: Any,
+        audience_claim: Any,
+        issued_at: Any,
+        expires_at: Any,
+        audiences: Container[str],
+        issuer: str,
+        ignore_expiry: bool,
+        leeway: float,
+        now: Optional[float]
+    ) -> Tuple[Optional[Rejection], Optional[str]]:
+
+        if issuer_claim != issuer:
+            return Rejection.WRONG_ISSUER, None
+
+        matched: Optional[str] = None
+        if isinstance(audience_claim, str):
+            if audience_claim in audiences:
+                matched = audience_claim
+        elif isinstance(audience_claim, list):
+            for candidate in audience_claim:
+                if isinstance(candidate, str) and candidate in audiences:
+                    matched = candidate
+                    break
+        if matched is None:
+            return Rejection.WRONG_AUDIENCE, None
+
+        if now is None:
+            now = time.time()
+
+        try:
+            if int(issued_at) > now + leeway:
+                return Rejection.NOT_YET_VALID, matched
+            if ignore_expiry:
+                return None, matched
+            if int(expires_at) <= now - leeway:
+                return Rejection.EXPIRED, matched
+        except (ValueError, TypeError, OverflowError):
+            return Rejection.MALFORMED, matched
+
+        return None, matched
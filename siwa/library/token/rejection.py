@@ -0,0 +1,20 @@
+"""
+Signin With Apple
+Rejection Module
+author: hugh@blinkybeach.com
+"""
+from enum import Enum
+
+
+class Rejection(Enum):
+    """The reason an identity token was found not to be valid"""
+    TOO_LONG = 'too_long'
+    MALFORMED = 'malformed'
+    UNSUPPORTED_ALGORITHM = 'unsupported_algorithm'
+    WRONG_ISSUER = 'wrong_issuer'
+    WRONG_AUDIENCE = 'wrong_audience'
+    NOT_YET_VALID = 'not_yet_valid'
+    EXPIRED = 'expired'
+    UNKNOWN_KEY = 'unknown_key'
+    BAD_SIGNATURE = 'bad_signature'
+    REPLAYED = 'replayed'
@@ -3,88 +3,493 @@ Signin With Apple
 Token Module
 author: hugh@blinkybeach.com
 """
-import jwt
-from jwt.exceptions import PyJWTError
-from typing import TypeVar, Type, Any, Dict, Union, Optional
-from siwa.library.data import Data
+import time
+from operator import attrgetter
+from typing import TypeVar, Type, Any, Dict, Optional, TYPE_CHECKING
+from typing import List, Sequence, Tuple
+from siwa.library.data import Data, Buffer, RawToken
 import json
 from siwa.library.key_cache import KeyCache
+from siwa.library.key_protocol import PublicKey
+from siwa.library.instrumentation import Instrumentation
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.result_cache import ResultCache
 from siwa.library.token.header import Header
 from siwa.library.token.payload import Payload
+from siwa.library.token.precheck import Precheck
+from siwa.library.token.rejection import Rejection
+from siwa.library.token.verification import Verification
+from siwa.library.token.verification_result import VerificationResult
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+    from siwa.library.verifier import Verifier
 
 T = TypeVar('T', bound='IdentityToken')
 
 
 class IdentityToken:
+    """
+    A parsed identity token. The raw token is held once, as bytes or a
+    read-only memoryview, and its segments are referenced by offset into
+    it: the payload, signature and signed body are zero-copy views.
+    """
+
+    __slots__ = (
+        '_header',
+        '_raw_token',
+        '_payload_start',
+        '_signature_start',
+        '_payload',
+        '_signature'
+    )
 
     def __init__(
         self,
         header: Header,
-        payload: Payload,
-        raw_signed_body: bytes,
-        signature: bytes,
-        raw_token: bytes
+        raw_token: Buffer,
+        payload_start: int,
+        signature_start: int
     ) -> None:
 
         self._header = header
-        self._payload = payload
-        self._raw_signed_body = raw_signed_body
-        self._signature = signature
         self._raw_token = raw_token
+        self._payload_start = payload_start
+        self._signature_start = signature_start
+        self._payload: Optional[Payload] = None
+        self._signature: Optional[bytes] = None
 
         return
 
-    payload = property(lambda s: s._payload)
+    _VERIFIERS: Dict[Tuple[str, KeyCache, bool], 'Verifier'] = {}
+    _MAX_VERIFIERS = 64
+
+    header = property(attrgetter('_header'))
+    payload = property(lambda s: s._load_payload())
+    _raw_payload = property(lambda s: memoryview(s._raw_token)[
+        s._payload_start:s._signature_start - 1
+    ])
+    _raw_signature = property(lambda s: memoryview(s._raw_token)[
+        s._signature_start:
+    ])
+    _raw_signed_body = property(lambda s: memoryview(s._raw_token)[
+        :s._signature_start - 1
+    ])
+
+    def __reduce__(self) -> Tuple[Any, Tuple[bytes]]:
+        # A memoryview cannot be pickled; the token is parsed again from
+        # its bytes wherever it is unpickled (e.g. a process pool worker)
+        return self.__class__.parse, (bytes(self._raw_token),)
+
+    def _load_payload(self) -> Payload:
+        """Decode the payload on first use"""
+        if self._payload is None:
+            self._payload = Payload.decode(
+                json.loads(Data.decode_b64(self._raw_payload))
+            )
+        return self._payload
+
+    def _load_signature(self) -> bytes:
+        """Decode the signature on first use"""
+        if self._signature is None:
+            self._signature = Data.decode_b64(self._raw_signature)
+        return self._signature
 
     def is_validly_signed(
         self,
         audience: str,
         key_cache: Optional[KeyCache] = None,
-        ignore_expiry: bool = False
+        ignore_expiry: bool = False,
+        result_cache: Optional[ResultCache] = None
     ) -> bool:
 
+        if result_cache is None:
+            return self._decide(
+                self.verify(audience, key_cache, ignore_expiry)
+            )
+
         if not isinstance(audience, str):
             raise TypeError('audience must be of type `str`')
 
-        apple_public_key = self._header.retrieve_public_key(key_cache)
-        rsa_key = apple_public_key.rsa_public_key
-        pks = rsa_key.save_pkcs1()
+        digest = ResultCache.digest(self._raw_token, audience, ignore_expiry)
+        return result_cache.retrieve_or_verify(
+            digest=digest,
+            expires_at=self._expires_at(),
+            verify=lambda: self._decide(
+                self.verify(audience, key_cache, ignore_expiry)
+            )
+        )
 
+    async def is_validly_signed_async(
+        self,
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        result_cache: Optional[ResultCache] = None
+    ) -> bool:
+        """
+        Asynchronous counterpart to `is_validly_signed`. The public key is
+        retrieved without blocking the event loop, and a key cache hit
+        completes without yielding to it.
+        """
+
+        if result_cache is None:
+            return self._decide(
+                await self.verify_async(audience, key_cache, ignore_expiry)
+            )
+
+        if not isinstance(audience, str):
+            raise TypeError('audience must be of type `str`')
+
+        async def verify() -> bool:
+            return self._decide(
+                await self.verify_async(audience, key_cache, ignore_expiry)
+            )
+
+        digest = ResultCache.digest(self._raw_token, audience, ignore_expiry)
+        return await result_cache.retrieve_or_verify_async(
+            digest=digest,
+            expires_at=self._expires_at(),
+            verify=verify
+        )
+
+    def verify(
+        self,
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Verify this token, returning a VerificationResult describing the
+        outcome. The token's claims are checked before its key is retrieved,
+        and its signature last, stopping at the first failure.
+        """
+
+        return self._verifier(audience, key_cache, ignore_expiry).verify(
+            self,
+            now
+        )
+
+    async def verify_async(
+        self,
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Asynchronous counterpart to `verify`. The key lookup timing includes
+        any time spent waiting on the event loop.
+        """
+
+        return await self._verifier(
+            audience,
+            key_cache,
+            ignore_expiry
+        ).verify_async(self, now)
+
+    def precheck(
+        self,
+        audience: str,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> Optional[Rejection]:
+        """
+        Return the reason this token would be rejected on its header and
+        claims alone, or None if it is worth fetching a key and checking
+        its signature
+        """
+        rejection = Precheck.check_header(self._header)
+        if rejection is not None:
+            return rejection
         try:
-            result = jwt.decode(
-                jwt=self._raw_token,
-                key=pks,
-                algorithms=['RS256'],
-                audience=audience,
-                options={
-                    'verify_exp': not ignore_expiry
-                }
+            payload = self._load_payload()
+        except (ValueError, KeyError, TypeError):
+            return Rejection.MALFORMED
+        return Precheck.check_payload(
+            payload=payload,
+            audience=audience,
+            ignore_expiry=ignore_expiry,
+            now=now
+        )
+
+    @staticmethod
+    def _verifier(
+        audience: str,
+        key_cache: Optional[KeyCache],
+        ignore_expiry: bool
+    ) -> 'Verifier':
+        """
+        Return the Verifier for the single `audience`, whose pipeline every
+        verification method of IdentityToken shares. Verifiers are built once
+        per audience, key cache and expiry policy, and reused; a token
+        verified without a key cache uses `KeyCache.shared()`.
+        """
+        if not isinstance(audience, str):
+            raise TypeError('audience must be of type `str`')
+        if key_cache is None:
+            key_cache = KeyCache.shared()
+        policy = (audience, key_cache, ignore_expiry)
+        verifier = IdentityToken._VERIFIERS.get(policy)
+        if verifier is not None:
+            return verifier
+        # Imported here, as the verifier module imports this one
+        from siwa.library.verifier import Verifier
+        verifier = Verifier(
+            audiences=audience,
+            key_cache=key_cache,
+            ignore_expiry=ignore_expiry
+        )
+        if len(IdentityToken._VERIFIERS) >= IdentityToken._MAX_VERIFIERS:
+            # Bound the key caches held, should callers make one per call
+            IdentityToken._VERIFIERS.clear()
+        IdentityToken._VERIFIERS[policy] = verifier
+        return verifier
+
+    @staticmethod
+    def _report(rejection: Rejection) -> None:
+        hooks = Instrumentation.active
+        if hooks is not None:
+            hooks.token_rejected(rejection)
+        return
+
+    def _decide(self, result: VerificationResult) -> bool:
+        """Reduce `result` to the decision of the boolean interface"""
+        if result.rejection is Rejection.UNKNOWN_KEY:
+            raise RuntimeError(
+                'Apple PublicKey not found ' + self._header.identifier
+            )
+        return result.valid
+
+    def check_signature(self, key: PublicKey) -> bool:
+        """
+        Return True if this token's signature was made by `key`. Its header
+        and claims are not checked; see `precheck`.
+        """
+
+        hooks = Instrumentation.active
+        if hooks is not None:
+            start = time.perf_counter()
+
+        try:
+            signature = self._load_signature()
+        except (ValueError, TypeError):
+            valid = False
+        else:
+            valid = Verification.verify_signature(
+                key=key.verifier_key,
+                signed_body=self._raw_signed_body,
+                signature=signature
+            )
+
+        if hooks is not None:
+            hooks.signature_checked(time.perf_counter() - start, valid)
+
+        return valid
+
+    def _expires_at(self) -> float:
+        try:
+            return float(self._load_payload().expires_utc_seconds_since_epoch)
+        except (ValueError, KeyError, TypeError, OverflowError):
+            return 0.0
+
+    @classmethod
+    def verify_many(
+        cls: Type[T],
+        tokens: Sequence[RawToken],
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        executor: Optional['Executor'] = None,
+        max_workers: Optional[int] = None,
+        use_processes: bool = False,
+        chunk_size: int = 256
+    ) -> List[bool]:
+        """
+        Verify a batch of raw identity tokens, returning a result for each
+        in input order. Tokens are grouped by key identifier, so that each
+        key is resolved once, and signature checks are spread across
+        `executor`, or across a thread (or process) pool of `max_workers`
+        created for the duration of the call. Tokens that cannot be parsed,
+        that fail their precheck, or that name an unknown key, are reported
+        as not valid; no key is resolved for a group that fails entirely.
+        """
+
+        if not isinstance(audience, str):
+            raise TypeError('audience must be of type `str`')
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+
+        if key_cache is None:
+            key_cache = KeyCache()
+
+        results = [False] * len(tokens)
+        groups: Dict[str, List[Tuple[int, T]]] = {}
+
+        for index, raw_token in enumerate(tokens):
+            try:
+                token = cls.parse(raw_token)
+            except Exception:
+                continue
+            rejection = token.precheck(audience, ignore_expiry)
+            if rejection is not None:
+                cls._report(rejection)
+                continue
+            groups.setdefault(token._header.identifier, []).append(
+                (index, token)
             )
-        except PyJWTError as error:
-            return False
 
-        return result is not None
+        owns_executor = executor is None
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            from concurrent.futures import ProcessPoolExecutor
+            if use_processes:
+                executor = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        try:
+            futures: List[Tuple[List[int], 'Future']] = []
+            for identifier, members in groups.items():
+                key = ApplePublicKey.retrieve_by_id(identifier, key_cache)
+                if key is None:
+                    for _ in members:
+                        cls._report(Rejection.UNKNOWN_KEY)
+                    continue
+                for start in range(0, len(members), chunk_size):
+                    chunk = members[start:start + chunk_size]
+                    futures.append(([i for i, _ in chunk], executor.submit(
+                        _verify_group,
+                        key,
+                        [t for _, t in chunk]
+                    )))
+            for indexes, future in futures:
+                for index, outcome in zip(indexes, future.result()):
+                    results[index] = outcome
+                    if not outcome:
+                        cls._report(Rejection.BAD_SIGNATURE)
+        finally:
+            if owns_executor:
+                executor.shutdown()
+
+        return results
+
+    @classmethod
+    def verify_raw(
+        cls: Type[T],
+        data: RawToken,
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Parse and verify a raw identity token, returning a
+        VerificationResult. A token that cannot be parsed is rejected as
+        TOO_LONG or MALFORMED, rather than raising.
+        """
+
+        return cls._verifier(audience, key_cache, ignore_expiry).verify_raw(
+            data,
+            now
+        )
+
+    @classmethod
+    async def verify_raw_async(
+        cls: Type[T],
+        data: RawToken,
+        audience: str,
+        key_cache: Optional[KeyCache] = None,
+        ignore_expiry: bool = False,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """Asynchronous counterpart to `verify_raw`"""
+
+        return await cls._verifier(
+            audience,
+            key_cache,
+            ignore_expiry
+        ).verify_raw_async(data, now)
 
     @classmethod
     def decode(cls: Type[T], data: Dict[str, Any]) -> T:
         raise NotImplementedError
 
     @classmethod
-    def parse(cls: Type[T], data: Union[bytes, str]) -> T:
+    def parse(cls: Type[T], data: RawToken) -> T:
+        """
+        Parse a raw identity token, from text or any buffer of bytes. Bytes
+        and read-only memoryviews are parsed in place, without copying.
+        Only the header is decoded up front; the payload is decoded on first
+        access to `.payload`, and the signature at verification time.
+        """
 
-        if isinstance(data, str):
-            data = data.encode('utf-8')
+        hooks = Instrumentation.active
+        if hooks is not None:
+            start = time.perf_counter()
 
-        raw_header, raw_payload, raw_signature = data.rsplit(b'.')
+        data = Data.buffer(data)
+        segments = None
+        rejection = Rejection.TOO_LONG
+        if len(data) <= Precheck.MAX_TOKEN_LENGTH:
+            segments = Precheck.locate_segments(data)
+            rejection = Rejection.MALFORMED
 
-        header = Header.decode(json.loads(Data.decode_b64(raw_header)))
-        payload = Payload.decode(json.loads(Data.decode_b64(raw_payload)))
-        signature = Data.decode_b64(raw_signature)
+        if segments is None:
+            if hooks is not None:
+                hooks.token_rejected(rejection)
+            raise ValueError('Malformed identity token: ' + rejection.value)
 
-        return cls(
+        payload_start, signature_start = segments
+        header = Header.decode(json.loads(Data.decode_b64(
+            memoryview(data)[:payload_start - 1]
+        )))
+
+        token = cls(
             header=header,
-            payload=payload,
-            raw_signed_body=b'.'.join((raw_header, raw_payload)),
-            signature=signature,
-            raw_token=data
+            raw_token=data,
+            payload_start=payload_start,
+            signature_start=signature_start
         )
+
+        if hooks is not None:
+            hooks.token_parsed(time.perf_counter() - start)
+
+        return token
+
+    @staticmethod
+    def peek_header(data: RawToken) -> Header:
+        """
+        Return the header of a raw identity token, e.g. to route by key
+        identifier or algorithm, without decoding the payload or signature
+        """
+        data = Data.buffer(data)
+        segments = Precheck.locate_segments(data)
+        if segments is None:
+            raise ValueError('Malformed identity token')
+        return Header.decode(json.loads(Data.decode_b64(
+            memoryview(data)[:segments[0] - 1]
+        )))
+
+    @staticmethod
+    def peek_claims(data: RawToken) -> Dict[str, Any]:
+        """
+        Return the unverified claims of a raw identity token, e.g. its `sub`
+        and `exp`, without building a Payload or decoding the signature.
+        The claims must not be trusted until the token has been verified.
+        """
+        data = Data.buffer(data)
+        segments = Precheck.locate_segments(data)
+        if segments is None:
+            raise ValueError('Malformed identity token')
+        return json.loads(Data.decode_b64(
+            memoryview(data)[segments[0]:segments[1] - 1]
+        ))
+
+
+def _verify_group(
+    key: PublicKey,
+    tokens: List[IdentityToken]
+) -> List[bool]:
+    """Verify the signatures of prechecked tokens sharing a single key"""
+    return [t.check_signature(key) for t in tokens]
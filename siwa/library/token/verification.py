@@ -0,0 +1,44 @@
+"""
+Signin With Apple
+Verification Module
+author: hugh@blinkybeach.com
+"""
+from typing import Optional, Any, Tuple, TYPE_CHECKING
+from siwa.library.data import Buffer
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+
+
+class Verification:
+    """
+    Checks the RS256 signature over the raw signed body of an identity
+    token that has already been parsed. Header and claims are checked by
+    Precheck. The cryptography package is imported on the first signature
+    check, not with this module.
+    """
+
+    _PRIMITIVES: Optional[Tuple[Any, Any, Any]] = None
+
+    @classmethod
+    def verify_signature(
+        cls,
+        key: 'RSAPublicKey',
+        signed_body: Buffer,
+        signature: bytes
+    ) -> bool:
+        invalid, padding, hash_ = cls._PRIMITIVES or cls._load_primitives()
+        try:
+            key.verify(signature, signed_body, padding, hash_)
+        except invalid:
+            return False
+        return True
+
+    @classmethod
+    def _load_primitives(cls) -> Tuple[Any, Any, Any]:
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives.asymmetric.padding import (
+            PKCS1v15
+        )
+        from cryptography.hazmat.primitives.hashes import SHA256
+        cls._PRIMITIVES = (InvalidSignature, PKCS1v15(), SHA256())
+        return cls._PRIMITIVES
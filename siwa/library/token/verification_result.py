@@ -0,0 +1,101 @@
+"""
+Signin With Apple
+Verification Result Module
+author: hugh@blinkybeach.com
+"""
+import json
+from operator import attrgetter
+from typing import Optional, Dict, Any, TYPE_CHECKING
+from siwa.library.data import Data
+from siwa.library.token.payload import Payload
+from siwa.library.token.rejection import Rejection
+if TYPE_CHECKING:
+    from siwa.library.token.token import IdentityToken
+
+
+class VerificationResult:
+    """
+    The outcome of verifying an identity token: whether it is valid, and if
+    not, the Rejection explaining why, along with the identifier of the key
+    it names, its decoded claims where they could be decoded, and the time
+    spent in each stage of verification, in seconds, keyed by stage name
+    (`parse`, `precheck`, `key_lookup`, `signature` and, where replays are
+    detected, `replay`). Stages that were not reached are absent from
+    `timings`. A valid result also carries the audience the token was
+    accepted for.
+    """
+
+    __slots__ = (
+        '_rejection',
+        '_token',
+        '_timings',
+        '_audience',
+        '_claims'
+    )
+
+    def __init__(
+        self,
+        rejection: Optional[Rejection],
+        token: Optional['IdentityToken'],
+        timings: Dict[str, float],
+        audience: Optional[str] = None
+    ) -> None:
+
+        self._rejection = rejection
+        self._token = token
+        self._timings = timings
+        self._audience = audience
+        self._claims: Optional[Dict[str, Any]] = None
+
+        return
+
+    rejection = property(attrgetter('_rejection'))
+    token = property(attrgetter('_token'))
+    timings = property(attrgetter('_timings'))
+    audience = property(attrgetter('_audience'))
+    valid = property(lambda s: s._rejection is None)
+    reason = property(lambda s: None if s._rejection is None else (
+        s._rejection.value
+    ))
+    key_identifier = property(lambda s: None if s._token is None else (
+        s._token.header.identifier
+    ))
+    payload = property(lambda s: s._load_payload())
+    claims = property(lambda s: s._load_claims())
+    elapsed = property(lambda s: sum(s._timings.values()))
+
+    def __bool__(self) -> bool:
+        return self._rejection is None
+
+    def _load_payload(self) -> Optional[Payload]:
+        """Return the token's Payload, or None if it could not be decoded"""
+        if self._token is None:
+            return None
+        try:
+            return self._token.payload
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _load_claims(self) -> Optional[Dict[str, Any]]:
+        """
+        Return the token's claims as a dictionary, decoded on first use,
+        or None if they could not be decoded. Claims of a token that is not
+        valid must not be trusted.
+        """
+        if self._claims is None and self._token is not None:
+            try:
+                claims = json.loads(Data.decode_b64(self._token._raw_payload))
+            except ValueError:
+                return None
+            if isinstance(claims, dict):
+                self._claims = claims
+        return self._claims
+
+    def encode(self) -> Dict[str, Any]:
+        return {
+            'valid': self.valid,
+            'reason': self.reason,
+            'kid': self.key_identifier,
+            'audience': self._audience,
+            'timings': self._timings
+        }
@@ -0,0 +1,328 @@
+"""
+Signin With Apple
+Token Exchange Module
+author: hugh@blinkybeach.com
+"""
+import time
+from urllib.parse import urlencode
+from typing import Optional, Union, Callable, Dict, Any, Tuple
+from siwa.library.key_cache import KeyCache
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.transport import Transport, HTTPResponse
+from siwa.library.token.token import IdentityToken
+from siwa.library.token.verification_result import VerificationResult
+from siwa.library.verifier import Verifier
+
+SecretSource = Union[str, Callable[[], str]]
+
+
+class TokenExchangeError(RuntimeError):
+    """
+    Apple declined a token request, or answered it with an identity token
+    that is not valid. `error` is Apple's error code (e.g.
+    `invalid_grant`, for an authorization code that has expired or already
+    been used, or a revoked refresh token), or `invalid_id_token`, in which
+    case `result` explains why verification failed.
+    """
+
+    def __init__(
+        self,
+        error: str,
+        status: Optional[int] = None,
+        result: Optional[VerificationResult] = None
+    ) -> None:
+
+        super().__init__('Apple token request failed: {e}{s}'.format(
+            e=error,
+            s='' if status is None else ' (HTTP {s})'.format(s=status)
+        ))
+        self.error = error
+        self.status = status
+        self.result = result
+
+        return
+
+
+class TokenResponse:
+    """
+    Tokens issued by Apple's token endpoint. The identity token has been
+    verified, and `result` holds the outcome. A refresh token is issued in
+    exchange for an authorization code, but not when a refresh token is
+    validated.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        token_type: str,
+        expires_in: int,
+        refresh_token: Optional[str],
+        id_token: IdentityToken,
+        result: VerificationResult
+    ) -> None:
+
+        self._access_token = access_token
+        self._token_type = token_type
+        self._expires_in = expires_in
+        self._refresh_token = refresh_token
+        self._id_token = id_token
+        self._result = result
+
+        return
+
+    access_token = property(lambda s: s._access_token)
+    token_type = property(lambda s: s._token_type)
+    expires_in = property(lambda s: s._expires_in)
+    refresh_token = property(lambda s: s._refresh_token)
+    id_token = property(lambda s: s._id_token)
+    result = property(lambda s: s._result)
+    payload = property(lambda s: s._id_token.payload)
+
+
+class TokenExchange:
+    """
+    A client for Apple's token endpoint, exchanging authorization codes for
+    tokens and validating refresh tokens on behalf of `client_id` (an App
+    ID or Services ID). `client_secret` is a signed client secret, or a
+    callable returning one, such as a ClientSecret. Requests are made over
+    `transport`, by default the persistent connection pool to Apple's
+    servers that keys are fetched through, and the identity token returned
+    is verified with keys from `key_cache`, by default the KeyCache shared
+    in this process. A request that fails before Apple answers, or that
+    Apple answers with a server error or 429, is attempted up to
+    `max_attempts` times in all, waiting `backoff` seconds, doubling,
+    between attempts; timeouts are those of the transport. An authorization
+    code may be redeemed only once, so its exchange is retried only where
+    Apple answers 429 or 503, declining to act on it, and never after a
+    request fails without an answer, which Apple may nonetheless have
+    acted upon. A TokenExchange may be shared between threads, and between
+    event loops.
+    """
+
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_BACKOFF = 0.1
+
+    _TOKEN_PATH = '/auth/token'
+    _HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: SecretSource,
+        redirect_uri: Optional[str] = None,
+        key_cache: Optional[KeyCache] = None,
+        transport: Optional[Transport] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF,
+        leeway: float = 0.0
+    ) -> None:
+
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+
+        if key_cache is None:
+            if transport is None:
+                key_cache = KeyCache.shared()
+            else:
+                key_cache = KeyCache(transport=transport)
+
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._redirect_uri = redirect_uri
+        self._key_cache = key_cache
+        self._transport = transport
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._verifier = Verifier(
+            audiences=client_id,
+            leeway=leeway,
+            key_cache=key_cache
+        )
+
+        return
+
+    client_id = property(lambda s: s._client_id)
+    key_cache = property(lambda s: s._key_cache)
+    verifier = property(lambda s: s._verifier)
+
+    def exchange_code(
+        self,
+        code: str,
+        redirect_uri: Optional[str] = None
+    ) -> TokenResponse:
+        """Exchange an authorization code for tokens"""
+        return self._request(self._code_grant(code, redirect_uri), False)
+
+    async def exchange_code_async(
+        self,
+        code: str,
+        redirect_uri: Optional[str] = None
+    ) -> TokenResponse:
+        """Asynchronous counterpart to `exchange_code`"""
+        return await self._request_async(
+            self._code_grant(code, redirect_uri),
+            False
+        )
+
+    def refresh(self, refresh_token: str) -> TokenResponse:
+        """Validate a refresh token, obtaining a new identity token"""
+        return self._request(self._refresh_grant(refresh_token), True)
+
+    async def refresh_async(self, refresh_token: str) -> TokenResponse:
+        """Asynchronous counterpart to `refresh`"""
+        return await self._request_async(
+            self._refresh_grant(refresh_token),
+            True
+        )
+
+    def _request(
+        self,
+        grant: Dict[str, str],
+        repeatable: bool
+    ) -> TokenResponse:
+        """
+        Make the request for `grant`, retrying failures only where the grant
+        is `repeatable`, or where Apple declined to act on it
+        """
+
+        transport = ApplePublicKey.transport_for(
+            self._transport,
+            self._key_cache
+        )
+        body = self._encode(grant)
+
+        attempt = 1
+        while True:
+            try:
+                response = transport.request(
+                    method='POST',
+                    path=self._TOKEN_PATH,
+                    headers=self._HEADERS,
+                    body=body,
+                    repeatable=repeatable
+                )
+            except OSError:
+                if not repeatable or attempt >= self._max_attempts:
+                    raise
+            else:
+                if not self._should_retry(response, attempt, repeatable):
+                    data, id_token = self._parse(response)
+                    return self._tokens_from(
+                        data,
+                        self._verifier.verify_raw(id_token),
+                        response.status
+                    )
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def _request_async(
+        self,
+        grant: Dict[str, str],
+        repeatable: bool
+    ) -> TokenResponse:
+
+        import asyncio
+        transport = ApplePublicKey.transport_for(
+            self._transport,
+            self._key_cache
+        )
+        body = self._encode(grant)
+
+        attempt = 1
+        while True:
+            try:
+                response = await transport.request_async(
+                    method='POST',
+                    path=self._TOKEN_PATH,
+                    headers=self._HEADERS,
+                    body=body,
+                    repeatable=repeatable
+                )
+            except (OSError, EOFError, asyncio.TimeoutError):
+                if not repeatable or attempt >= self._max_attempts:
+                    raise
+            else:
+                if not self._should_retry(response, attempt, repeatable):
+                    data, id_token = self._parse(response)
+                    return self._tokens_from(
+                        data,
+                        await self._verifier.verify_raw_async(id_token),
+                        response.status
+                    )
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    def _code_grant(
+        self,
+        code: str,
+        redirect_uri: Optional[str]
+    ) -> Dict[str, str]:
+        grant = {'grant_type': 'authorization_code', 'code': code}
+        redirect_uri = redirect_uri or self._redirect_uri
+        if redirect_uri is not None:
+            grant['redirect_uri'] = redirect_uri
+        return grant
+
+    @staticmethod
+    def _refresh_grant(refresh_token: str) -> Dict[str, str]:
+        return {'grant_type': 'refresh_token', 'refresh_token': refresh_token}
+
+    def _encode(self, grant: Dict[str, str]) -> bytes:
+        secret = self._client_secret
+        return urlencode(dict(grant, **{
+            'client_id': self._client_id,
+            'client_secret': secret if isinstance(secret, str) else secret()
+        })).encode('ascii')
+
+    def _should_retry(
+        self,
+        response: HTTPResponse,
+        attempt: int,
+        repeatable: bool
+    ) -> bool:
+        if attempt >= self._max_attempts:
+            return False
+        if response.status in (429, 503):
+            return True
+        return repeatable and response.status >= 500
+
+    def _delay(self, attempt: int) -> float:
+        return self._backoff * (2 ** (attempt - 1))
+
+    @staticmethod
+    def _parse(response: HTTPResponse) -> Tuple[Dict[str, Any], str]:
+        """Return the body and raw identity token of a response"""
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            data = {}
+        if response.status != 200:
+            raise TokenExchangeError(
+                str(data.get('error', 'http_error')),
+                response.status
+            )
+        id_token = data.get('id_token')
+        if not isinstance(id_token, str):
+            raise TokenExchangeError('invalid_id_token', response.status)
+        return data, id_token
+
+    @staticmethod
+    def _tokens_from(
+        data: Dict[str, Any],
+        result: VerificationResult,
+        status: int
+    ) -> TokenResponse:
+
+        if not result.valid:
+            raise TokenExchangeError('invalid_id_token', status, result)
+
+        return TokenResponse(
+            access_token=data.get('access_token', ''),
+            token_type=data.get('token_type', ''),
+            expires_in=int(data.get('expires_in', 0)),
+            refresh_token=data.get('refresh_token'),
+            id_token=result.token,
+            result=result
+        )
@@ -0,0 +1,386 @@
+"""
+Signin With Apple
+Transport Module
+author: hugh@blinkybeach.com
+"""
+import json
+import weakref
+from threading import Lock
+from urllib.parse import urlsplit
+from typing import Dict, Optional, Any, List, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    import asyncio
+    import ssl
+    from http.client import HTTPConnection
+
+# The asyncio, ssl and http.client modules are imported when a connection
+# is first made, not with this module, so that importing siwa stays cheap
+_StreamPair = Tuple['asyncio.StreamReader', 'asyncio.StreamWriter']
+_STALE_CONNECTION_ERRORS = (
+    ConnectionResetError,
+    BrokenPipeError,
+    ConnectionAbortedError
+)
+
+
+class HTTPResponse:
+
+    def __init__(
+        self,
+        status: int,
+        headers: Dict[str, str],
+        body: bytes
+    ) -> None:
+
+        self._status = status
+        self._headers = headers
+        self._body = body
+
+        return
+
+    status = property(lambda s: s._status)
+    headers = property(lambda s: s._headers)
+    body = property(lambda s: s._body)
+
+    def header(self, name: str) -> Optional[str]:
+        return self._headers.get(name.lower())
+
+    def json(self) -> Any:
+        return json.loads(self._body)
+
+
+class Transport:
+    """
+    Abstract protocol defining an HTTP transport to Apple's servers. A
+    request is `repeatable` if sending it twice has the effect of sending it
+    once; by default, if its method is idempotent.
+    """
+    origin: str = NotImplemented
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        repeatable: Optional[bool] = None
+    ) -> HTTPResponse:
+        raise NotImplementedError
+
+    async def request_async(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        repeatable: Optional[bool] = None
+    ) -> HTTPResponse:
+        raise NotImplementedError
+
+
+class PooledTransport(Transport):
+    """
+    An HTTP/1.1 transport to a single origin, keeping connections alive
+    between requests. Blocking requests draw on a thread-safe pool of
+    connections, and asynchronous requests on a pool per event loop.
+    A repeatable request that fails on a reused connection, because the
+    server closed it while idle, is retried on a new connection. Other
+    requests, such as a POST redeeming a single-use authorization code, are
+    sent on a new connection and never retried, as the server may have
+    acted upon them before the connection failed.
+    """
+
+    DEFAULT_ORIGIN = 'https://appleid.apple.com'
+    DEFAULT_CONNECT_TIMEOUT = 5.0
+    DEFAULT_READ_TIMEOUT = 10.0
+    DEFAULT_MAX_IDLE_CONNECTIONS = 8
+    IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+    _DEFAULT_HEADERS = {
+        'Accept': 'application/json',
+        'User-Agent': 'siwa-python'
+    }
+
+    def __init__(
+        self,
+        origin: str = DEFAULT_ORIGIN,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        max_idle_connections: int = DEFAULT_MAX_IDLE_CONNECTIONS,
+        ssl_context: Optional['ssl.SSLContext'] = None
+    ) -> None:
+
+        parts = urlsplit(origin)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('origin must be an http or https URL')
+
+        self._origin = origin.rstrip('/')
+        self._secure = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port or (443 if self._secure else 80)
+        self._netloc = parts.netloc
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._max_idle = max_idle_connections
+        self._ssl_context = ssl_context
+
+        self._idle: List['HTTPConnection'] = []
+        self._lock = Lock()
+        self._async_idle: 'weakref.WeakKeyDictionary[Any, List[_StreamPair]]'
+        self._async_idle = weakref.WeakKeyDictionary()
+
+        return
+
+    origin = property(lambda s: s._origin)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        repeatable: Optional[bool] = None
+    ) -> HTTPResponse:
+
+        all_headers = dict(self._DEFAULT_HEADERS)
+        if headers is not None:
+            all_headers.update(headers)
+
+        from http.client import RemoteDisconnected
+        stale_errors = _STALE_CONNECTION_ERRORS + (RemoteDisconnected,)
+
+        if repeatable is None:
+            repeatable = method.upper() in self.IDEMPOTENT_METHODS
+
+        while True:
+            connection, reused = self._acquire(reuse=repeatable)
+            try:
+                connection.request(
+                    method,
+                    path,
+                    body=body,
+                    headers=all_headers
+                )
+                response = connection.getresponse()
+                data = response.read()
+            except stale_errors:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+
+            return HTTPResponse(
+                status=response.status,
+                headers={k.lower(): v for k, v in response.getheaders()},
+                body=data
+            )
+
+    async def request_async(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[bytes] = None,
+        repeatable: Optional[bool] = None
+    ) -> HTTPResponse:
+
+        all_headers = dict(self._DEFAULT_HEADERS)
+        if headers is not None:
+            all_headers.update(headers)
+        all_headers['Host'] = self._netloc
+        if body is not None:
+            all_headers['Content-Length'] = str(len(body))
+
+        head = '{m} {p} HTTP/1.1\r\n'.format(m=method, p=path) + ''.join(
+            '{k}: {v}\r\n'.format(k=k, v=v) for k, v in all_headers.items()
+        ) + '\r\n'
+        message = head.encode('latin-1') + (body or b'')
+
+        import asyncio
+        from http.client import RemoteDisconnected
+        stale_errors = _STALE_CONNECTION_ERRORS + (
+            RemoteDisconnected,
+            asyncio.IncompleteReadError
+        )
+
+        if repeatable is None:
+            repeatable = method.upper() in self.IDEMPOTENT_METHODS
+
+        while True:
+            streams, reused = await self._acquire_async(reuse=repeatable)
+            reader, writer = streams
+            try:
+                writer.write(message)
+                await asyncio.wait_for(writer.drain(), self._read_timeout)
+                status, response_headers, data, reusable = (
+                    await asyncio.wait_for(
+                        self._read_response(reader, method),
+                        self._read_timeout
+                    )
+                )
+            except stale_errors:
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if reusable:
+                self._release_async(streams)
+            else:
+                writer.close()
+
+            return HTTPResponse(
+                status=status,
+                headers=response_headers,
+                body=data
+            )
+
+    def close(self) -> None:
+        """Close idle connections held by this transport"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+        for loop, streams in list(self._async_idle.items()):
+            if loop.is_closed():
+                # Streams of a closed loop cannot be closed through it, and
+                # their sockets are released once they are collected
+                continue
+            for _, writer in streams:
+                writer.close()
+        self._async_idle.clear()
+        return
+
+    def _acquire(self, reuse: bool = True) -> Tuple['HTTPConnection', bool]:
+
+        if reuse:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop(), True
+
+        from http.client import HTTPConnection, HTTPSConnection
+        connection: HTTPConnection
+        if self._secure:
+            connection = HTTPSConnection(
+                self._host,
+                self._port,
+                timeout=self._connect_timeout,
+                context=self._context()
+            )
+        else:
+            connection = HTTPConnection(
+                self._host,
+                self._port,
+                timeout=self._connect_timeout
+            )
+        connection.connect()
+        if connection.sock is not None:
+            connection.sock.settimeout(self._read_timeout)
+        return connection, False
+
+    def _context(self) -> 'ssl.SSLContext':
+        """Return the TLS context, creating the default on first use"""
+        if self._ssl_context is None:
+            import ssl
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def _release(self, connection: 'HTTPConnection') -> None:
+        with self._lock:
+            if len(self._idle) < self._max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+        return
+
+    async def _acquire_async(
+        self,
+        reuse: bool = True
+    ) -> Tuple[_StreamPair, bool]:
+
+        import asyncio
+        idle = self._async_idle.get(asyncio.get_running_loop())
+        while reuse and idle:
+            streams = idle.pop()
+            if not streams[0].at_eof():
+                return streams, True
+            streams[1].close()
+
+        streams = await asyncio.wait_for(
+            asyncio.open_connection(
+                host=self._host,
+                port=self._port,
+                ssl=self._context() if self._secure else None
+            ),
+            self._connect_timeout
+        )
+        return streams, False
+
+    def _release_async(self, streams: _StreamPair) -> None:
+        import asyncio
+        idle = self._async_idle.setdefault(asyncio.get_running_loop(), [])
+        if len(idle) < self._max_idle:
+            idle.append(streams)
+            return
+        streams[1].close()
+        return
+
+    @classmethod
+    async def _read_response(
+        cls,
+        reader: 'asyncio.StreamReader',
+        method: str
+    ) -> Tuple[int, Dict[str, str], bytes, bool]:
+
+        status_line = await reader.readline()
+        if not status_line:
+            from http.client import RemoteDisconnected
+            raise RemoteDisconnected('Connection closed before response')
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise RuntimeError('Malformed HTTP status line')
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        reusable = headers.get('connection', '').lower() != 'close'
+
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            return status, headers, b'', reusable
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    trailer = await reader.readline()
+                    while trailer not in (b'\r\n', b'\n', b''):
+                        trailer = await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return status, headers, b''.join(chunks), reusable
+
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            return status, headers, await reader.readexactly(length), reusable
+
+        return status, headers, await reader.read(), False
@@ -0,0 +1,288 @@
+"""
+Signin With Apple
+Verifier Module
+author: hugh@blinkybeach.com
+"""
+import time
+from typing import Optional, Union, Iterable, Type, Tuple, Dict, Any
+from siwa.library.data import RawToken
+from siwa.library.instrumentation import Instrumentation
+from siwa.library.key_cache import KeyCache
+from siwa.library.key_protocol import PublicKey
+from siwa.library.public_key import ApplePublicKey
+from siwa.library.replay_store import ReplayStore
+from siwa.library.token.precheck import Precheck
+from siwa.library.token.rejection import Rejection
+from siwa.library.token.token import IdentityToken
+from siwa.library.token.verification_result import VerificationResult
+
+
+class Verifier:
+    """
+    A verification policy, built once and reused for every token: the
+    audiences a token may be issued for (e.g. the bundle identifiers of an
+    iOS app and a macOS app, and a web Services ID), the expected issuer,
+    the permitted clock skew in seconds, the permitted algorithms, and the
+    source and cache of public keys. A token is verified once, whichever
+    audience it was issued for, and the VerificationResult reports the
+    audience that matched. Given a `replay_store`, a token that is otherwise
+    valid is rejected as REPLAYED if it has been accepted before; as records
+    are held only until a token expires, a `replay_store` cannot be combined
+    with `ignore_expiry`.
+    """
+
+    SUPPORTED_ALGORITHMS = frozenset((Precheck.ALGORITHM,))
+
+    def __init__(
+        self,
+        audiences: Union[str, Iterable[str]],
+        issuer: str = Precheck.ISSUER,
+        leeway: float = 0.0,
+        algorithms: Iterable[str] = (Precheck.ALGORITHM,),
+        key_cache: Optional[KeyCache] = None,
+        source: Type[ApplePublicKey] = ApplePublicKey,
+        ignore_expiry: bool = False,
+        replay_store: Optional[ReplayStore] = None
+    ) -> None:
+
+        if isinstance(audiences, str):
+            audiences = (audiences,)
+        audiences = frozenset(audiences)
+        if not audiences or not all(isinstance(a, str) for a in audiences):
+            raise TypeError('audiences must be one or more `str`')
+
+        algorithms = frozenset(algorithms)
+        if not algorithms or not algorithms <= self.SUPPORTED_ALGORITHMS:
+            raise ValueError('Supported algorithms are {a}'.format(
+                a=', '.join(sorted(self.SUPPORTED_ALGORITHMS))
+            ))
+        if leeway < 0:
+            raise ValueError('leeway must not be negative')
+        if ignore_expiry and replay_store is not None:
+            raise ValueError(
+                'replay_store cannot detect the replay of expired tokens, '
+                'so may not be combined with ignore_expiry'
+            )
+
+        self._audiences = audiences
+        self._issuer = issuer
+        self._leeway = float(leeway)
+        self._algorithms = algorithms
+        self._key_cache = key_cache if key_cache is not None else KeyCache()
+        self._source = source
+        self._ignore_expiry = ignore_expiry
+        self._replay_store = replay_store
+
+        return
+
+    audiences = property(lambda s: s._audiences)
+    issuer = property(lambda s: s._issuer)
+    leeway = property(lambda s: s._leeway)
+    algorithms = property(lambda s: s._algorithms)
+    key_cache = property(lambda s: s._key_cache)
+    source = property(lambda s: s._source)
+    ignore_expiry = property(lambda s: s._ignore_expiry)
+    replay_store = property(lambda s: s._replay_store)
+
+    def verify(
+        self,
+        token: IdentityToken,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Verify a parsed token against this policy. Its header and claims are
+        checked before its key is retrieved, and its signature last,
+        stopping at the first failure.
+        """
+
+        timings: Dict[str, float] = {}
+        rejection, audience, checked = self._begin(token, now, timings)
+        if rejection is not None:
+            return self._result(token, rejection, timings)
+
+        key = self._source.retrieve_by_id(
+            token.header.identifier,
+            self._key_cache
+        )
+
+        return self._finish(token, key, audience, checked, timings, now)
+
+    async def verify_async(
+        self,
+        token: IdentityToken,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Asynchronous counterpart to `verify`, retrieving public keys without
+        blocking the event loop. The key lookup timing includes any time
+        spent waiting on the event loop.
+        """
+
+        timings: Dict[str, float] = {}
+        rejection, audience, checked = self._begin(token, now, timings)
+        if rejection is not None:
+            return self._result(token, rejection, timings)
+
+        key = await self._source.retrieve_by_id_async(
+            token.header.identifier,
+            self._key_cache
+        )
+
+        return self._finish(token, key, audience, checked, timings, now)
+
+    def verify_raw(
+        self,
+        data: RawToken,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """
+        Parse and verify a raw token against this policy. A token that
+        cannot be parsed is rejected as TOO_LONG or MALFORMED, rather than
+        raising.
+        """
+        token, failure, parsed = self._parse(data)
+        if token is None:
+            return failure
+        result = self.verify(token, now)
+        result.timings['parse'] = parsed
+        return result
+
+    async def verify_raw_async(
+        self,
+        data: RawToken,
+        now: Optional[float] = None
+    ) -> VerificationResult:
+        """Asynchronous counterpart to `verify_raw`"""
+        token, failure, parsed = self._parse(data)
+        if token is None:
+            return failure
+        result = await self.verify_async(token, now)
+        result.timings['parse'] = parsed
+        return result
+
+    @staticmethod
+    def _parse(
+        data: RawToken
+    ) -> Tuple[Optional[IdentityToken], Any, float]:
+        """
+        Parse `data`, returning the token and the time taken to parse it,
+        or a VerificationResult explaining why it could not be parsed
+        """
+
+        start = time.perf_counter()
+        try:
+            token = IdentityToken.parse(data)
+        except Exception:
+            # Structural rejections are reported by parse itself
+            rejection = Precheck.check_structure(data)
+            if rejection is None:
+                rejection = Rejection.MALFORMED
+                Verifier._report(rejection)
+            elapsed = time.perf_counter() - start
+            return None, VerificationResult(
+                rejection,
+                None,
+                {'parse': elapsed}
+            ), elapsed
+
+        return token, None, time.perf_counter() - start
+
+    def _begin(
+        self,
+        token: IdentityToken,
+        now: Optional[float],
+        timings: Dict[str, float]
+    ) -> Tuple[Optional[Rejection], Optional[str], float]:
+        """
+        Precheck `token`, returning the first failed check, if any, the
+        audience that matched, and the time at which the check finished
+        """
+        start = time.perf_counter()
+        rejection, audience = self._precheck(token, now)
+        checked = time.perf_counter()
+        timings['precheck'] = checked - start
+        return rejection, audience, checked
+
+    def _finish(
+        self,
+        token: IdentityToken,
+        key: Optional[PublicKey],
+        audience: Optional[str],
+        checked: float,
+        timings: Dict[str, float],
+        now: Optional[float]
+    ) -> VerificationResult:
+        """Complete verification once a key has been looked up"""
+
+        found = time.perf_counter()
+        timings['key_lookup'] = found - checked
+        if key is None:
+            return self._result(token, Rejection.UNKNOWN_KEY, timings)
+
+        valid = token.check_signature(key)
+        timings['signature'] = time.perf_counter() - found
+        if not valid:
+            return self._result(token, Rejection.BAD_SIGNATURE, timings)
+
+        return self._admit(
+            token,
+            VerificationResult(None, token, timings, audience),
+            now
+        )
+
+    def _admit(
+        self,
+        token: IdentityToken,
+        result: VerificationResult,
+        now: Optional[float]
+    ) -> VerificationResult:
+        """Reject a valid `result` if its token has been accepted before"""
+
+        if self._replay_store is None:
+            return result
+
+        start = time.perf_counter()
+        admitted = self._replay_store.admit(token, now, self._leeway)
+        result.timings['replay'] = time.perf_counter() - start
+        if not admitted:
+            return self._result(token, Rejection.REPLAYED, result.timings)
+
+        return result
+
+    @staticmethod
+    def _result(
+        token: IdentityToken,
+        rejection: Rejection,
+        timings: Dict[str, float]
+    ) -> VerificationResult:
+        Verifier._report(rejection)
+        return VerificationResult(rejection, token, timings)
+
+    @staticmethod
+    def _report(rejection: Rejection) -> None:
+        hooks = Instrumentation.active
+        if hooks is not None:
+            hooks.token_rejected(rejection)
+        return
+
+    def _precheck(
+        self,
+        token: IdentityToken,
+        now: Optional[float]
+    ) -> Tuple[Optional[Rejection], Optional[str]]:
+
+        if token.header.algorithm not in self._algorithms:
+            return Rejection.UNSUPPORTED_ALGORITHM, None
+        try:
+            payload = token.payload
+        except (ValueError, KeyError, TypeError):
+            return Rejection.MALFORMED, None
+
+        return Precheck.match_payload(
+            payload=payload,
+            audiences=self._audiences,
+            issuer=self._issuer,
+            ignore_expiry=self._ignore_expiry,
+            leeway=self._leeway,
+            now=now
+        )
@@ -5,3 +5,24 @@ from siwa.tests.cases.parse_token import ParseIdentityToken
 from siwa.tests.cases.verify_token_signature import (
     VerifyTokenSignature
 )
+from siwa.tests.cases.populate_key_cache import PopulateKeyCache
+from siwa.tests.cases.verify_token_async import VerifyTokenAsync
+from siwa.tests.cases.refresh_keys import RefreshKeys
+from siwa.tests.cases.share_key_file import ShareKeyFile
+from siwa.tests.cases.revalidate_keys import RevalidateKeys
+from siwa.tests.cases.precheck_token import PrecheckToken
+from siwa.tests.cases.instrument_verification import InstrumentVerification
+from siwa.tests.cases.explain_verification import ExplainVerification
+from siwa.tests.cases.authenticate_requests import AuthenticateRequests
+from siwa.tests.cases.verify_many_audiences import VerifyManyAudiences
+from siwa.tests.cases.read_keys_concurrently import ReadKeysConcurrently
+from siwa.tests.cases.import_lazily import ImportLazily
+from siwa.tests.cases.detect_replays import DetectReplays
+from siwa.tests.cases.exchange_tokens import ExchangeTokens
+from siwa.tests.cases.mint_client_secret import MintClientSecret
+from siwa.tests.cases.parse_buffers import ParseBuffers
+from siwa.tests.cases.verify_stream import VerifyStream
+from siwa.tests.cases.verify_many_tokens import VerifyManyTokens
+from siwa.tests.cases.cache_results import CacheResults
+from siwa.tests.cases.limit_key_fetches import LimitKeyFetches
+from siwa.tests.cases.verify_with_custom_keys import VerifyWithCustomKeys
@@ -0,0 +1,85 @@
+"""
+Signin With Apple
+Authenticate Requests Test
+author: hugh@blinkybeach.com
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+from siwa import WSGIMiddleware, ASGIMiddleware, PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class AuthenticateRequests(Test):
+
+    NAME = 'Authenticate WSGI and ASGI requests by identity token'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        bearer = 'Bearer ' + signing_key.token(AUDIENCE)
+
+        def wsgi_application(
+            environ: Dict[str, Any],
+            start_response: Callable[..., Any]
+        ) -> List[bytes]:
+            start_response('200 OK', [])
+            return [environ['siwa.payload'].unique_apple_user_id.encode()]
+
+        async def asgi_application(
+            scope: Dict[str, Any],
+            receive: Any,
+            send: Callable[[Dict[str, Any]], Awaitable[None]]
+        ) -> None:
+            await send({'type': 'http.response.start', 'status': 200})
+            await send({
+                'type': 'http.response.body',
+                'body': scope['siwa.payload'].unique_apple_user_id.encode()
+            })
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+
+            wsgi = WSGIMiddleware(
+                wsgi_application,
+                AUDIENCE,
+                refresh=False,
+                transport=transport
+            )
+            assert server.requests == 1
+
+            for environ, expected in (
+                ({'HTTP_AUTHORIZATION': bearer}, '200 OK'),
+                ({'HTTP_AUTHORIZATION': 'Bearer x.y.z'}, '401 Unauthorized'),
+                ({}, '401 Unauthorized')
+            ):
+                statuses: List[str] = []
+                wsgi(environ, lambda s, h: statuses.append(s))
+                assert statuses == [expected]
+
+            asgi = ASGIMiddleware(
+                asgi_application,
+                AUDIENCE,
+                refresh=False,
+                transport=transport
+            )
+
+            async def request(headers: List[Any]) -> int:
+                sent: List[Dict[str, Any]] = []
+
+                async def send(message: Dict[str, Any]) -> None:
+                    sent.append(message)
+
+                await asgi({'type': 'http', 'headers': headers}, None, send)
+                return sent[0]['status']
+
+            assert asyncio.run(request(
+                [(b'authorization', bearer.encode())]
+            )) == 200
+            assert asyncio.run(request([])) == 401
+
+            transport.close()
+
+        return Success()
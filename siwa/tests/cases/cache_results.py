@@ -0,0 +1,146 @@
+"""
+Signin With Apple
+Cache Results Test
+author: hugh@blinkybeach.com
+"""
+import asyncio
+import time
+from threading import Thread
+from typing import List
+from siwa import IdentityToken, KeyCache, PooledTransport, ResultCache
+from siwa import Instrumentation
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class CountSignatureChecks(Instrumentation):
+
+    def __init__(self) -> None:
+        self.checks = 0
+        return
+
+    def signature_checked(self, seconds: float, valid: bool) -> None:
+        self.checks += 1
+        return
+
+
+class CacheResults(Test):
+
+    NAME = 'Hold verification decisions until expiry, least recently used'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            key_cache = KeyCache(transport=transport)
+            cache = ResultCache()
+
+            token = IdentityToken.parse(signing_key.token())
+            assert token.is_validly_signed(AUDIENCE, key_cache, False, cache)
+            assert cache.retrieve(
+                ResultCache.digest(token._raw_token, AUDIENCE, False)
+            ) is True
+
+            # Valid with ignore_expiry, but never held beyond its expiry
+            expired = IdentityToken.parse(signing_key.token(lifetime=-60))
+            assert expired.is_validly_signed(AUDIENCE, key_cache, True, cache)
+            assert len(cache) == 1
+
+            # Tasks verifying the same token share one signature check
+            async def verify_together() -> List[bool]:
+                cold = KeyCache(transport=transport)
+                tokens = [
+                    IdentityToken.parse(signing_key.token(claims={'n': 1}))
+                ] * 8
+                return await asyncio.gather(*[
+                    token.is_validly_signed_async(
+                        AUDIENCE,
+                        cold,
+                        False,
+                        cache
+                    ) for token in tokens
+                ])
+
+            counter = CountSignatureChecks()
+            Instrumentation.install(counter)
+            try:
+                assert asyncio.run(verify_together()) == [True] * 8
+            finally:
+                Instrumentation.install(None)
+            assert counter.checks == 1
+            assert len(cache) == 2
+
+            transport.close()
+
+        cache = ResultCache(negative_ttl=0.2)
+        cache.store(b'valid', True, time.time() + 0.2)
+        cache.store(b'invalid', False, time.time() + 3600)
+        cache.store(b'stale', True, time.time() - 1)
+        assert cache.retrieve(b'valid') is True
+        assert cache.retrieve(b'invalid') is False
+        assert cache.retrieve(b'stale') is None
+        time.sleep(0.3)
+        assert cache.retrieve(b'valid') is None
+        assert cache.retrieve(b'invalid') is None
+        assert len(cache) == 0
+
+        cache = ResultCache(max_entries=2)
+        expires_at = time.time() + 3600
+        cache.store(b'a', True, expires_at)
+        cache.store(b'b', True, expires_at)
+        assert cache.retrieve(b'a') is True
+        cache.store(b'c', True, expires_at)
+        assert cache.retrieve(b'b') is None
+        assert cache.retrieve(b'a') is True
+        assert cache.retrieve(b'c') is True
+
+        calls: List[bytes] = []
+
+        def verify(digest: bytes) -> bool:
+            time.sleep(0.1)
+            calls.append(digest)
+            return True
+
+        decisions: List[bool] = []
+        threads = [Thread(target=lambda d=d: decisions.append(
+            cache.retrieve_or_verify(d, expires_at, lambda: verify(d))
+        )) for d in [b'x'] * 8 + [b'y'] * 8]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(calls) == [b'x', b'y']
+        assert decisions == [True] * 16
+
+        def interrupt() -> bool:
+            time.sleep(0.2)
+            raise KeyboardInterrupt
+
+        # A waiter on an interrupted verification is released, with an
+        # error, or verifies for itself if it arrives after the interruption
+        outcomes: List[object] = []
+
+        def wait() -> None:
+            time.sleep(0.05)
+            try:
+                outcomes.append(
+                    cache.retrieve_or_verify(b'z', expires_at, lambda: True)
+                )
+            except RuntimeError as error:
+                outcomes.append(error)
+            return
+
+        waiter = Thread(target=wait)
+        waiter.start()
+        try:
+            cache.retrieve_or_verify(b'z', expires_at, interrupt)
+        except KeyboardInterrupt:
+            pass
+        waiter.join(5)
+        assert not waiter.is_alive() and len(outcomes) == 1
+
+        return Success()
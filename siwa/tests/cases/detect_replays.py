@@ -0,0 +1,105 @@
+"""
+Signin With Apple
+Detect Replays Test
+author: hugh@blinkybeach.com
+"""
+import os
+import tempfile
+from siwa import Verifier, KeyCache, PooledTransport, Rejection
+from siwa import ReplayStore, MemoryReplayBackend, SQLiteReplayBackend
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class DetectReplays(Test):
+
+    NAME = 'Reject identity tokens presented more than once'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            verifier = Verifier(
+                audiences=AUDIENCE,
+                key_cache=KeyCache(transport=transport),
+                replay_store=ReplayStore()
+            )
+
+            token = signing_key.token(claims={'nonce': 'first'})
+            result = verifier.verify_raw(token)
+            assert result.valid is True
+            assert 'replay' in result.timings
+            assert result.payload.nonce == 'first'
+            assert verifier.verify_raw(token).rejection is Rejection.REPLAYED
+            encoded = token.encode('ascii')
+            assert verifier.verify_raw(
+                memoryview(b'token=' + encoded)[6:]
+            ).rejection is Rejection.REPLAYED
+
+            # Re-encodings of the signature that a lenient decoder accepts
+            alphabet = (
+                'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+                '0123456789-_'
+            )
+            flipped = alphabet[alphabet.index(token[-1]) ^ 1]
+            for variant in (
+                token[:-1] + flipped,
+                token[:-8] + '*' + token[-8:],
+                token + '==',
+                token + '\n'
+            ):
+                assert verifier.verify_raw(variant).rejection in (
+                    Rejection.REPLAYED,
+                    Rejection.BAD_SIGNATURE
+                )
+            assert verifier.verify_raw(
+                signing_key.token(claims={'nonce': 'second'})
+            ).valid is True
+            assert verifier.verify_raw(
+                token[:-4] + 'AAAA'
+            ).rejection is Rejection.BAD_SIGNATURE
+            assert len(verifier.replay_store) == 2
+
+            # Expired tokens are not recorded, so could be replayed at will
+            try:
+                Verifier(
+                    audiences=AUDIENCE,
+                    key_cache=verifier.key_cache,
+                    ignore_expiry=True,
+                    replay_store=ReplayStore()
+                )
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('Expected ignore_expiry to be refused')
+
+            transport.close()
+
+        backend = MemoryReplayBackend(max_entries=3, resolution=10)
+        assert backend.add(b'a', 100, 0) is True
+        assert backend.add(b'a', 100, 99) is False
+        assert backend.add(b'a', 100, 100) is True
+        for key in (b'b', b'c', b'd', b'e'):
+            assert backend.add(key, 200 + len(backend), 100) is True
+        assert len(backend) == 3
+        assert backend.evictions == 1
+        assert backend.add(b'e', 300, 150) is False
+        assert backend.add(b'c', 300, 215) is True
+        assert len(backend) == 1
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replay.sqlite3')
+            first = SQLiteReplayBackend(path)
+            second = SQLiteReplayBackend(path)
+            assert first.add(b'a', 100, 0) is True
+            assert second.add(b'a', 100, 50) is False
+            assert second.add(b'a', 100, 100) is True
+            assert len(first) == 1
+            first.close()
+            second.close()
+
+        return Success()
@@ -0,0 +1,143 @@
+"""
+Signin With Apple
+Exchange Tokens Test
+author: hugh@blinkybeach.com
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from siwa import TokenExchange, TokenExchangeError, PooledTransport
+from siwa.tests.fixtures import SigningKey, TokenServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class ExchangeTokens(Test):
+
+    NAME = 'Exchange authorization codes and refresh tokens with Apple'
+
+    def execute(self) -> TestResult:
+
+        with TokenServer([SigningKey()]) as server:
+
+            transport = PooledTransport(server.origin)
+            exchange = TokenExchange(
+                client_id=AUDIENCE,
+                client_secret=lambda: 'secret',
+                transport=transport,
+                backoff=0.0
+            )
+
+            code = server.issue_code()
+            tokens = exchange.exchange_code(code)
+            assert tokens.result.valid is True
+            assert tokens.payload.audience == AUDIENCE
+            assert tokens.refresh_token is not None
+
+            refreshed = exchange.refresh(tokens.refresh_token)
+            assert refreshed.result.valid is True
+            assert refreshed.refresh_token is None
+
+            for grant, error in (
+                (lambda: exchange.exchange_code(code), 'invalid_grant'),
+                (lambda: exchange.refresh('unknown'), 'invalid_grant')
+            ):
+                try:
+                    grant()
+                except TokenExchangeError as failure:
+                    assert failure.error == error
+                    assert failure.status == 400
+                else:
+                    raise AssertionError('Expected ' + error)
+
+            server.fail_next(2)
+            requests = server.token_requests
+            assert exchange.exchange_code(server.issue_code()).result.valid
+            assert server.token_requests == requests + 3
+
+            server.fail_next(3)
+            try:
+                exchange.exchange_code(server.issue_code())
+            except TokenExchangeError as failure:
+                assert failure.status == 503
+            else:
+                raise AssertionError('Expected HTTP 503')
+
+            # A code is not redeemed again once Apple may have acted on it
+            server.fail_next(1, status=500)
+            requests = server.token_requests
+            try:
+                exchange.exchange_code(server.issue_code())
+            except TokenExchangeError as failure:
+                assert failure.status == 500
+            else:
+                raise AssertionError('Expected HTTP 500')
+            assert server.token_requests == requests + 1
+
+            server.drop_next(1)
+            try:
+                exchange.exchange_code(server.issue_code())
+            except OSError:
+                pass
+            else:
+                raise AssertionError('Expected the dropped request to fail')
+            assert server.token_requests == requests + 2
+
+            server.drop_next(1)
+            assert exchange.refresh(tokens.refresh_token).result.valid
+            assert server.token_requests == requests + 4
+
+            # Refreshes may be repeated, so share one pooled connection
+            pooled = PooledTransport(server.origin)
+            pooled_exchange = TokenExchange(
+                client_id=AUDIENCE,
+                client_secret='secret',
+                transport=pooled
+            )
+            connections = server.connections
+            refresh_token = pooled_exchange.exchange_code(
+                server.issue_code()
+            ).refresh_token
+            for _ in range(5):
+                assert pooled_exchange.refresh(refresh_token).result.valid
+            assert server.connections == connections + 1
+            pooled_exchange.exchange_code(server.issue_code())
+            assert server.connections == connections + 2
+
+            codes = [server.issue_code() for _ in range(16)]
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(exchange.exchange_code, codes))
+            assert all(r.result.valid for r in results)
+
+            async def exchange_many() -> None:
+                results = await asyncio.gather(*[
+                    exchange.exchange_code_async(server.issue_code())
+                    for _ in range(8)
+                ])
+                assert all(r.result.valid for r in results)
+                refreshed = await exchange.refresh_async(
+                    results[0].refresh_token
+                )
+                assert refreshed.result.valid
+                connections = server.connections
+                for _ in range(5):
+                    refreshed = await pooled_exchange.refresh_async(
+                        results[0].refresh_token
+                    )
+                    assert refreshed.result.valid
+                assert server.connections == connections + 1
+                server.drop_next(1)
+                requests = server.token_requests
+                try:
+                    await exchange.exchange_code_async(server.issue_code())
+                except OSError:
+                    pass
+                else:
+                    raise AssertionError('Expected the request to fail')
+                assert server.token_requests == requests + 1
+                transport.close()
+                pooled.close()
+                return
+
+            asyncio.run(exchange_many())
+
+        return Success()
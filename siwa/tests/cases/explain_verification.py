@@ -0,0 +1,48 @@
+"""
+Signin With Apple
+Explain Verification Test
+author: hugh@blinkybeach.com
+"""
+from siwa import IdentityToken, KeyCache, PooledTransport, Rejection
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class ExplainVerification(Test):
+
+    NAME = 'Explain why a token was rejected, with stage timings'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        token = signing_key.token(AUDIENCE)
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            cache = KeyCache(transport=transport)
+
+            result = IdentityToken.verify_raw(token, AUDIENCE, cache)
+            assert result.valid is True
+            assert result.rejection is None
+            assert result.key_identifier == signing_key.identifier
+            assert result.claims['aud'] == AUDIENCE
+            assert result.audience == AUDIENCE
+            assert set(result.timings) == {
+                'parse', 'precheck', 'key_lookup', 'signature'
+            }
+
+            for raw_token, expected in (
+                (token[:-4] + 'AAAA', Rejection.BAD_SIGNATURE),
+                (SigningKey('OTHER').token(AUDIENCE), Rejection.UNKNOWN_KEY),
+                (signing_key.token(lifetime=-60), Rejection.EXPIRED),
+                ('not.a.token', Rejection.MALFORMED)
+            ):
+                result = IdentityToken.verify_raw(raw_token, AUDIENCE, cache)
+                assert result.valid is False
+                assert result.rejection is expected
+
+            transport.close()
+
+        return Success()
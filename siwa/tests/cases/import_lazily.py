@@ -0,0 +1,24 @@
+"""
+Signin With Apple
+Import Lazily Test
+author: hugh@blinkybeach.com
+"""
+from siwa.benchmarks.import_time import STATEMENTS, loaded_modules
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class ImportLazily(Test):
+
+    NAME = 'Import the package without loading heavy dependencies'
+
+    def execute(self) -> TestResult:
+
+        for statement in STATEMENTS:
+            loaded = loaded_modules(statement)
+            assert not loaded, '`{s}` loaded {m}'.format(
+                s=statement,
+                m=', '.join(loaded)
+            )
+
+        return Success()
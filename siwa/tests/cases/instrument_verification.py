@@ -0,0 +1,45 @@
+"""
+Signin With Apple
+Instrument Verification Test
+author: hugh@blinkybeach.com
+"""
+from siwa import IdentityToken, KeyCache, PooledTransport
+from siwa import Instrumentation, PrometheusInstrumentation
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class InstrumentVerification(Test):
+
+    NAME = 'Report verification metrics in the Prometheus text format'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        token = signing_key.token(AUDIENCE)
+        metrics = PrometheusInstrumentation()
+
+        Instrumentation.install(metrics)
+        try:
+            with KeyServer([signing_key]) as server:
+                transport = PooledTransport(server.origin)
+                cache = KeyCache(transport=transport)
+                for audience in (AUDIENCE, AUDIENCE, 'com.example.other'):
+                    IdentityToken.parse(token).is_validly_signed(
+                        audience,
+                        cache
+                    )
+                transport.close()
+        finally:
+            Instrumentation.install(None)
+
+        text = metrics.render()
+        assert 'siwa_key_fetches_total{outcome="ok"} 1.0' in text
+        assert 'siwa_key_lookups_total{outcome="miss"} 1.0' in text
+        assert 'siwa_key_lookups_total{outcome="hit"} 1.0' in text
+        assert 'siwa_rejections_total{reason="wrong_audience"} 1.0' in text
+        assert 'siwa_signature_checks_total{valid="true"} 2.0' in text
+        assert 'siwa_token_parse_seconds_count 3.0' in text
+
+        return Success()
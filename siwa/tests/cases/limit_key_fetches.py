@@ -0,0 +1,75 @@
+"""
+Signin With Apple
+Limit Key Fetches Test
+author: hugh@blinkybeach.com
+"""
+from siwa import ApplePublicKey, IdentityToken, KeyCache, PooledTransport
+from siwa import Rejection
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class LimitKeyFetches(Test):
+
+    NAME = 'Bound fetches and growth driven by made-up key identifiers'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        forged = [SigningKey('FORGED{n}'.format(n=n)) for n in range(3)]
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+
+            # Each forged identifier costs exactly one fetch
+            cache = KeyCache(min_refetch_interval=0, transport=transport)
+            assert IdentityToken.verify_raw(
+                signing_key.token(),
+                AUDIENCE,
+                cache
+            ).valid is True
+            assert server.requests == 1
+            for _ in range(5):
+                assert IdentityToken.verify_raw(
+                    forged[0].token(),
+                    AUDIENCE,
+                    cache
+                ).rejection is Rejection.UNKNOWN_KEY
+            assert server.requests == 2
+            assert cache.is_known_unknown(forged[0].identifier)
+            assert not cache.is_known_unknown(forged[1].identifier)
+
+            # Misses within the refetch floor do not fetch
+            requests = server.requests
+            cache = KeyCache(
+                negative_ttl=0,
+                min_refetch_interval=3600,
+                transport=transport
+            )
+            for key in forged + forged:
+                assert IdentityToken.verify_raw(
+                    key.token(),
+                    AUDIENCE,
+                    cache
+                ).rejection is Rejection.UNKNOWN_KEY
+            assert server.requests == requests + 1
+            assert not cache.is_known_unknown(forged[0].identifier)
+
+            transport.close()
+
+        keys = [
+            ApplePublicKey.decode(SigningKey('KEY{n}'.format(n=n)).jwk())
+            for n in range(3)
+        ]
+        cache = KeyCache(max_keys=2)
+        cache.store(keys[0])
+        cache.store(keys[1])
+        cache.store(keys[0])
+        cache.store(keys[2])
+        assert set(cache.snapshot) == {'KEY0', 'KEY2'}
+        cache.refresh(keys, retire_after=3600)
+        assert len(cache.snapshot) == 2
+
+        return Success()
@@ -0,0 +1,85 @@
+"""
+Signin With Apple
+Mint Client Secret Test
+author: hugh@blinkybeach.com
+"""
+import time
+from threading import Thread
+from typing import List, Optional
+from siwa import ClientSecret, TokenExchange, PooledTransport
+from siwa.tests.fixtures import SigningKey, ClientKey, TokenServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class CountingClientSecret(ClientSecret):
+
+    mints = 0
+
+    def mint(self, now: Optional[float] = None) -> str:
+        time.sleep(0.05)
+        self.mints += 1
+        return super().mint(now)
+
+
+class MintClientSecret(Test):
+
+    NAME = 'Mint, reuse and renew ES256 client secrets'
+
+    def execute(self) -> TestResult:
+
+        client_key = ClientKey()
+        client_secret = CountingClientSecret(
+            team_id=ClientKey.TEAM_ID,
+            client_id=AUDIENCE,
+            key_id=client_key.identifier,
+            private_key=client_key.pem(),
+            lifetime=3600
+        )
+
+        secret = client_secret()
+        assert client_key.accepts(secret)
+        assert client_secret() == secret
+        assert client_secret.mints == 1
+        assert client_secret.expires_at >= time.time() + 3599
+
+        # Fall within the refresh margin; many threads share one renewal
+        client_secret.mint(now=time.time() - 3400)
+        client_secret.mints = 0
+        secrets: List[str] = []
+        threads = [
+            Thread(target=lambda: secrets.append(client_secret()))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert client_secret.mints == 1
+        assert len(set(secrets)) == 1
+        assert client_key.accepts(secrets[0])
+
+        for lifetime in (0, ClientSecret.MAX_LIFETIME + 1):
+            try:
+                ClientSecret('T', AUDIENCE, 'K', client_key.pem(), lifetime)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('Expected lifetime to be rejected')
+
+        with TokenServer(
+            [SigningKey()],
+            accept_secret=client_key.accepts
+        ) as server:
+            transport = PooledTransport(server.origin)
+            exchange = TokenExchange(
+                client_id=AUDIENCE,
+                client_secret=client_secret,
+                transport=transport
+            )
+            assert exchange.exchange_code(server.issue_code()).result.valid
+            assert exchange.exchange_code(server.issue_code()).result.valid
+            assert len(set(server.secrets)) == 1
+            transport.close()
+
+        return Success()
@@ -0,0 +1,66 @@
+"""
+Signin With Apple
+Parse Buffers Test
+author: hugh@blinkybeach.com
+"""
+import pickle
+from siwa import IdentityToken, KeyCache, PooledTransport, Verifier
+from siwa import Precheck, Rejection
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class ParseBuffers(Test):
+
+    NAME = 'Parse tokens in place from bytes, bytearrays and memoryviews'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        token = signing_key.token(AUDIENCE)
+        encoded = token.encode('ascii')
+        body = b'token=' + encoded + b'&state=xyz'
+        view = memoryview(body)[6:6 + len(encoded)]
+        mutable = bytearray(encoded)
+
+        assert IdentityToken.parse(encoded)._raw_token is encoded
+        assert IdentityToken.parse(view)._raw_token.obj is body
+
+        copied = IdentityToken.parse(mutable)
+        mutable[-1:] = b'A' if encoded[-1:] != b'A' else b'B'
+        assert bytes(copied._raw_token) == encoded
+
+        restored = pickle.loads(pickle.dumps(IdentityToken.parse(view)))
+        assert restored._raw_token == encoded
+        assert restored.payload.audience == AUDIENCE
+
+        assert IdentityToken.peek_header(view).identifier == (
+            signing_key.identifier
+        )
+        assert IdentityToken.peek_claims(view)['aud'] == AUDIENCE
+
+        for malformed in (b'a.b', bytearray(b'a.b.c.d'), memoryview(b'')):
+            try:
+                IdentityToken.parse(malformed)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('Expected a malformed token')
+        assert Precheck.check_structure(
+            memoryview(b'a' * (Precheck.MAX_TOKEN_LENGTH + 1))
+        ) is Rejection.TOO_LONG
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            verifier = Verifier(
+                audiences=AUDIENCE,
+                key_cache=KeyCache(transport=transport)
+            )
+            for data in (token, encoded, bytearray(encoded), view):
+                assert verifier.verify_raw(data).valid is True
+            assert verifier.verify_raw(mutable).valid is False
+            transport.close()
+
+        return Success()
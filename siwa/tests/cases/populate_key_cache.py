@@ -0,0 +1,52 @@
+"""
+Signin With Apple
+Populate Key Cache Test
+author: hugh@blinkybeach.com
+"""
+from siwa import ApplePublicKey, KeyCache
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+from threading import Thread, Lock
+
+
+class CountingPublicKey(ApplePublicKey):
+
+    fetches = 0
+    _count_lock = Lock()
+
+    @classmethod
+    def retrieve_all(cls, cache=None, transport=None):
+        with cls._count_lock:
+            cls.fetches += 1
+        return super().retrieve_all(cache, transport)
+
+
+class PopulateKeyCache(Test):
+
+    NAME = 'Populate a KeyCache on miss with a single shared fetch'
+
+    def execute(self) -> TestResult:
+
+        all_keys = ApplePublicKey.retrieve_all()
+        identifiers = [k.identifier for k in all_keys]
+
+        cache = KeyCache()
+
+        threads = [Thread(
+            target=CountingPublicKey.retrieve_by_id,
+            kwargs={
+                'identifier': identifiers[i % len(identifiers)],
+                'cache': cache
+            }
+        ) for i in range(32)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert CountingPublicKey.fetches == 1
+        for identifier in identifiers:
+            assert cache.retrieve(identifier) is not None
+
+        return Success()
@@ -0,0 +1,55 @@
+"""
+Signin With Apple
+Precheck Token Test
+author: hugh@blinkybeach.com
+"""
+from siwa import IdentityToken, KeyCache, PooledTransport
+from siwa import Precheck, Rejection
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class PrecheckToken(Test):
+
+    NAME = 'Reject malformed and misaddressed tokens before key lookup'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        token = signing_key.token(AUDIENCE)
+
+        assert Precheck.check_token(token, AUDIENCE) is None
+        assert Precheck.check_token(
+            'a' * (Precheck.MAX_TOKEN_LENGTH + 1),
+            AUDIENCE
+        ) is Rejection.TOO_LONG
+        assert Precheck.check_token('a.b', AUDIENCE) is Rejection.MALFORMED
+        assert Precheck.check_token(
+            token,
+            'com.example.other'
+        ) is Rejection.WRONG_AUDIENCE
+        assert Precheck.check_token(
+            signing_key.token(AUDIENCE, lifetime=-60),
+            AUDIENCE
+        ) is Rejection.EXPIRED
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            cache = KeyCache(transport=transport)
+
+            rejected = IdentityToken.parse(token)
+            assert rejected.is_validly_signed(
+                'com.example.other',
+                cache
+            ) is False
+            assert server.requests == 0
+
+            accepted = IdentityToken.parse(token)
+            assert accepted.is_validly_signed(AUDIENCE, cache) is True
+            assert server.requests == 1
+
+            transport.close()
+
+        return Success()
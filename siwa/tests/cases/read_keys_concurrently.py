@@ -0,0 +1,90 @@
+"""
+Signin With Apple
+Read Keys Concurrently Test
+author: hugh@blinkybeach.com
+"""
+from threading import Thread, Event
+from typing import List
+from siwa import ApplePublicKey, KeyCache
+from siwa.tests.fixtures import SigningKey
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+READERS = 4
+REFRESHES = 200
+
+
+class ReadKeysConcurrently(Test):
+
+    NAME = 'Read keys from many threads while they are refreshed'
+
+    def execute(self) -> TestResult:
+
+        stable, first, second = [
+            ApplePublicKey.decode(SigningKey(i).jwk())
+            for i in ('STABLE', 'FIRST', 'SECOND')
+        ]
+        cache = KeyCache()
+        cache.refresh([stable, first])
+        key_sets = (
+            {'STABLE': stable, 'FIRST': first},
+            {'STABLE': stable, 'SECOND': second}
+        )
+
+        def read(
+            stopping: Event,
+            counts: List[int],
+            errors: List[str]
+        ) -> None:
+            reads = 0
+            while not stopping.is_set() or reads == 0:
+                if cache.retrieve('STABLE') is not stable:
+                    errors.append('Stable key missing')
+                snapshot = dict(cache.snapshot)
+                if not any(
+                    snapshot.keys() == keys.keys() and all(
+                        snapshot[i] is k for i, k in keys.items()
+                    ) for keys in key_sets
+                ):
+                    errors.append('Mixed key set observed: ' + repr(
+                        sorted(snapshot)
+                    ))
+                reads += 1
+            counts.append(reads)
+            return
+
+        # Readers never observe a partial or mixed key set
+        stopping = Event()
+        reads: List[int] = []
+        errors: List[str] = []
+        readers = [
+            Thread(target=read, args=(stopping, reads, errors))
+            for _ in range(READERS)
+        ]
+        for thread in readers:
+            thread.start()
+        for refresh in range(REFRESHES):
+            cache.refresh([stable, second if refresh % 2 else first])
+        stopping.set()
+        for thread in readers:
+            thread.join()
+        assert not errors, errors[0]
+        assert len(reads) == READERS and min(reads) > 0
+
+        # Reads take no lock, so complete while a writer holds it
+        with cache._write_lock:
+            writer = Thread(target=lambda: cache.refresh([stable, second]))
+            writer.start()
+            stopping = Event()
+            stopping.set()
+            reads = []
+            reader = Thread(target=read, args=(stopping, reads, errors))
+            reader.start()
+            reader.join(5)
+            assert not reader.is_alive() and reads == [1]
+            assert writer.is_alive()
+        writer.join(5)
+        assert not errors, errors[0]
+        assert set(cache.snapshot) == {'STABLE', 'SECOND'}
+
+        return Success()
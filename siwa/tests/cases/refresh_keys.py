@@ -0,0 +1,57 @@
+"""
+Signin With Apple
+Refresh Keys Test
+author: hugh@blinkybeach.com
+"""
+import time
+from siwa import KeyCache, KeyRefresher, PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+from typing import Callable
+
+
+class RefreshKeys(Test):
+
+    NAME = 'Refresh rotated keys in the background'
+
+    def execute(self) -> TestResult:
+
+        first_key = SigningKey('FIRST')
+        second_key = SigningKey('SECOND')
+
+        with KeyServer([first_key]) as server:
+
+            cache = KeyCache(transport=PooledTransport(server.origin))
+            refresher = KeyRefresher(
+                cache=cache,
+                interval=0.05,
+                retire_after=0.5
+            )
+
+            with refresher:
+
+                self._await(lambda: cache.retrieve('FIRST') is not None)
+                original = cache.retrieve('FIRST')
+
+                server.set_keys([first_key, second_key])
+                self._await(lambda: cache.retrieve('SECOND') is not None)
+                assert cache.retrieve('FIRST') is original
+
+                server.set_keys([second_key])
+                time.sleep(0.2)
+                assert cache.retrieve('FIRST') is original
+
+                self._await(lambda: cache.retrieve('FIRST') is None)
+                assert cache.retrieve('SECOND') is not None
+
+        return Success()
+
+    @staticmethod
+    def _await(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise AssertionError('Timed out awaiting key refresh')
+            time.sleep(0.01)
+        return
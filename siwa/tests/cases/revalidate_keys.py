@@ -0,0 +1,37 @@
+"""
+Signin With Apple
+Revalidate Keys Test
+author: hugh@blinkybeach.com
+"""
+from siwa import ApplePublicKey, KeyCache, PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class RevalidateKeys(Test):
+
+    NAME = 'Conditionally retrieve keys over a persistent connection'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+
+        with KeyServer([signing_key], max_age=300) as server:
+
+            transport = PooledTransport(server.origin)
+            cache = KeyCache(transport=transport)
+
+            ApplePublicKey.retrieve_all(cache)
+            assert cache.document.max_age == 300
+            assert cache.is_stale is False
+            original = cache.retrieve(signing_key.identifier)
+
+            ApplePublicKey.refresh_cache(cache)
+            assert server.not_modified == 1
+            assert cache.document.not_modified is True
+            assert cache.retrieve(signing_key.identifier) is original
+
+            transport.close()
+
+        return Success()
@@ -0,0 +1,67 @@
+"""
+Signin With Apple
+Share Key File Test
+author: hugh@blinkybeach.com
+"""
+import os
+import tempfile
+from siwa import ApplePublicKey, FileKeyCache, IdentityToken
+from siwa import PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class ShareKeyFile(Test):
+
+    NAME = 'Share warm keys between processes through a key file'
+
+    def execute(self) -> TestResult:
+
+        first_key = SigningKey('FIRST')
+        second_key = SigningKey('SECOND')
+
+        with tempfile.TemporaryDirectory() as directory, KeyServer(
+            [first_key]
+        ) as server:
+
+            transport = PooledTransport(server.origin)
+            path = os.path.join(directory, 'keys.json')
+
+            FileKeyCache(path, transport=transport).warm()
+            assert server.requests == 1
+
+            worker_cache = FileKeyCache(path)
+            token = IdentityToken.parse(first_key.token())
+            assert token.is_validly_signed(AUDIENCE, worker_cache) is True
+            assert server.requests == 1
+
+            FileKeyCache(path, transport=transport).warm(max_age=3600)
+            assert server.requests == 1
+
+            server.set_keys([first_key, second_key])
+            other_worker_cache = FileKeyCache(path, transport=transport)
+            ApplePublicKey.retrieve_by_id('SECOND', other_worker_cache)
+            assert server.requests == 2
+
+            assert worker_cache.retrieve('SECOND') is not None
+            assert FileKeyCache(path).document.etag is not None
+
+            # Apple retires FIRST. It is kept for a while, but the file no
+            # longer matches Apple's document, so must not claim its ETag
+            server.set_keys([second_key])
+            document = ApplePublicKey.retrieve_document(transport)
+            other_worker_cache.refresh(
+                ApplePublicKey.decode_many(document.keys),
+                retire_after=3600,
+                document=document
+            )
+            shared = FileKeyCache(path, transport=transport)
+            assert shared.retrieve('FIRST') is not None
+            assert shared.document.etag is None
+            requests = server.requests
+            ApplePublicKey.retrieve_all(shared)
+            assert server.requests == requests + 1
+            assert server.not_modified == 0
+
+        return Success()
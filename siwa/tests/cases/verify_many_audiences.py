@@ -0,0 +1,77 @@
+"""
+Signin With Apple
+Verify Many Audiences Test
+author: hugh@blinkybeach.com
+"""
+from siwa import Verifier, KeyCache, PooledTransport, Rejection
+from siwa import IdentityToken
+from siwa.tests.fixtures import SigningKey, KeyServer
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class VerifyManyAudiences(Test):
+
+    NAME = 'Verify tokens issued for any of several audiences'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        audiences = ('com.example.ios', 'com.example.mac', 'com.example.web')
+
+        with KeyServer([signing_key]) as server:
+
+            transport = PooledTransport(server.origin)
+            verifier = Verifier(
+                audiences=audiences,
+                leeway=30,
+                key_cache=KeyCache(transport=transport)
+            )
+
+            for audience in audiences:
+                result = verifier.verify_raw(signing_key.token(audience))
+                assert result.valid is True
+                assert result.audience == audience
+
+            result = verifier.verify_raw(
+                signing_key.token('com.example.other')
+            )
+            assert result.rejection is Rejection.WRONG_AUDIENCE
+
+            result = verifier.verify_raw(signing_key.token(
+                audiences[0],
+                lifetime=-10
+            ))
+            assert result.valid is True
+
+            result = verifier.verify_raw(signing_key.token(
+                audiences[0],
+                lifetime=-60
+            ))
+            assert result.rejection is Rejection.EXPIRED
+
+            # IdentityToken's methods reuse one Verifier per policy
+            key_cache = verifier.key_cache
+            token = IdentityToken.parse(signing_key.token(audiences[0]))
+            assert token.is_validly_signed(audiences[0], key_cache)
+            shared = IdentityToken._verifier(audiences[0], key_cache, False)
+            assert token.verify(audiences[0], key_cache).valid is True
+            assert IdentityToken._verifier(
+                audiences[0],
+                key_cache,
+                False
+            ) is shared
+            assert IdentityToken._verifier(
+                audiences[0],
+                key_cache,
+                True
+            ) is not shared
+            assert IdentityToken._verifier(
+                audiences[0],
+                None,
+                False
+            ).key_cache is KeyCache.shared()
+
+            transport.close()
+
+        return Success()
@@ -0,0 +1,76 @@
+"""
+Signin With Apple
+Verify Many Tokens Test
+author: hugh@blinkybeach.com
+"""
+from concurrent.futures import ThreadPoolExecutor
+from siwa import IdentityToken, KeyCache, PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class VerifyManyTokens(Test):
+
+    NAME = 'Verify a batch of tokens, in input order, across a pool'
+
+    def execute(self) -> TestResult:
+
+        first = SigningKey('FIRSTKEY')
+        second = SigningKey('SECONDKEY')
+        forged = SigningKey('FORGEDKEY')
+
+        valid = first.token()
+        tokens = [
+            valid,
+            'not a token',
+            second.token(),
+            forged.token(),
+            first.token('com.example.other'),
+            valid[:-4] + ('AAAA' if valid[-4:] != 'AAAA' else 'BBBB'),
+            memoryview(b'x' + second.token().encode('ascii'))[1:],
+            first.token(lifetime=-60),
+            second.token().encode('ascii')
+        ]
+        expected = [True, False, True, False, False, False, True, False, True]
+
+        with KeyServer([first, second]) as server:
+
+            transport = PooledTransport(server.origin)
+            key_cache = KeyCache(transport=transport)
+
+            assert IdentityToken.verify_many(
+                tokens,
+                AUDIENCE,
+                key_cache,
+                chunk_size=2
+            ) == expected
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                assert IdentityToken.verify_many(
+                    tokens,
+                    AUDIENCE,
+                    key_cache,
+                    executor=executor
+                ) == expected
+
+            assert IdentityToken.verify_many(
+                tokens,
+                AUDIENCE,
+                key_cache,
+                max_workers=2,
+                use_processes=True,
+                chunk_size=2
+            ) == expected
+
+            assert IdentityToken.verify_many(
+                tokens[7:8],
+                AUDIENCE,
+                key_cache,
+                ignore_expiry=True
+            ) == [True]
+            assert IdentityToken.verify_many([], AUDIENCE, key_cache) == []
+
+            transport.close()
+
+        return Success()
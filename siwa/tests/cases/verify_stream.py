@@ -0,0 +1,108 @@
+"""
+Signin With Apple
+Verify Stream Test
+author: hugh@blinkybeach.com
+"""
+import json
+import os
+import socket
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from typing import Any, Dict, List, Tuple
+from siwa.library.stream_verifier import main
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+def _run(arguments: List[str]) -> Tuple[int, List[Dict[str, Any]], str]:
+    """Run the command line, returning its status, results and errors"""
+    output = StringIO()
+    errors = StringIO()
+    with redirect_stdout(output), redirect_stderr(errors):
+        status = main(arguments)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    return status, results, errors.getvalue()
+
+
+class VerifyStream(Test):
+
+    NAME = 'Verify a stream of tokens from the command line'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        valid = signing_key.token(AUDIENCE)
+        expired = signing_key.token(AUDIENCE, lifetime=-60)
+
+        with KeyServer([signing_key], max_age=3600) as server, (
+            tempfile.TemporaryDirectory()
+        ) as directory:
+
+            plain = os.path.join(directory, 'tokens.txt')
+            with open(plain, 'w') as tokens:
+                tokens.write('\n'.join((valid, '', expired, 'a.b')) + '\n')
+
+            ndjson = os.path.join(directory, 'tokens.ndjson')
+            with open(ndjson, 'w') as tokens:
+                tokens.write('\n'.join((
+                    json.dumps({'id': 7, 'id_token': valid}),
+                    '{"id_token":',
+                    json.dumps({'id': 9, 'token': valid})
+                )) + '\n')
+
+            options = ['--audience', AUDIENCE, '--workers', '1']
+            origin = ['--key-origin', server.origin]
+
+            status, results, _ = _run(options + origin + ['--input', plain])
+            assert status == 0
+            assert [r['line'] for r in results] == [1, 3, 4]
+            assert results[0]['valid'] is True
+            assert results[0]['kid'] == signing_key.identifier
+            assert results[1]['reason'] == 'expired'
+            assert results[2] == {
+                'line': 4,
+                'valid': False,
+                'reason': 'malformed'
+            }
+
+            status, results, _ = _run(
+                options + origin + ['--input', ndjson, '--ndjson']
+            )
+            assert status == 0
+            assert results[0]['valid'] is True and results[0]['id'] == 7
+            assert results[1]['reason'] == 'malformed'
+            assert results[2]['reason'] == 'malformed'
+
+            key_file = os.path.join(directory, 'keys.json')
+            requests = server.requests
+            for _ in range(2):
+                status, results, _ = _run(options + origin + [
+                    '--input', plain,
+                    '--key-file', key_file,
+                    '--workers', '2',
+                    '--chunk-size', '1'
+                ])
+                assert status == 0
+                assert [r['valid'] for r in results] == [True, False, False]
+            assert os.path.exists(key_file)
+            assert server.requests == requests + 1
+
+        with socket.socket() as unused:
+            unused.bind(('127.0.0.1', 0))
+            closed = 'http://127.0.0.1:{p}'.format(p=unused.getsockname()[1])
+
+        status, results, errors = _run(options + [
+            '--key-origin', closed,
+            '--input', plain
+        ])
+        assert status == 1
+        assert results == []
+        assert errors.startswith('siwa: unable to retrieve public keys')
+        assert errors.count('\n') == 1
+
+        status, _, errors = _run(options + ['--key-origin', 'ftp://apple'])
+        assert status == 2
+
+        return Success()
@@ -0,0 +1,44 @@
+"""
+Signin With Apple
+Verify Token Asynchronously Test
+author: hugh@blinkybeach.com
+"""
+import asyncio
+from siwa import ApplePublicKey, IdentityToken, KeyCache, PooledTransport
+from siwa.tests.fixtures import SigningKey, KeyServer, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class VerifyTokenAsync(Test):
+
+    NAME = 'Asynchronously verify a token against a stand-in key server'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+
+        with KeyServer([signing_key]) as server:
+
+            cache = KeyCache(transport=PooledTransport(server.origin))
+            tokens = [IdentityToken.parse(signing_key.token())] * 16
+
+            async def verify() -> None:
+                keys = await asyncio.gather(*[
+                    ApplePublicKey.retrieve_by_id_async(
+                        signing_key.identifier,
+                        cache
+                    ) for _ in range(16)
+                ])
+                assert None not in keys
+                results = await asyncio.gather(*[
+                    t.is_validly_signed_async(AUDIENCE, cache) for t in tokens
+                ])
+                assert False not in results
+                return
+
+            asyncio.run(verify())
+
+            assert server.requests == 1
+
+        return Success()
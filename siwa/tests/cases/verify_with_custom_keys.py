@@ -0,0 +1,51 @@
+"""
+Signin With Apple
+Verify With Custom Keys Test
+author: hugh@blinkybeach.com
+"""
+from typing import Any, Dict
+from rsa import PublicKey as RSA_PublicKey
+from siwa import IdentityToken, KeyCache, Verifier
+from siwa.library.key_protocol import PublicKey
+from siwa.tests.fixtures import SigningKey, AUDIENCE
+from siwa.tests.test import Test
+from siwa.tests.test_result import Success, TestResult
+
+
+class RSAOnlyKey(PublicKey):
+    """A third-party key implementing only the PythonRSA representation"""
+
+    def __init__(self, signing_key: SigningKey) -> None:
+        numbers = signing_key.private_key.public_key().public_numbers()
+        self._identifier = signing_key.identifier
+        self._rsa_public_key = RSA_PublicKey(n=numbers.n, e=numbers.e)
+        return
+
+    identifier = property(lambda s: s._identifier)
+    rsa_public_key = property(lambda s: s._rsa_public_key)
+
+    def encode(self) -> Dict[str, Any]:
+        return {'kid': self._identifier}
+
+
+class VerifyWithCustomKeys(Test):
+
+    NAME = 'Verify tokens with keys implementing only rsa_public_key'
+
+    def execute(self) -> TestResult:
+
+        signing_key = SigningKey()
+        key = RSAOnlyKey(signing_key)
+        token = signing_key.token(AUDIENCE)
+
+        assert IdentityToken.parse(token).check_signature(key) is True
+        assert IdentityToken.parse(
+            SigningKey(signing_key.identifier).token(AUDIENCE)
+        ).check_signature(key) is False
+
+        key_cache = KeyCache()
+        key_cache.refresh([key])
+        verifier = Verifier(audiences=AUDIENCE, key_cache=key_cache)
+        assert verifier.verify_raw(token).valid is True
+
+        return Success()
@@ -0,0 +1,366 @@
+"""
+Signin With Apple
+Test Fixtures Module
+author: hugh@blinkybeach.com
+"""
+import base64
+import hashlib
+import json
+import secrets
+import time
+import jwt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from urllib.parse import parse_qs
+
+AUDIENCE = 'com.example.siwa'
+ISSUER = 'https://appleid.apple.com'
+
+
+class SigningKey:
+    """A locally generated RSA key standing in for one of Apple's keys"""
+
+    def __init__(self, identifier: str = 'SIWABENCH') -> None:
+
+        self._identifier = identifier
+        self._private_key: RSAPrivateKey = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048
+        )
+
+        return
+
+    identifier = property(lambda s: s._identifier)
+    private_key = property(lambda s: s._private_key)
+
+    def jwk(self) -> Dict[str, str]:
+        """Return the public half of this key as an Apple-shaped JWK"""
+        numbers = self._private_key.public_key().public_numbers()
+        return {
+            'kty': 'RSA',
+            'kid': self._identifier,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': self._encode_integer(numbers.n),
+            'e': self._encode_integer(numbers.e)
+        }
+
+    def token(
+        self,
+        audience: str = AUDIENCE,
+        lifetime: int = 600,
+        claims: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Return a signed, Apple-shaped identity token"""
+        now = int(time.time())
+        payload: Dict[str, Any] = {
+            'iss': ISSUER,
+            'aud': audience,
+            'exp': now + lifetime,
+            'iat': now,
+            'sub': '000000.' + str(now),
+            'nonce_supported': True,
+            'email': 'user@privaterelay.appleid.com',
+            'email_verified': 'true',
+            'is_private_email': 'true',
+            'real_user_status': 2
+        }
+        if claims is not None:
+            payload.update(claims)
+        return jwt.encode(
+            payload,
+            self._private_key,
+            algorithm='RS256',
+            headers={'kid': self._identifier}
+        )
+
+    @staticmethod
+    def _encode_integer(value: int) -> str:
+        raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+class ClientKey:
+    """
+    A locally generated P-256 key, standing in for a private key downloaded
+    from Apple as a .p8 file, and able to check client secrets signed with
+    it as Apple would
+    """
+
+    TEAM_ID = 'TEAM000000'
+
+    def __init__(self, identifier: str = 'CLIENTKEY0') -> None:
+        self._identifier = identifier
+        self._private_key = ec.generate_private_key(ec.SECP256R1())
+        return
+
+    identifier = property(lambda s: s._identifier)
+
+    def pem(self) -> bytes:
+        """Return the private key in the PKCS#8 PEM form of a .p8 file"""
+        return self._private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        )
+
+    def accepts(self, secret: str, client_id: str = AUDIENCE) -> bool:
+        """Return True if `secret` is a current client secret for us"""
+        try:
+            header = jwt.get_unverified_header(secret)
+            claims = jwt.decode(
+                secret,
+                self._private_key.public_key(),
+                algorithms=['ES256'],
+                audience=ISSUER,
+                issuer=self.TEAM_ID
+            )
+        except jwt.PyJWTError:
+            return False
+        return header.get('kid') == self._identifier and (
+            claims.get('sub') == client_id
+        )
+
+
+class KeyServer:
+    """
+    A local HTTP stand-in for Apple's public key endpoint, serving a JWKS
+    document built from the supplied signing keys. Responses carry an ETag,
+    and a Cache-Control max-age if one is given, and conditional requests
+    for an unchanged document are answered 304 Not Modified. The requests
+    and connections made to the server are counted.
+    """
+
+    PATH = '/auth/keys'
+
+    def __init__(
+        self,
+        keys: List[SigningKey],
+        max_age: Optional[int] = None
+    ) -> None:
+
+        self._max_age = max_age
+        self._requests = 0
+        self._not_modified = 0
+        self._connections = 0
+        self._lock = Lock()
+        self.set_keys(keys)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                with server._lock:
+                    server._connections += 1
+                super().setup()
+                return
+
+            def do_GET(self) -> None:
+                body, etag = server._count_request(
+                    self.headers.get('If-None-Match')
+                )
+                self.send_response(200 if body is not None else 304)
+                self.send_header('ETag', etag)
+                if server._max_age is not None:
+                    self.send_header(
+                        'Cache-Control',
+                        'max-age={a}'.format(a=server._max_age)
+                    )
+                if body is None:
+                    self.end_headers()
+                    return
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get('Content-Length', 0))
+                status, body = server._answer_post(
+                    self.path,
+                    self.rfile.read(length)
+                )
+                if status is None:
+                    # Drop the connection without answering
+                    self.close_connection = True
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            def log_message(self, *args: Any) -> None:
+                return
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return
+
+    origin = property(lambda s: 'http://127.0.0.1:{p}'.format(
+        p=s._server.server_address[1]
+    ))
+    url = property(lambda s: s.origin + s.PATH)
+    requests = property(lambda s: s._requests)
+    not_modified = property(lambda s: s._not_modified)
+    connections = property(lambda s: s._connections)
+
+    def set_keys(self, keys: List[SigningKey]) -> None:
+        body = json.dumps({'keys': [k.jwk() for k in keys]}).encode('utf-8')
+        with self._lock:
+            self._body = body
+            self._etag = '"{h}"'.format(h=hashlib.sha256(body).hexdigest())
+        return
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        return
+
+    def _count_request(
+        self,
+        if_none_match: Optional[str]
+    ) -> Tuple[Optional[bytes], str]:
+        with self._lock:
+            self._requests += 1
+            if if_none_match == self._etag:
+                self._not_modified += 1
+                return None, self._etag
+            return self._body, self._etag
+
+    def _answer_post(
+        self,
+        path: str,
+        body: bytes
+    ) -> Tuple[Optional[int], bytes]:
+        return 404, b'{}'
+
+    def __enter__(self) -> 'KeyServer':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+        return
+
+
+class TokenServer(KeyServer):
+    """
+    A local HTTP stand-in for Apple's public key and token endpoints.
+    Authorization codes from `issue_code` may each be exchanged once for
+    tokens, and the refresh tokens issued may then be validated any number
+    of times. Identity tokens are signed with the first of the signing keys
+    and issued for `client_id`. Client secrets are accepted if
+    `accept_secret` accepts them, and the next token requests may be made to
+    fail with `fail_next`, or be acted upon but go unanswered with
+    `drop_next`.
+    """
+
+    TOKEN_PATH = '/auth/token'
+
+    def __init__(
+        self,
+        keys: List[SigningKey],
+        client_id: str = AUDIENCE,
+        accept_secret: Callable[[str], bool] = bool,
+        max_age: Optional[int] = None
+    ) -> None:
+
+        self._signing_key = keys[0]
+        self._client_id = client_id
+        self._accept_secret = accept_secret
+        self._codes: Dict[str, bool] = {}
+        self._refresh_tokens: Dict[str, bool] = {}
+        self._failures: List[int] = []
+        self._drops = 0
+        self._token_requests = 0
+        self._secrets: List[str] = []
+        super().__init__(keys, max_age)
+
+        return
+
+    token_requests = property(lambda s: s._token_requests)
+    secrets = property(lambda s: s._secrets)
+
+    def issue_code(self) -> str:
+        code = 'c' + secrets.token_hex(8)
+        with self._lock:
+            self._codes[code] = True
+        return code
+
+    def fail_next(self, count: int, status: int = 503) -> None:
+        with self._lock:
+            self._failures.extend([status] * count)
+        return
+
+    def drop_next(self, count: int) -> None:
+        with self._lock:
+            self._drops += count
+        return
+
+    def _answer_post(
+        self,
+        path: str,
+        body: bytes
+    ) -> Tuple[Optional[int], bytes]:
+        status, answer = self._answer_grant(path, body)
+        with self._lock:
+            if self._drops > 0:
+                self._drops -= 1
+                return None, b''
+        return status, answer
+
+    def _answer_grant(self, path: str, body: bytes) -> Tuple[int, bytes]:
+
+        if path != self.TOKEN_PATH:
+            return 404, b'{}'
+
+        form = {k: v[0] for k, v in parse_qs(body.decode('ascii')).items()}
+
+        with self._lock:
+            self._token_requests += 1
+            self._secrets.append(form.get('client_secret', ''))
+            if self._failures:
+                return self._failures.pop(0), b'{}'
+            if form.get('client_id') != self._client_id or not (
+                self._accept_secret(form.get('client_secret', ''))
+            ):
+                return self._error('invalid_client')
+            grant_type = form.get('grant_type')
+            if grant_type == 'authorization_code':
+                if not self._codes.pop(form.get('code', ''), False):
+                    return self._error('invalid_grant')
+                refresh_token: Optional[str] = 'r' + secrets.token_hex(8)
+                self._refresh_tokens[str(refresh_token)] = True
+            elif grant_type == 'refresh_token':
+                if form.get('refresh_token') not in self._refresh_tokens:
+                    return self._error('invalid_grant')
+                refresh_token = None
+            else:
+                return self._error('unsupported_grant_type')
+
+        tokens: Dict[str, Any] = {
+            'access_token': 'a' + secrets.token_hex(8),
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'id_token': self._signing_key.token(self._client_id)
+        }
+        if refresh_token is not None:
+            tokens['refresh_token'] = refresh_token
+        return 200, json.dumps(tokens).encode('utf-8')
+
+    @staticmethod
+    def _error(error: str) -> Tuple[int, bytes]:
+        return 400, json.dumps({'error': error}).encode('utf-8')
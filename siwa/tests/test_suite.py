@@ -29,7 +29,28 @@ if '--last' in sys.argv[1:]:
 TESTS = [
     cases.RetrievePublicKeys,
     cases.ParseIdentityToken,
-    cases.VerifyTokenSignature
+    cases.VerifyTokenSignature,
+    cases.PopulateKeyCache,
+    cases.VerifyTokenAsync,
+    cases.RefreshKeys,
+    cases.ShareKeyFile,
+    cases.RevalidateKeys,
+    cases.PrecheckToken,
+    cases.InstrumentVerification,
+    cases.ExplainVerification,
+    cases.AuthenticateRequests,
+    cases.VerifyManyAudiences,
+    cases.ReadKeysConcurrently,
+    cases.ImportLazily,
+    cases.DetectReplays,
+    cases.ExchangeTokens,
+    cases.MintClientSecret,
+    cases.ParseBuffers,
+    cases.VerifyStream,
+    cases.VerifyManyTokens,
+    cases.CacheResults,
+    cases.LimitKeyFetches,
+    cases.VerifyWithCustomKeys
 ]
 
 